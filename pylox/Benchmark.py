@@ -0,0 +1,507 @@
+# coding=utf-8
+
+import os
+import io
+import sys
+import contextlib
+import time
+import argparse
+import tracemalloc
+import Scanner
+import RegexScanner
+import Parser
+import ParallelFrontEnd
+import Pylox
+import Resolver
+from ProgramCache import ProgramCache
+from Optimizer import countNodes
+from FlatAst import NodeTable
+import Expr
+import Environment
+import LoxFunction
+import VM
+
+
+SAMPLE = '''// generated chunk {n}
+class Shape{n} {{
+    init(width, height) {{
+        this.width = width;
+        this.height = height;
+    }}
+
+    area() {{
+        return this.width * this.height;
+    }}
+}}
+
+fun describe{n}(shape) {{
+    var label = "shape number {n}";
+    if (shape.area() >= 12.5 and shape.width != 0) {{
+        print label + " is large";
+    }} else {{
+        print label + " is small";
+    }}
+    return !(shape.height <= 3) or false;
+}}
+
+for (var i = 0; i < {n}; i = i + 1) {{
+    describe{n}(Shape{n}(i, i / 2 - 1));
+}}
+'''
+
+
+EXPRESSION_SAMPLE = '''var e{n} = (a{n} + b * 2 - c / 4) * -d >= e.f(g, h + 1) == !(i < j or k and l != {n});
+print x.y.z(1, 2 * 3, "s") + ((((m)))) * -(-(n - o)) / p.q - r <= s or t;
+w.v = u = (a + b) * (c + d) * (e + f) - g * h / i + j - k;
+'''
+
+
+# Small versions of the usual Lox benchmark programs.
+PROGRAMS = {
+    "fib": '''fun fib(n) {
+  if (n < 2) return n;
+  return fib(n - 2) + fib(n - 1);
+}
+print fib(20);
+''',
+
+    "method_call": '''class Toggle {
+  init(startState) {
+    this.state = startState;
+  }
+
+  value() { return this.state; }
+
+  activate() {
+    this.state = !this.state;
+    return this;
+  }
+}
+
+class NthToggle < Toggle {
+  init(startState, maxCounter) {
+    super.init(startState);
+    this.countMax = maxCounter;
+    this.count = 0;
+  }
+
+  activate() {
+    this.count = this.count + 1;
+    if (this.count >= this.countMax) {
+      super.activate();
+      this.count = 0;
+    }
+
+    return this;
+  }
+}
+
+var toggle = Toggle(true);
+var ntoggle = NthToggle(true, 3);
+var val = true;
+for (var i = 0; i < 20000; i = i + 1) {
+  val = toggle.activate().value();
+  val = ntoggle.activate().value();
+}
+print val;
+''',
+
+    "equality": '''var i = 0;
+var count = 0;
+while (i < 50000) {
+  if (1 == 1) count = count + 1;
+  if (i == nil) count = count + 1;
+  if ("str" == "str") count = count + 1;
+  if (true != false) count = count + 1;
+  i = i + 1;
+}
+print count;
+''',
+
+    "instantiation": '''class Foo {
+  init() {}
+}
+
+var i = 0;
+while (i < 20000) {
+  Foo();
+  Foo();
+  Foo();
+  i = i + 1;
+}
+print i;
+''',
+
+    "properties": '''class Point {
+  init(x, y) {
+    this.x = x;
+    this.y = y;
+  }
+
+  sum() {
+    return this.x + this.y;
+  }
+}
+
+var total = 0;
+var p = Point(1, 2);
+for (var i = 0; i < 30000; i = i + 1) {
+  p.x = p.x + 1;
+  total = total + p.sum();
+}
+print total;
+''',
+
+    "binary_trees": '''class Tree {
+  init(item, depth) {
+    this.item = item;
+    this.depth = depth;
+    if (depth > 0) {
+      var item2 = item + item;
+      depth = depth - 1;
+      this.left = Tree(item2 - 1, depth);
+      this.right = Tree(item2, depth);
+    } else {
+      this.left = nil;
+      this.right = nil;
+    }
+  }
+
+  check() {
+    if (this.left == nil) {
+      return this.item;
+    }
+
+    return this.item + this.left.check() - this.right.check();
+  }
+}
+
+var total = 0;
+for (var i = 0; i < 8; i = i + 1) {
+  total = total + Tree(i, 9).check();
+}
+print total;
+''',
+
+    "closures": '''fun makeCounter() {
+  var count = 0;
+  fun counter() {
+    count = count + 1;
+    return count;
+  }
+  return counter;
+}
+
+var counter = makeCounter();
+var last = 0;
+var j = 0;
+while (j < 30000) {
+  last = counter();
+  j = j + 1;
+}
+print last;
+''',
+    "num_array": '''var n = 10000;
+var a = NumArray(n);
+for (var i = 0; i < n; i = i + 1) {
+  a.set(i, i / n);
+}
+
+var b = a.map("sin");
+var total = 0;
+for (var k = 0; k < 200; k = k + 1) {
+  total = total + a.dot(b) + a.multiply(2).add(b).sum();
+}
+print total;
+'''}
+
+
+# obj.method() in a loop, for counting what one method call allocates.
+INVOKE_SAMPLE = '''class Counter {{
+  init() {{ this.total = 0; }}
+  add(k) {{
+    this.total = this.total + k;
+    return this;
+  }}
+}}
+
+var counter = Counter();
+for (var i = 0; i < {calls}; i = i + 1) counter.add(i);
+print counter.total;
+'''
+
+
+def generateSource(chunks):
+    return "".join(SAMPLE.format(n=n) for n in range(chunks))
+
+
+def generateExpressions(chunks):
+    return "".join(EXPRESSION_SAMPLE.format(n=n) for n in range(chunks))
+
+
+def timeIt(func, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best, result
+
+
+def tokenTuples(tokens):
+    return [(token.type, token.lexeme, token.literal, token.line) for token in tokens]
+
+
+def benchmarkScanner(chunks, repeat):
+    source = generateSource(chunks)
+    print("scanner: {:d} bytes, {:d} lines".format(len(source), source.count("\n")))
+
+    engines = [("classic", Scanner.Scanner), ("regex", RegexScanner.RegexScanner)]
+    streams = []
+    for name, engine in engines:
+        elapsed, tokens = timeIt(lambda: engine(source).scanTokens(), repeat)
+        streams.append(tokenTuples(tokens))
+        print("  {:8s} {:9d} tokens {:8.3f}s {:12.0f} tokens/sec".format(
+            name, len(tokens), elapsed, len(tokens) / elapsed))
+
+    if any(stream != streams[0] for stream in streams):
+        print("  token streams differ!")
+        return 1
+
+    return 0
+
+
+def measureMemory(func):
+    tracemalloc.start()
+    try:
+        result = func()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return size, result
+
+
+def benchmarkTokens(chunks, repeat):
+    source = generateSource(chunks)
+    print("tokens: {:d} bytes, {:d} lines".format(len(source), source.count("\n")))
+
+    scanners = [("Token list", lambda: RegexScanner.RegexScanner(source).scanTokens(), Parser.Parser),
+                ("TokenBuffer", lambda: RegexScanner.RegexScanner(source).scanTokenBuffer(), Parser.BufferParser)]
+    for name, scan, parserClass in scanners:
+        size, tokens = measureMemory(scan)
+        elapsed, _ = timeIt(lambda: parserClass(tokens).parse(), repeat)
+        print("  {:12s} {:8.1f} bytes/token {:8.3f}s parse".format(name, size / len(tokens), elapsed))
+
+    return 0
+
+
+def benchmarkParser(chunks, repeat):
+    source = generateExpressions(chunks)
+    tokens = RegexScanner.RegexScanner(source).scanTokens()
+    print("parser: {:d} tokens of expression-heavy input".format(len(tokens)))
+
+    for name, descent in [("descent", True), ("pratt", False)]:
+        def parse():
+            parser = Parser.Parser(tokens)
+            parser.descent = descent
+            return parser.parse()
+
+        elapsed, statements = timeIt(parse, repeat)
+        nodes = countNodes(statements)
+        print("  {:8s} {:9d} nodes {:8.3f}s {:12.0f} nodes/sec".format(name, nodes, elapsed, nodes / elapsed))
+
+    return 0
+
+
+def benchmarkFrontEnd(chunks, repeat, workers):
+    source = generateSource(chunks)
+    print("front end: {:d} bytes, {:d} lines".format(len(source), source.count("\n")))
+
+    lox = Pylox.Lox
+    elapsed, _ = timeIt(lambda: lox.parse(lox.scan(source)[1]), repeat)
+    print("  {:12s} {:8.3f}s".format("sequential", elapsed))
+
+    # --workers caps the pool sizes tried.
+    limit = workers or os.cpu_count() or 1
+    counts = sorted({count for count in (1, 2, 4, limit) if count <= limit})
+    for count in counts:
+        elapsed, _ = timeIt(lambda: ParallelFrontEnd.parseSources([source], count), repeat)
+        print("  {:12s} {:8.3f}s".format("{:d} workers".format(count), elapsed))
+
+    return 0
+
+
+def benchmarkCache(chunks, repeat):
+    source = generateSource(chunks)
+    print("cache: {:d} bytes, {:d} lines".format(len(source), source.count("\n")))
+
+    lox = Pylox.Lox
+    cache = ProgramCache(os.path.join(os.environ.get("TMPDIR", "/tmp"), "pylox-benchmark-cache"))
+    key = cache.key([source])
+
+    def frontEnd():
+        statements = lox.parse(lox.scan(source)[1])
+        Resolver.Resolver().resolveProgram(statements)
+        return statements
+
+    elapsed, statements = timeIt(frontEnd, repeat)
+    print("  {:12s} {:8.3f}s".format("front end", elapsed))
+
+    elapsed, _ = timeIt(lambda: cache.store(key, statements), repeat)
+    print("  {:12s} {:8.3f}s {:10d} bytes".format("store", elapsed, os.path.getsize(cache.path(key))))
+
+    elapsed, _ = timeIt(lambda: cache.load(key), repeat)
+    print("  {:12s} {:8.3f}s".format("load", elapsed))
+    cache.clear()
+
+    return 0
+
+
+def benchmarkAst(chunks, repeat):
+    source = generateSource(chunks) + generateExpressions(chunks)
+    tokens = RegexScanner.RegexScanner(source).scanTokens()
+    print("ast: {:d} tokens".format(len(tokens)))
+
+    def parseTree(tokens):
+        return Parser.Parser(tokens).parse()
+
+    def parseFlat(tokens):
+        parser = Parser.Parser(tokens)
+        parser.nodes = NodeTable()
+        return parser.parse()
+
+    # The memory is what the program keeps once the token list is gone:
+    # tree nodes hold on to their Token objects, a table copies what it
+    # needs of them into its own columns.
+    nodes = None
+    for name, parse in [("tree", parseTree), ("flat", parseFlat)]:
+        size, statements = measureMemory(lambda: parse(RegexScanner.RegexScanner(source).scanTokens()))
+        if nodes is None:
+            nodes = countNodes(statements)
+        elapsed, _ = timeIt(lambda: parse(tokens), repeat)
+        print("  {:12s} {:9d} nodes {:8.1f} bytes/node {:8.3f}s parse {:12.0f} nodes/sec".format(
+            name, nodes, size / nodes, elapsed, nodes / elapsed))
+
+    # Construction alone: one Binary over two Literals per step.
+    count = 100000
+    operator = tokens[0]
+
+    def construct():
+        for _ in range(count):
+            Expr.Binary(Expr.Literal(1.0), operator, Expr.Literal(2.0))
+
+    elapsed, _ = timeIt(construct, repeat)
+    print("  {:12s} {:8.3f}s {:12.0f} nodes/sec".format("construct", elapsed, 3 * count / elapsed))
+
+    return 0
+
+
+def benchmarkEngines(repeat, names):
+    lox = Pylox.Lox
+    lox.cache = None
+    engines = Pylox.Lox.engines
+    print("engines: " + ", ".join(engines))
+
+    for name in names or PROGRAMS:
+        statements = lox.frontEnd([PROGRAMS[name]])
+        statements = lox.resolveStatements(statements)
+        outputs = []
+        times = []
+        for engine in engines:
+            lox.engine = engine
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                elapsed, _ = timeIt(lambda: lox.execute(statements), repeat)
+            outputs.append(output.getvalue())
+            times.append(elapsed)
+
+        print("  {:14s} ".format(name) + " ".join("{:8.3f}s".format(elapsed) for elapsed in times) +
+              "  x{:.2f}".format(times[0] / min(times[1:])))
+        if any(output != outputs[0] for output in outputs):
+            print("  outputs differ!")
+            return 1
+
+    return 0
+
+
+@contextlib.contextmanager
+def countingInstances(classes):
+    """Counts the instances of each class created inside the block."""
+    counts = {cls: 0 for cls in classes}
+    originals = {cls: cls.__init__ for cls in classes}
+
+    def counting(cls, original):
+        def __init__(self, *args, **kwargs):
+            counts[cls] += 1
+            original(self, *args, **kwargs)
+        return __init__
+
+    for cls in classes:
+        cls.__init__ = counting(cls, originals[cls])
+    try:
+        yield counts
+    finally:
+        for cls in classes:
+            cls.__init__ = originals[cls]
+
+
+def benchmarkAllocations(calls):
+    lox = Pylox.Lox
+    lox.cache = None
+    # What each engine would allocate to bind or to run a method.
+    engines = {"tree": [Environment.Environment, LoxFunction.LoxFunction],
+               "closure": [Environment.Environment, LoxFunction.LoxFunction],
+               "vm": [VM.VMBoundMethod]}
+    print("allocations per obj.method() call: {:d} calls".format(calls))
+
+    # The difference between running calls and 2 * calls leaves out what
+    # the program allocates once: the class, its methods and the loop.
+    for engine, classes in engines.items():
+        lox.engine = engine
+        totals = []
+        for count in (calls, 2 * calls):
+            statements = lox.resolveStatements(lox.frontEnd([INVOKE_SAMPLE.format(calls=count)]))
+            with contextlib.redirect_stdout(io.StringIO()), countingInstances(classes) as counts:
+                lox.execute(statements)
+            totals.append(counts)
+        print("  {:12s} ".format(engine) + " ".join(
+            "{:8.2f} {:s}".format((totals[1][cls] - totals[0][cls]) / calls, cls.__name__) for cls in classes))
+
+    return 0
+
+
+def main(argv):
+    argparser = argparse.ArgumentParser(prog="Benchmark.py")
+    argparser.add_argument("benchmark", choices=["scanner", "tokens", "parser", "frontend", "cache", "ast", "engines",
+                                                 "allocations"])
+    argparser.add_argument("programs", nargs="*", help="engines: which of the programs to run")
+    argparser.add_argument("--size", type=int, default=2000, help="number of generated source chunks")
+    argparser.add_argument("--workers", type=int, default=0, help="largest process pool to try")
+    argparser.add_argument("--repeat", type=int, default=3, help="keep the best of this many runs")
+    args = argparser.parse_args(argv[1:])
+
+    if args.benchmark == "scanner":
+        return benchmarkScanner(args.size, args.repeat)
+    elif args.benchmark == "parser":
+        return benchmarkParser(args.size, args.repeat)
+    elif args.benchmark == "frontend":
+        return benchmarkFrontEnd(args.size, args.repeat, args.workers)
+    elif args.benchmark == "engines":
+        return benchmarkEngines(args.repeat, args.programs)
+    elif args.benchmark == "ast":
+        return benchmarkAst(args.size, args.repeat)
+    elif args.benchmark == "cache":
+        return benchmarkCache(args.size, args.repeat)
+    elif args.benchmark == "tokens":
+        return benchmarkTokens(args.size, args.repeat)
+    elif args.benchmark == "allocations":
+        return benchmarkAllocations(args.size)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,419 @@
+# coding=utf-8
+
+import Expr
+import Stmt
+from TokenType import TokenType
+from Resolver import FunctionType
+from Chunk import OpCode, VMFunction
+
+
+BINARY_OPCODES = {TokenType.EQUAL_EQUAL: OpCode.EQUAL,
+                  TokenType.BANG_EQUAL: OpCode.NOT_EQUAL,
+                  TokenType.GREATER: OpCode.GREATER,
+                  TokenType.GREATER_EQUAL: OpCode.GREATER_EQUAL,
+                  TokenType.LESS: OpCode.LESS,
+                  TokenType.LESS_EQUAL: OpCode.LESS_EQUAL,
+                  TokenType.PLUS: OpCode.ADD,
+                  TokenType.MINUS: OpCode.SUBTRACT,
+                  TokenType.STAR: OpCode.MULTIPLY,
+                  TokenType.SLASH: OpCode.DIVIDE}
+
+
+class Local(object):
+    __slots__ = ("name", "depth", "captured")
+
+    def __init__(self, name, depth):
+        self.name = name
+        self.depth = depth
+        self.captured = False
+
+
+class FunctionState(object):
+    """What the compiler tracks for the function it is in the middle of."""
+
+    def __init__(self, enclosing, function, type):
+        self.enclosing = enclosing
+        self.function = function
+        self.type = type
+        # Slot 0 holds the callee, or the receiver in a method.
+        receiver = "this" if type in (FunctionType.METHOD, FunctionType.INITIALIZER) else ""
+        self.locals = [Local(receiver, 0)]
+        self.upvalues = []
+        self.scopeDepth = 0
+
+
+class BytecodeCompiler(Expr.Visitor, Stmt.Visitor):
+    """Compiles a resolved program to bytecode for the VM.
+
+    Like clox, a variable declared in a scope gets a stack slot of its
+    function's frame, a variable of an enclosing function is reached through
+    an upvalue, and everything else is a global, addressed by its slot in
+    the interpreter's global table. The
+    scopes follow the ones the Resolver uses, so names bind exactly as they
+    do in the tree walker, which has already reported any static error.
+
+    Every instruction that can fail is emitted with the line of the token
+    the tree walker would report it at.
+    """
+
+    def __init__(self, globals):
+        self.globals = globals
+        self.state = None
+        self.line = 0
+
+    def compileScript(self, statements):
+        self.state = FunctionState(None, VMFunction(None), FunctionType.NONE)
+        for statement in statements:
+            self.compile(statement)
+        self.emitReturn()
+
+        function = self.state.function
+        self.state = None
+        return function
+
+    def compile(self, node):
+        node.accept(self)
+
+    @property
+    def chunk(self):
+        return self.state.function.chunk
+
+    def emit(self, *words):
+        chunk = self.chunk
+        for word in words:
+            offset = chunk.write(word, self.line)
+
+        return offset
+
+    def emitConstant(self, value):
+        self.emit(OpCode.CONSTANT, self.chunk.addConstant(value))
+
+    def emitJump(self, op):
+        return self.emit(op, -1)
+
+    def patchJump(self, offset):
+        self.chunk.code[offset] = len(self.chunk.code)
+
+    def emitReturn(self):
+        if self.state.type == FunctionType.INITIALIZER:
+            self.emit(OpCode.GET_LOCAL, 0)
+        else:
+            self.emit(OpCode.NIL)
+        self.emit(OpCode.RETURN)
+
+    def beginScope(self):
+        self.state.scopeDepth += 1
+
+    def endScope(self):
+        state = self.state
+        state.scopeDepth -= 1
+        while state.locals and state.locals[-1].depth > state.scopeDepth:
+            if state.locals.pop().captured:
+                self.emit(OpCode.CLOSE_UPVALUE)
+            else:
+                self.emit(OpCode.POP)
+
+    def declareVariable(self, name):
+        if self.state.scopeDepth == 0:
+            return
+
+        self.state.locals.append(Local(name.lexeme, self.state.scopeDepth))
+
+    def defineVariable(self, name):
+        if self.state.scopeDepth > 0:
+            return
+
+        self.emit(OpCode.DEFINE_GLOBAL, self.globals.slot(name.lexeme))
+
+    def resolveLocal(self, state, name):
+        for slot in range(len(state.locals) - 1, -1, -1):
+            if state.locals[slot].name == name:
+                return slot
+
+        return -1
+
+    def resolveUpvalue(self, state, name):
+        if state.enclosing is None:
+            return -1
+
+        slot = self.resolveLocal(state.enclosing, name)
+        if slot != -1:
+            state.enclosing.locals[slot].captured = True
+            return self.addUpvalue(state, True, slot)
+
+        upvalue = self.resolveUpvalue(state.enclosing, name)
+        if upvalue != -1:
+            return self.addUpvalue(state, False, upvalue)
+
+        return -1
+
+    def addUpvalue(self, state, isLocal, index):
+        upvalue = (isLocal, index)
+        if upvalue in state.upvalues:
+            return state.upvalues.index(upvalue)
+
+        state.upvalues.append(upvalue)
+        return len(state.upvalues) - 1
+
+    def namedVariable(self, name, line, assign=False, constant=False):
+        self.line = line
+        slot = self.resolveLocal(self.state, name)
+        if slot != -1:
+            self.emit(OpCode.SET_LOCAL if assign else OpCode.GET_LOCAL, slot)
+            return
+
+        upvalue = self.resolveUpvalue(self.state, name)
+        if upvalue != -1:
+            self.emit(OpCode.SET_UPVALUE if assign else OpCode.GET_UPVALUE, upvalue)
+            return
+
+        slot = self.globals.slot(name)
+        if assign:
+            self.emit(OpCode.SET_GLOBAL, slot)
+        else:
+            self.emit(OpCode.GET_CONSTANT_GLOBAL if constant else OpCode.GET_GLOBAL, slot)
+
+    def function(self, stmt: Stmt.Function, type):
+        state = FunctionState(self.state, VMFunction(stmt.name.lexeme, len(stmt.params)), type)
+        self.state = state
+        self.beginScope()
+        for param in stmt.params:
+            self.declareVariable(param)
+
+        for statement in stmt.body:
+            self.compile(statement)
+        self.emitReturn()
+
+        self.state = state.enclosing
+        state.function.upvalueCount = len(state.upvalues)
+        self.line = stmt.name.line
+        self.emit(OpCode.CLOSURE, self.chunk.addConstant(state.function))
+        for isLocal, index in state.upvalues:
+            self.emit(1 if isLocal else 0, index)
+
+    def visitBlockStmt(self, stmt: Stmt.Block):
+        self.beginScope()
+        for statement in stmt.statements:
+            self.compile(statement)
+        self.endScope()
+
+    def visitExpressionStmt(self, stmt: Stmt.Expression):
+        self.compile(stmt.expression)
+        self.emit(OpCode.POP)
+
+    def visitFunctionStmt(self, stmt: Stmt.Function):
+        # Declared before its body is compiled, so it can call itself.
+        self.declareVariable(stmt.name)
+        self.function(stmt, FunctionType.FUNCTION)
+        self.defineVariable(stmt.name)
+
+    def visitClassStmt(self, stmt: Stmt.Class):
+        name = stmt.name
+        self.line = name.line
+        self.declareVariable(name)
+        self.emit(OpCode.CLASS, self.chunk.addConstant(name.lexeme))
+        self.defineVariable(name)
+
+        if stmt.superclass is not None:
+            superclass = stmt.superclass.name
+            self.namedVariable(superclass.lexeme, superclass.line)
+            # The superclass stays on the stack as the local "super" that
+            # the methods capture.
+            self.beginScope()
+            self.state.locals.append(Local("super", self.state.scopeDepth))
+            self.namedVariable(name.lexeme, name.line)
+            self.line = superclass.line
+            self.emit(OpCode.INHERIT)
+
+        self.namedVariable(name.lexeme, name.line)
+        for method in stmt.methods:
+            type = FunctionType.INITIALIZER if method.name.lexeme == "init" else FunctionType.METHOD
+            self.function(method, type)
+            self.emit(OpCode.METHOD, self.chunk.addConstant(method.name.lexeme))
+        self.emit(OpCode.POP)
+
+        if stmt.superclass is not None:
+            self.endScope()
+
+    def visitIfStmt(self, stmt: Stmt.If):
+        self.compile(stmt.condition)
+        elseJump = self.emitJump(OpCode.POP_JUMP_IF_FALSE)
+        self.compile(stmt.thenBranch)
+        if stmt.elseBranch is None:
+            self.patchJump(elseJump)
+            return
+
+        endJump = self.emitJump(OpCode.JUMP)
+        self.patchJump(elseJump)
+        self.compile(stmt.elseBranch)
+        self.patchJump(endJump)
+
+    def visitPrintStmt(self, stmt: Stmt.Print):
+        self.compile(stmt.expression)
+        self.emit(OpCode.PRINT)
+
+    def visitReturnStmt(self, stmt: Stmt.Return):
+        self.line = stmt.keyword.line
+        if stmt.value is None:
+            self.emitReturn()
+            return
+
+        self.compile(stmt.value)
+        self.emit(OpCode.RETURN)
+
+    def visitVarStmt(self, stmt: Stmt.Var):
+        self.line = stmt.name.line
+        if stmt.initializer is None:
+            self.emit(OpCode.NIL)
+        else:
+            self.compile(stmt.initializer)
+
+        self.declareVariable(stmt.name)
+        self.defineVariable(stmt.name)
+
+    def visitWhileStmt(self, stmt: Stmt.While):
+        loopStart = len(self.chunk.code)
+        self.compile(stmt.condition)
+        exitJump = self.emitJump(OpCode.POP_JUMP_IF_FALSE)
+        self.compile(stmt.body)
+        self.emit(OpCode.JUMP, loopStart)
+        self.patchJump(exitJump)
+
+    def visitForStmt(self, stmt: Stmt.For):
+        self.beginScope()
+        if stmt.initializer is not None:
+            self.compile(stmt.initializer)
+
+        loopStart = len(self.chunk.code)
+        exitJump = None
+        if stmt.condition is not None:
+            self.compile(stmt.condition)
+            exitJump = self.emitJump(OpCode.POP_JUMP_IF_FALSE)
+
+        self.compile(stmt.body)
+        if stmt.increment is not None:
+            self.compile(stmt.increment)
+            self.emit(OpCode.POP)
+        self.emit(OpCode.JUMP, loopStart)
+
+        if exitJump is not None:
+            self.patchJump(exitJump)
+        self.endScope()
+
+    def visitAssignExpr(self, expr: Expr.Assign):
+        self.compile(expr.value)
+        self.namedVariable(expr.name.lexeme, expr.name.line, assign=True)
+
+    def visitBinaryExpr(self, expr: Expr.Binary):
+        self.compile(expr.left)
+        self.compile(expr.right)
+        self.line = expr.operator.line
+        op = BINARY_OPCODES.get(expr.operator.type)
+        if op is None:
+            # Not produced by the parser; evaluates both sides to nil like
+            # the tree walker does.
+            self.emit(OpCode.POP, OpCode.POP, OpCode.NIL)
+            return
+
+        self.emit(op)
+
+    def visitCallExpr(self, expr: Expr.Call):
+        if isinstance(expr.callee, Expr.Get):
+            self.invoke(expr, expr.callee)
+            return
+        if isinstance(expr.callee, Expr.Super):
+            self.superInvoke(expr, expr.callee)
+            return
+
+        self.compile(expr.callee)
+        for argument in expr.arguments:
+            self.compile(argument)
+
+        self.line = expr.paren.line
+        self.emit(OpCode.CALL, len(expr.arguments))
+
+    def invoke(self, expr: Expr.Call, get: Expr.Get):
+        # obj.name(...) runs a method with obj as its receiver instead of
+        # binding it; see Chunk. The method is found before the arguments
+        # are evaluated, as the tree walker does.
+        self.compile(get.object)
+        self.line = get.name.line
+        self.emit(OpCode.FIND_METHOD, self.chunk.addConstant(get.name.lexeme), self.chunk.addCache())
+        for argument in expr.arguments:
+            self.compile(argument)
+
+        self.emitInvoke(expr)
+
+    def superInvoke(self, expr: Expr.Call, superExpr: Expr.Super):
+        self.namedVariable("this", superExpr.keyword.line)
+        self.namedVariable("super", superExpr.keyword.line)
+        self.line = superExpr.method.line
+        self.emit(OpCode.FIND_SUPER_METHOD, self.chunk.addConstant(superExpr.method.lexeme))
+        for argument in expr.arguments:
+            self.compile(argument)
+
+        self.emitInvoke(expr)
+
+    def emitInvoke(self, expr: Expr.Call):
+        self.line = expr.paren.line
+        self.emit(OpCode.INVOKE, len(expr.arguments), OpCode.CALL, len(expr.arguments))
+
+    def visitGetExpr(self, expr: Expr.Get):
+        self.compile(expr.object)
+        self.line = expr.name.line
+        self.emit(OpCode.GET_PROPERTY, self.chunk.addConstant(expr.name.lexeme), self.chunk.addCache())
+
+    def visitGroupingExpr(self, expr: Expr.Grouping):
+        self.compile(expr.expression)
+
+    def visitLiteralExpr(self, expr: Expr.Literal):
+        if expr.value is None:
+            self.emit(OpCode.NIL)
+        elif expr.value is True:
+            self.emit(OpCode.TRUE)
+        elif expr.value is False:
+            self.emit(OpCode.FALSE)
+        else:
+            self.emitConstant(expr.value)
+
+    def visitLogicalExpr(self, expr: Expr.Logical):
+        self.compile(expr.left)
+        if expr.operator.type == TokenType.OR:
+            endJump = self.emitJump(OpCode.JUMP_IF_TRUE)
+        else:
+            endJump = self.emitJump(OpCode.JUMP_IF_FALSE)
+
+        self.emit(OpCode.POP)
+        self.compile(expr.right)
+        self.patchJump(endJump)
+
+    def visitSetExpr(self, expr: Expr.Set):
+        self.compile(expr.object)
+        # The tree walker checks the object before evaluating the value.
+        self.line = expr.name.line
+        self.emit(OpCode.CHECK_INSTANCE)
+        self.compile(expr.value)
+        self.line = expr.name.line
+        self.emit(OpCode.SET_PROPERTY, self.chunk.addConstant(expr.name.lexeme), self.chunk.addCache())
+
+    def visitSuperExpr(self, expr: Expr.Super):
+        self.namedVariable("this", expr.keyword.line)
+        self.namedVariable("super", expr.keyword.line)
+        self.line = expr.method.line
+        self.emit(OpCode.GET_SUPER, self.chunk.addConstant(expr.method.lexeme))
+
+    def visitThisExpr(self, expr: Expr.This):
+        self.namedVariable("this", expr.keyword.line)
+
+    def visitUnaryExpr(self, expr: Expr.Unary):
+        self.compile(expr.right)
+        self.line = expr.operator.line
+        if expr.operator.type == TokenType.MINUS:
+            self.emit(OpCode.NEGATE)
+        elif expr.operator.type == TokenType.BANG:
+            self.emit(OpCode.NOT)
+        else:
+            self.emit(OpCode.POP, OpCode.NIL)
+
+    def visitVariableExpr(self, expr: Expr.Variable):
+        self.namedVariable(expr.name.lexeme, expr.name.line, constant=expr.constant)
@@ -0,0 +1,148 @@
+# coding=utf-8
+
+from array import array
+from Shape import InlineCache
+
+
+class OpCode:
+    CONSTANT = 0
+    NIL = 1
+    TRUE = 2
+    FALSE = 3
+    POP = 4
+    GET_LOCAL = 5
+    SET_LOCAL = 6
+    GET_GLOBAL = 7
+    DEFINE_GLOBAL = 8
+    SET_GLOBAL = 9
+    GET_UPVALUE = 10
+    SET_UPVALUE = 11
+    GET_PROPERTY = 12
+    SET_PROPERTY = 13
+    CHECK_INSTANCE = 14
+    GET_SUPER = 15
+    EQUAL = 16
+    NOT_EQUAL = 17
+    GREATER = 18
+    GREATER_EQUAL = 19
+    LESS = 20
+    LESS_EQUAL = 21
+    ADD = 22
+    SUBTRACT = 23
+    MULTIPLY = 24
+    DIVIDE = 25
+    NOT = 26
+    NEGATE = 27
+    PRINT = 28
+    JUMP = 29
+    JUMP_IF_FALSE = 30
+    JUMP_IF_TRUE = 31
+    POP_JUMP_IF_FALSE = 32
+    CALL = 33
+    CLOSURE = 34
+    CLOSE_UPVALUE = 35
+    RETURN = 36
+    CLASS = 37
+    INHERIT = 38
+    METHOD = 39
+    GET_CONSTANT_GLOBAL = 40
+    FIND_METHOD = 41
+    INVOKE = 42
+    FIND_SUPER_METHOD = 43
+
+
+# Number of operand words after each opcode; CLOSURE is followed by two
+# more words per upvalue on top of this.
+OPERAND_COUNTS = {OpCode.CONSTANT: 1, OpCode.GET_LOCAL: 1, OpCode.SET_LOCAL: 1,
+                  OpCode.GET_GLOBAL: 1, OpCode.DEFINE_GLOBAL: 1, OpCode.SET_GLOBAL: 1, OpCode.GET_CONSTANT_GLOBAL: 1,
+                  OpCode.GET_UPVALUE: 1, OpCode.SET_UPVALUE: 1,
+                  OpCode.GET_PROPERTY: 2, OpCode.SET_PROPERTY: 2, OpCode.FIND_METHOD: 2, OpCode.INVOKE: 1,
+                  OpCode.GET_SUPER: 1, OpCode.FIND_SUPER_METHOD: 1, OpCode.JUMP: 1, OpCode.JUMP_IF_FALSE: 1, OpCode.JUMP_IF_TRUE: 1,
+                  OpCode.POP_JUMP_IF_FALSE: 1, OpCode.CALL: 1, OpCode.CLOSURE: 1,
+                  OpCode.CLASS: 1, OpCode.METHOD: 1}
+
+OPCODE_NAMES = {value: name for name, value in vars(OpCode).items() if not name.startswith("_")}
+
+
+class Chunk(object):
+    """A unit of bytecode: one function's code.
+
+    The code is wordcode: every opcode and every operand is one int of the
+    code array, and jumps hold absolute offsets. lines has the source line
+    of each word, so an error can be reported where the tree walker would.
+    GET_PROPERTY, SET_PROPERTY and FIND_METHOD take a second operand, the
+    index of their site's InlineCache in caches.
+
+    obj.name(...) compiles to FIND_METHOD, the arguments, INVOKE and CALL.
+    FIND_METHOD leaves the receiver and the method on the stack, or nil and
+    the value of a field; INVOKE runs the method with the receiver as its
+    slot 0 and skips the CALL, which is left to call a field's value.
+    super.name(...) is the same with FIND_SUPER_METHOD, which leaves this
+    and the superclass's method.
+    """
+
+    def __init__(self):
+        self.code = array("i")
+        self.lines = array("i")
+        self.constants = []
+        self.constantIndex = dict()
+        self.caches = []
+
+    def write(self, word, line):
+        self.code.append(word)
+        self.lines.append(line)
+        return len(self.code) - 1
+
+    def addConstant(self, value):
+        # Numbers, strings and names are shared. True == 1.0 and
+        # -0.0 == 0.0 in Python, so the key is the type and the repr.
+        # Functions are always added.
+        if isinstance(value, (float, str)):
+            key = (type(value), repr(value))
+            index = self.constantIndex.get(key)
+            if index is None:
+                index = self.constantIndex[key] = len(self.constants)
+                self.constants.append(value)
+            return index
+
+        self.constants.append(value)
+        return len(self.constants) - 1
+
+    def addCache(self):
+        self.caches.append(InlineCache())
+        return len(self.caches) - 1
+
+    def disassemble(self, name):
+        lines = ["== " + name + " =="]
+        offset = 0
+        while offset < len(self.code):
+            op = self.code[offset]
+            count = OPERAND_COUNTS.get(op, 0)
+            operands = list(self.code[offset + 1:offset + 1 + count])
+            if op == OpCode.CLOSURE:
+                count += 2 * self.constants[operands[0]].upvalueCount
+            text = "{:04d} {:4d} {:16s}".format(offset, self.lines[offset], OPCODE_NAMES[op])
+            text += " ".join(str(operand) for operand in self.code[offset + 1:offset + 1 + count])
+            if op in (OpCode.CONSTANT, OpCode.GET_PROPERTY, OpCode.SET_PROPERTY, OpCode.FIND_METHOD,
+                      OpCode.GET_SUPER, OpCode.FIND_SUPER_METHOD, OpCode.CLASS, OpCode.METHOD, OpCode.CLOSURE):
+                text += " '" + str(self.constants[operands[0]]) + "'"
+            lines.append(text)
+            offset += 1 + count
+
+        return "\n".join(lines)
+
+
+class VMFunction(object):
+    """A compiled Lox function: its chunk, arity and upvalue count."""
+
+    def __init__(self, name, arity=0):
+        self.name = name
+        self.arity = arity
+        self.upvalueCount = 0
+        self.chunk = Chunk()
+
+    def __repr__(self):
+        if self.name is None:
+            return "<script>"
+
+        return "<fn " + self.name + ">"
@@ -0,0 +1,626 @@
+# coding=utf-8
+
+from typing import List
+import Expr
+import Stmt
+from TokenType import TokenType
+import Pylox
+from RuntimeError import PyloxRuntimeError
+from Environment import Environment, UNDEFINED
+from LoxFunction import LoxCallable, LoxFunction, NativeFunction, NativeMethod
+from Return import RETURN
+from LoxClass import LoxClass, LoxInstance
+from CountedLoop import CountedLoop
+from Shape import InlineCache
+
+
+def isTruthy(value):
+    return value is not None and value is not False
+
+
+def sequence(statements):
+    statements = tuple(statements)
+    if len(statements) == 1:
+        return statements[0]
+
+    def run(environment):
+        for statement in statements:
+            if statement(environment) is RETURN:
+                return RETURN
+
+    return run
+
+
+def callFunction(interpreter, paren, function, values: List[object], tail):
+    if not isinstance(function, LoxCallable):
+        raise PyloxRuntimeError(paren, "Can only call functions and classes.")
+
+    if len(values) != function.arity:
+        raise PyloxRuntimeError(paren, "Expected " + str(function.arity) + " arguments but got " +
+                                str(len(values)) + ".")
+
+    if tail and isinstance(function, LoxFunction) and not function.isInitializer:
+        return function.tailCall(interpreter, function.receiver, values)
+
+    if isinstance(function, NativeFunction):
+        return function.call(interpreter, values, paren)
+
+    return function(interpreter, values)
+
+
+class CompiledFunction(LoxFunction):
+    """A LoxFunction whose body has been compiled to a closure."""
+
+    def __init__(self, declaration: Stmt.Function, body, closure: Environment, isInitializer,
+                 isMethod=False, receiver=None):
+        super(CompiledFunction, self).__init__(declaration, closure, isInitializer, isMethod, receiver)
+        self.body = body
+
+    def run(self, interpreter, environment):
+        if self.body(environment) is not RETURN:
+            return None
+
+        if interpreter.pendingCall is not None:
+            self.runTailCalls(interpreter)
+
+        return interpreter.returnValue
+
+    def execute(self, interpreter, environment):
+        return self.body(environment)
+
+    def bind(self, instance):
+        return CompiledFunction(self.declaration, self.body, self.closure, self.isInitializer, True, instance)
+
+
+class Compiler(Expr.Visitor, Stmt.Visitor):
+    """Execution engine that compiles the resolved tree into Python closures.
+
+    Every node is compiled once into a closure that takes the current
+    Environment. Operands are compiled closures, and operators, names,
+    tokens and resolved slots are bound as closure variables. Running the
+    program then calls closures directly: no accept() double dispatch, no
+    binaryOp lookups, no node attribute reads.
+
+    It shares the interpreter's globals and output formatting, and behaves
+    like Interpreter, runtime errors included.
+    """
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+
+    def interpret(self, statements):
+        try:
+            program = self.compileStatements(statements)
+            program(self.interpreter.globals)
+        except PyloxRuntimeError as error:
+            Pylox.Lox.runtimeError(error)
+
+    def compile(self, node):
+        return node.accept(self)
+
+    def compileStatements(self, statements):
+        return sequence(self.compile(statement) for statement in statements)
+
+    def key(self, stmt):
+        # Where a declaration stores its value: a global (no slot) is only
+        # declared at the top level, where the environment is the
+        # interpreter's globals, so the key is its slot there.
+        if stmt.slot is None:
+            return self.interpreter.globals.slot(stmt.name.lexeme)
+
+        return stmt.slot
+
+    def lookUp(self, name, expr):
+        depth = expr.depth
+        slot = expr.slot
+        if depth is None:
+            values = self.interpreter.globals.values
+            slot = self.interpreter.globals.slot(name.lexeme)
+
+            def getGlobal(environment):
+                value = values[slot]
+                if value is UNDEFINED:
+                    raise PyloxRuntimeError(name, "Undefined variable '" + name.lexeme + "'.")
+                return value
+
+            return getGlobal
+
+        if depth == 0:
+            return lambda environment: environment.values[slot]
+        if depth == 1:
+            return lambda environment: environment.enclosing.values[slot]
+
+        return lambda environment: environment.ancestor(depth).values[slot]
+
+    def visitBlockStmt(self, stmt: Stmt.Block):
+        body = self.compileStatements(stmt.statements)
+        size = stmt.size
+
+        def block(environment):
+            return body(Environment(environment, [None] * size))
+
+        return block
+
+    def visitExpressionStmt(self, stmt: Stmt.Expression):
+        return self.compile(stmt.expression)
+
+    def visitFunctionStmt(self, stmt: Stmt.Function):
+        body = self.compileStatements(stmt.body)
+        key = self.key(stmt)
+
+        def function(environment):
+            environment.values[key] = CompiledFunction(stmt, body, environment, False)
+
+        return function
+
+    def visitClassStmt(self, stmt: Stmt.Class):
+        superclassValue = None if stmt.superclass is None else self.compile(stmt.superclass)
+        superclassName = None if stmt.superclass is None else stmt.superclass.name
+        name = stmt.name
+        key = self.key(stmt)
+        size = stmt.size
+        methods = [(method, self.compileStatements(method.body)) for method in stmt.methods]
+
+        def klass(environment):
+            superclass = None
+            if superclassValue is not None:
+                superclass = superclassValue(environment)
+                if not isinstance(superclass, LoxClass):
+                    raise PyloxRuntimeError(superclassName, "Superclass must be a class.")
+
+            environment.values[key] = None
+
+            methodEnvironment = environment
+            if superclass is not None:
+                methodEnvironment = Environment(environment, [superclass] + [None] * (size - 1))
+
+            functions = dict()
+            for method, body in methods:
+                functions[method.name.lexeme] = CompiledFunction(method, body, methodEnvironment,
+                                                                 method.name.lexeme == "init", True)
+
+            environment.values[key] = LoxClass(name.lexeme, superclass, functions)
+
+        return klass
+
+    def visitIfStmt(self, stmt: Stmt.If):
+        condition = self.compile(stmt.condition)
+        thenBranch = self.compile(stmt.thenBranch)
+        if stmt.elseBranch is None:
+            def ifThen(environment):
+                if isTruthy(condition(environment)):
+                    return thenBranch(environment)
+
+            return ifThen
+
+        elseBranch = self.compile(stmt.elseBranch)
+
+        def ifThenElse(environment):
+            if isTruthy(condition(environment)):
+                return thenBranch(environment)
+            else:
+                return elseBranch(environment)
+
+        return ifThenElse
+
+    def visitPrintStmt(self, stmt: Stmt.Print):
+        expression = self.compile(stmt.expression)
+        stringify = self.interpreter.stringify
+
+        def printStatement(environment):
+            print(stringify(expression(environment)))
+
+        return printStatement
+
+    def visitReturnStmt(self, stmt: Stmt.Return):
+        interpreter = self.interpreter
+        if stmt.tail:
+            call = self.compileCall(stmt.value, True)
+
+            def returnCall(environment):
+                value = call(environment)
+                if value is not RETURN:
+                    interpreter.returnValue = value
+                return RETURN
+
+            return returnCall
+
+        if stmt.value is None:
+            def returnNil(environment):
+                interpreter.returnValue = None
+                return RETURN
+
+            return returnNil
+
+        value = self.compile(stmt.value)
+
+        def returnValue(environment):
+            interpreter.returnValue = value(environment)
+            return RETURN
+
+        return returnValue
+
+    def visitVarStmt(self, stmt: Stmt.Var):
+        key = self.key(stmt)
+        if stmt.initializer is None:
+            def declare(environment):
+                environment.values[key] = None
+
+            return declare
+
+        initializer = self.compile(stmt.initializer)
+
+        def define(environment):
+            environment.values[key] = initializer(environment)
+
+        return define
+
+    def visitWhileStmt(self, stmt: Stmt.While):
+        condition = self.compile(stmt.condition)
+        body = self.compile(stmt.body)
+
+        def whileLoop(environment):
+            while isTruthy(condition(environment)):
+                if body(environment) is RETURN:
+                    return RETURN
+
+        return whileLoop
+
+    def visitForStmt(self, stmt: Stmt.For):
+        initializer = None if stmt.initializer is None else self.compile(stmt.initializer)
+        condition = None if stmt.condition is None else self.compile(stmt.condition)
+        increment = None if stmt.increment is None else self.compile(stmt.increment)
+        body = self.compile(stmt.body)
+        size = stmt.size
+
+        def loop(environment):
+            while condition is None or isTruthy(condition(environment)):
+                if body(environment) is RETURN:
+                    return RETURN
+                if increment is not None:
+                    increment(environment)
+
+        counted = CountedLoop.match(stmt)
+        if counted is None:
+            def forLoop(environment):
+                environment = Environment(environment, [None] * size)
+                if initializer is not None:
+                    initializer(environment)
+                return loop(environment)
+
+            return forLoop
+
+        # See Interpreter.runCountedLoop.
+        slot = counted.slot
+        bound = self.compile(counted.bound)
+        step = counted.step
+        inclusive = counted.inclusive
+
+        def countedLoop(environment):
+            environment = Environment(environment, [None] * size)
+            initializer(environment)
+            values = environment.values
+            i = values[slot]
+            last = bound(environment)
+            if not isinstance(i, float) or not isinstance(last, float):
+                return loop(environment)
+
+            if inclusive:
+                while i <= last:
+                    values[slot] = i
+                    if body(environment) is RETURN:
+                        return RETURN
+                    i += step
+            else:
+                while i < last:
+                    values[slot] = i
+                    if body(environment) is RETURN:
+                        return RETURN
+                    i += step
+            values[slot] = i
+
+        return countedLoop
+
+    def visitAssignExpr(self, expr: Expr.Assign):
+        value = self.compile(expr.value)
+        name = expr.name
+        depth = expr.depth
+        slot = expr.slot
+        if depth is None:
+            assignSlot = self.interpreter.globals.assignSlot
+            slot = self.interpreter.globals.slot(name.lexeme)
+
+            def assign(environment):
+                result = value(environment)
+                assignSlot(slot, name, result)
+                return result
+
+            return assign
+
+        if depth == 0:
+            def assignLocal(environment):
+                result = value(environment)
+                environment.values[slot] = result
+                return result
+
+            return assignLocal
+
+        def assignAt(environment):
+            result = value(environment)
+            environment.ancestor(depth).values[slot] = result
+            return result
+
+        return assignAt
+
+    def visitBinaryExpr(self, expr: Expr.Binary):
+        left = self.compile(expr.left)
+        right = self.compile(expr.right)
+        operator = expr.operator
+        tokentype = operator.type
+
+        if tokentype == TokenType.PLUS:
+            def add(environment):
+                a = left(environment)
+                b = right(environment)
+                if isinstance(a, float) and isinstance(b, float):
+                    return a + b
+                if isinstance(a, str) and isinstance(b, str):
+                    return a + b
+                raise PyloxRuntimeError(operator, "Operands must be two numbers or two strings.")
+
+            return add
+
+        if tokentype == TokenType.EQUAL_EQUAL:
+            return lambda environment: left(environment) == right(environment)
+        if tokentype == TokenType.BANG_EQUAL:
+            return lambda environment: not (left(environment) == right(environment))
+
+        if tokentype == TokenType.SLASH:
+            def divide(environment):
+                a = left(environment)
+                b = right(environment)
+                if not (isinstance(a, float) and isinstance(b, float)):
+                    raise PyloxRuntimeError(operator, "Operand must be a number.")
+                if abs(b) < 1e-15:
+                    raise PyloxRuntimeError(operator, "Float division must be non-zero.")
+                return a / b
+
+            return divide
+
+        op = NUMBER_OPERATORS.get(tokentype)
+        if op is None:
+            def unknown(environment):
+                left(environment)
+                right(environment)
+                return None
+
+            return unknown
+
+        def arithmetic(environment):
+            a = left(environment)
+            b = right(environment)
+            if isinstance(a, float) and isinstance(b, float):
+                return op(a, b)
+            raise PyloxRuntimeError(operator, "Operand must be a number.")
+
+        return arithmetic
+
+    def visitCallExpr(self, expr: Expr.Call):
+        return self.compileCall(expr, False)
+
+    def compileCall(self, expr: Expr.Call, tail):
+        # In tail position (see Interpreter.visitReturnStmt) a call to a Lox
+        # function returns RETURN and leaves the call pending.
+        if isinstance(expr.callee, Expr.Get):
+            return self.invoke(expr, expr.callee, tail)
+
+        callee = self.compile(expr.callee)
+        arguments = [self.compile(argument) for argument in expr.arguments]
+        paren = expr.paren
+        interpreter = self.interpreter
+
+        if tail:
+            def tailCall(environment):
+                function = callee(environment)
+                values = [argument(environment) for argument in arguments]
+                if isinstance(function, LoxFunction) and not function.isInitializer and \
+                        len(values) == function.arity:
+                    return function.tailCall(interpreter, function.receiver, values)
+
+                return callFunction(interpreter, paren, function, values, False)
+
+            return tailCall
+
+        def call(environment):
+            function = callee(environment)
+            values = [argument(environment) for argument in arguments]
+
+            if not isinstance(function, LoxCallable):
+                raise PyloxRuntimeError(paren, "Can only call functions and classes.")
+
+            if len(values) != function.arity:
+                raise PyloxRuntimeError(paren, "Expected " + str(function.arity) + " arguments but got " +
+                                        str(len(values)) + ".")
+
+            if isinstance(function, NativeFunction):
+                return function.call(interpreter, values, paren)
+
+            return function(interpreter, values)
+
+        return call
+
+    def invoke(self, expr: Expr.Call, get: Expr.Get, tail):
+        # obj.name(...) runs a method with obj as its receiver instead of
+        # binding it; see Interpreter.invoke.
+        obj = self.compile(get.object)
+        name = get.name
+        lexeme = name.lexeme
+        arguments = [self.compile(argument) for argument in expr.arguments]
+        paren = expr.paren
+        interpreter = self.interpreter
+        cache = InlineCache()
+
+        def invoke(environment):
+            instance = obj(environment)
+            if not isinstance(instance, LoxInstance):
+                raise PyloxRuntimeError(name, "Only instances have properties.")
+
+            entry = instance.find(lexeme, cache)
+            if entry is None:
+                raise PyloxRuntimeError(name, "Undefined property '" + lexeme + "'.")
+
+            _, slot, method = entry
+            if method is None:
+                values = [argument(environment) for argument in arguments]
+                return callFunction(interpreter, paren, instance.values[slot], values, tail)
+
+            values = [argument(environment) for argument in arguments]
+            if len(values) != method.arity:
+                raise PyloxRuntimeError(paren, "Expected " + str(method.arity) + " arguments but got " +
+                                        str(len(values)) + ".")
+
+            if isinstance(method, NativeMethod):
+                return method.call(interpreter, instance, values, paren)
+
+            if tail and not method.isInitializer:
+                return method.tailCall(interpreter, instance, values)
+
+            return method.invoke(interpreter, instance, values)
+
+        return invoke
+
+    def visitGetExpr(self, expr: Expr.Get):
+        obj = self.compile(expr.object)
+        name = expr.name
+        # The site's InlineCache; hits are checked here, misses fill it.
+        cache = InlineCache()
+        entries = cache.entries
+
+        def get(environment):
+            instance = obj(environment)
+            if isinstance(instance, LoxInstance):
+                shape = instance.shape
+                for entryShape, slot, method in entries:
+                    if entryShape is shape:
+                        if method is None:
+                            return instance.values[slot]
+                        return method.bind(instance)
+
+                return instance.get(name, cache)
+
+            raise PyloxRuntimeError(name, "Only instances have properties.")
+
+        return get
+
+    def visitGroupingExpr(self, expr: Expr.Grouping):
+        return self.compile(expr.expression)
+
+    def visitLiteralExpr(self, expr: Expr.Literal):
+        value = expr.value
+        return lambda environment: value
+
+    def visitLogicalExpr(self, expr: Expr.Logical):
+        left = self.compile(expr.left)
+        right = self.compile(expr.right)
+
+        if expr.operator.type == TokenType.OR:
+            def logicalOr(environment):
+                value = left(environment)
+                if isTruthy(value):
+                    return value
+                return right(environment)
+
+            return logicalOr
+
+        def logicalAnd(environment):
+            value = left(environment)
+            if not isTruthy(value):
+                return value
+            return right(environment)
+
+        return logicalAnd
+
+    def visitSetExpr(self, expr: Expr.Set):
+        obj = self.compile(expr.object)
+        value = self.compile(expr.value)
+        name = expr.name
+        cache = InlineCache()
+        entries = cache.entries
+
+        def set(environment):
+            instance = obj(environment)
+            if not isinstance(instance, LoxInstance):
+                raise PyloxRuntimeError(name, "Only instances have fields.")
+
+            result = value(environment)
+            shape = instance.shape
+            for entryShape, slot, next in entries:
+                if entryShape is shape:
+                    if next is None:
+                        instance.values[slot] = result
+                    else:
+                        instance.shape = next
+                        instance.values.append(result)
+                    return result
+
+            instance.set(name, result, cache)
+            return result
+
+        return set
+
+    def visitSuperExpr(self, expr: Expr.Super):
+        depth = expr.depth
+        slot = expr.slot
+        method = expr.method
+
+        def superMethod(environment):
+            superEnvironment = environment.ancestor(depth)
+            obj = environment.ancestor(depth - 1).values[0]
+
+            # See Interpreter.visitSuperExpr.
+            function = superEnvironment.values[slot]
+            if function is None:
+                function = superEnvironment.values[0].findMethod(method.lexeme)
+                if not function:
+                    raise PyloxRuntimeError(method, "Undefined property '" + method.lexeme + "'.")
+                superEnvironment.values[slot] = function
+
+            return function.bind(obj)
+
+        return superMethod
+
+    def visitThisExpr(self, expr: Expr.This):
+        return self.lookUp(expr.keyword, expr)
+
+    def visitUnaryExpr(self, expr: Expr.Unary):
+        right = self.compile(expr.right)
+        operator = expr.operator
+
+        if operator.type == TokenType.MINUS:
+            def negate(environment):
+                value = right(environment)
+                if isinstance(value, float):
+                    return -value
+                raise PyloxRuntimeError(operator, "Operand must be a number.")
+
+            return negate
+
+        if operator.type == TokenType.BANG:
+            return lambda environment: not isTruthy(right(environment))
+
+        def unknown(environment):
+            right(environment)
+            return None
+
+        return unknown
+
+    def visitVariableExpr(self, expr: Expr.Variable):
+        return self.lookUp(expr.name, expr)
+
+
+NUMBER_OPERATORS = {TokenType.GREATER: float.__gt__,
+                    TokenType.GREATER_EQUAL: float.__ge__,
+                    TokenType.LESS: float.__lt__,
+                    TokenType.LESS_EQUAL: float.__le__,
+                    TokenType.MINUS: float.__sub__,
+                    TokenType.STAR: float.__mul__}
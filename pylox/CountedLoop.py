@@ -0,0 +1,99 @@
+# coding=utf-8
+
+import Expr
+import Stmt
+from TokenType import TokenType
+
+
+class CountedLoop(object):
+    """A for loop of the form for (var i = a; i < b; i = i + k) body.
+
+    With a literal step k > 0, "<" or "<=", a bound b that is a number
+    literal or a variable the loop can't change, and a body that neither
+    assigns i nor captures it in a closure, the interpreter can count i in
+    a Python variable and only store it into the loop scope for the body.
+    match() returns None for every other loop.
+    """
+
+    def __init__(self, name, slot, bound, inclusive, step):
+        self.name = name
+        self.slot = slot
+        self.bound = bound
+        self.inclusive = inclusive
+        self.step = step
+
+    @classmethod
+    def match(cls, stmt: Stmt.For):
+        initializer, condition, increment = stmt.initializer, stmt.condition, stmt.increment
+        if not isinstance(initializer, Stmt.Var) or initializer.initializer is None:
+            return None
+
+        name = initializer.name.lexeme
+        if not (isinstance(condition, Expr.Binary)
+                and condition.operator.type in (TokenType.LESS, TokenType.LESS_EQUAL)
+                and cls.isVariable(condition.left, name)):
+            return None
+
+        if not (isinstance(increment, Expr.Assign) and increment.name.lexeme == name
+                and isinstance(increment.value, Expr.Binary)
+                and increment.value.operator.type == TokenType.PLUS
+                and cls.isVariable(increment.value.left, name)
+                and isinstance(increment.value.right, Expr.Literal)
+                and isinstance(increment.value.right.value, float)
+                and increment.value.right.value > 0):
+            return None
+
+        usage = BodyUsage()
+        usage.scan(stmt.body)
+        if name in usage.captured or name in usage.assigned:
+            return None
+
+        bound = condition.right
+        if isinstance(bound, Expr.Literal):
+            pass
+        elif isinstance(bound, Expr.Variable):
+            # A call could assign the bound behind the loop's back.
+            if bound.name.lexeme == name or bound.name.lexeme in usage.assigned or usage.calls:
+                return None
+        else:
+            return None
+
+        return cls(name, initializer.slot, bound, condition.operator.type == TokenType.LESS_EQUAL, increment.value.right.value)
+
+    @staticmethod
+    def isVariable(expr, name):
+        return isinstance(expr, Expr.Variable) and expr.name.lexeme == name
+
+
+class BodyUsage(object):
+    """Collects what a loop body may do to the variables around it."""
+
+    def __init__(self):
+        self.assigned = set()
+        self.captured = set()
+        self.calls = False
+
+    def scan(self, node, inFunction=False):
+        if isinstance(node, list):
+            for child in node:
+                self.scan(child, inFunction)
+            return
+
+        if not isinstance(node, (Expr.Expr, Stmt.Stmt)):
+            return
+
+        if isinstance(node, Expr.Assign):
+            self.assigned.add(node.name.lexeme)
+        elif isinstance(node, Expr.Call):
+            self.calls = True
+        elif isinstance(node, (Stmt.Function, Stmt.Class)):
+            inFunction = True
+
+        # Any name used inside a function or method declared in the body
+        # may be captured by its closure.
+        if inFunction and isinstance(node, (Expr.Variable, Expr.Assign)):
+            self.captured.add(node.name.lexeme)
+
+        fields = node.fields
+        for field in fields:
+            self.scan(getattr(node, field), inFunction)
@@ -3,36 +3,21 @@
 
 from RuntimeError import PyloxRuntimeError
 
-class Environment:
-    def __init__(self, enclosing=None):
-        self.values = dict()
-        self.enclosing = enclosing
-
-    def define(self, name, value):
-        self.values[name] = value
-
-    def get(self, name):
-        if name.lexeme in self.values.keys():
-            return self.values[name.lexeme]
 
-        if self.enclosing:
-            return self.enclosing.get(name)
+# What the slot of a global holds until the global is defined.
+UNDEFINED = object()
 
-        raise PyloxRuntimeError(name, "Undefined variable '" + name.lexeme + "'.")
 
-    def assign(self, name, value):
-        if name.lexeme in self.values.keys():
-            self.values[name.lexeme] = value
-            return
-
-        if self.enclosing:
-            self.enclosing.assign(name, value)
-            return
+class Environment:
+    """A local scope: one list slot per variable, numbered by the Resolver."""
+    __slots__ = ("values", "enclosing")
 
-        raise PyloxRuntimeError(name, "Undefined variable '" + name.lexeme + "'.")
+    def __init__(self, enclosing=None, values=None):
+        self.values = [] if values is None else values
+        self.enclosing = enclosing
 
-    def getAt(self, distance, name):
-        return self.ancestor(distance).values[name]
+    def getAt(self, distance, slot):
+        return self.ancestor(distance).values[slot]
 
     def ancestor(self, distance):
         environment = self
@@ -41,7 +26,52 @@ class Environment:
 
         return environment
 
-    def assignAt(self, distance, name, value):
-        self.ancestor(distance).values[name.lexeme] = value
+    def assignAt(self, distance, slot, value):
+        self.ancestor(distance).values[slot] = value
+
+
+class GlobalEnvironment:
+    """The outermost scope, a table of slots: one per global name.
+
+    Globals aren't resolved, so a name gets its slot the first time it is
+    declared, read or compiled, and keeps it; engines cache the slot at each
+    site. Until the name is defined its slot holds UNDEFINED, and reading or
+    assigning it is an error.
+    """
+
+    def __init__(self):
+        self.slots = dict()
+        self.names = []
+        self.values = []
+        self.enclosing = None
+
+    def slot(self, name):
+        slot = self.slots.get(name)
+        if slot is None:
+            slot = self.slots[name] = len(self.names)
+            self.names.append(name)
+            self.values.append(UNDEFINED)
+
+        return slot
+
+    def define(self, name, value):
+        self.values[self.slot(name)] = value
+
+    def get(self, name):
+        return self.getSlot(self.slot(name.lexeme), name)
+
+    def assign(self, name, value):
+        self.assignSlot(self.slot(name.lexeme), name, value)
+
+    def getSlot(self, slot, name):
+        value = self.values[slot]
+        if value is UNDEFINED:
+            raise PyloxRuntimeError(name, "Undefined variable '" + name.lexeme + "'.")
+
+        return value
 
+    def assignSlot(self, slot, name, value):
+        if self.values[slot] is UNDEFINED:
+            raise PyloxRuntimeError(name, "Undefined variable '" + name.lexeme + "'.")
 
+        self.values[slot] = value
@@ -5,124 +5,268 @@ import Token
 
 
 class Expr(object):
+	__slots__ = ()
+	annotations = ()
+
 	def accept(self, visitor):
 		raise NotImplementedError
 
 	def __setattr__(self, attr, value):
-		if hasattr(self, attr):
-			raise Exception("Attempting to alter read-only value")
+		raise Exception("Attempting to alter read-only value")
+
+	def __delattr__(self, attr):
+		raise Exception("Attempting to alter read-only value")
+
+	def annotate(self, **values):
+		for attr, value in values.items():
+			if attr not in self.annotations:
+				raise Exception("Attempting to alter read-only value")
+			object.__setattr__(self, attr, value)
 
-		self.__dict__[attr] = value
+	def __reduce__(self):
+		return type(self), tuple(getattr(self, field) for field in self.fields), \
+			tuple(getattr(self, attr) for attr in self.annotations)
+
+	def __setstate__(self, state):
+		for attr, value in zip(self.annotations, state):
+			object.__setattr__(self, attr, value)
 
 
 class Assign(Expr):
+	__slots__ = ("name", "value", "depth", "slot")
+	fields = ("name", "value")
+	annotations = ("depth", "slot")
+
 	def __init__(self, name: Token.Token, value: Expr):
-		self.name = name
-		self.value = value
+		_setAssignName(self, name)
+		_setAssignValue(self, value)
+		_setAssignDepth(self, None)
+		_setAssignSlot(self, None)
 
 	def accept(self, visitor):
 		return visitor.visitAssignExpr(self)
 
 
+_setAssignName = Assign.name.__set__
+_setAssignValue = Assign.value.__set__
+_setAssignDepth = Assign.depth.__set__
+_setAssignSlot = Assign.slot.__set__
+
+
 class Binary(Expr):
+	__slots__ = ("left", "operator", "right", "quick", "profile")
+	fields = ("left", "operator", "right")
+	annotations = ("quick", "profile")
+
 	def __init__(self, left: Expr, operator: Token.Token, right: Expr):
-		self.left = left
-		self.operator = operator
-		self.right = right
+		_setBinaryLeft(self, left)
+		_setBinaryOperator(self, operator)
+		_setBinaryRight(self, right)
+		_setBinaryQuick(self, None)
+		_setBinaryProfile(self, None)
 
 	def accept(self, visitor):
 		return visitor.visitBinaryExpr(self)
 
 
+_setBinaryLeft = Binary.left.__set__
+_setBinaryOperator = Binary.operator.__set__
+_setBinaryRight = Binary.right.__set__
+_setBinaryQuick = Binary.quick.__set__
+_setBinaryProfile = Binary.profile.__set__
+
+
 class Call(Expr):
+	__slots__ = ("callee", "paren", "arguments")
+	fields = __slots__
+
 	def __init__(self, callee: Expr, paren: Token.Token, arguments: List[Expr]):
-		self.callee = callee
-		self.paren = paren
-		self.arguments = arguments
+		_setCallCallee(self, callee)
+		_setCallParen(self, paren)
+		_setCallArguments(self, arguments)
 
 	def accept(self, visitor):
 		return visitor.visitCallExpr(self)
 
 
+_setCallCallee = Call.callee.__set__
+_setCallParen = Call.paren.__set__
+_setCallArguments = Call.arguments.__set__
+
+
 class Get(Expr):
+	__slots__ = ("object", "name", "cache")
+	fields = ("object", "name")
+	annotations = ("cache",)
+
 	def __init__(self, object: Expr, name: Token.Token):
-		self.object = object
-		self.name = name
+		_setGetObject(self, object)
+		_setGetName(self, name)
+		_setGetCache(self, None)
 
 	def accept(self, visitor):
 		return visitor.visitGetExpr(self)
 
 
+_setGetObject = Get.object.__set__
+_setGetName = Get.name.__set__
+_setGetCache = Get.cache.__set__
+
+
 class Grouping(Expr):
+	__slots__ = ("expression",)
+	fields = __slots__
+
 	def __init__(self, expression: Expr):
-		self.expression = expression
+		_setGroupingExpression(self, expression)
 
 	def accept(self, visitor):
 		return visitor.visitGroupingExpr(self)
 
 
+_setGroupingExpression = Grouping.expression.__set__
+
+
 class Literal(Expr):
+	__slots__ = ("value",)
+	fields = __slots__
+
 	def __init__(self, value: object):
-		self.value = value
+		_setLiteralValue(self, value)
 
 	def accept(self, visitor):
 		return visitor.visitLiteralExpr(self)
 
 
+_setLiteralValue = Literal.value.__set__
+
+
 class Logical(Expr):
+	__slots__ = ("left", "operator", "right", "quick", "profile")
+	fields = ("left", "operator", "right")
+	annotations = ("quick", "profile")
+
 	def __init__(self, left: Expr, operator: Token.Token, right: Expr):
-		self.left = left
-		self.operator = operator
-		self.right = right
+		_setLogicalLeft(self, left)
+		_setLogicalOperator(self, operator)
+		_setLogicalRight(self, right)
+		_setLogicalQuick(self, None)
+		_setLogicalProfile(self, None)
 
 	def accept(self, visitor):
 		return visitor.visitLogicalExpr(self)
 
 
+_setLogicalLeft = Logical.left.__set__
+_setLogicalOperator = Logical.operator.__set__
+_setLogicalRight = Logical.right.__set__
+_setLogicalQuick = Logical.quick.__set__
+_setLogicalProfile = Logical.profile.__set__
+
+
 class Set(Expr):
+	__slots__ = ("object", "name", "value", "cache")
+	fields = ("object", "name", "value")
+	annotations = ("cache",)
+
 	def __init__(self, object: Expr, name: Token.Token, value: Expr):
-		self.object = object
-		self.name = name
-		self.value = value
+		_setSetObject(self, object)
+		_setSetName(self, name)
+		_setSetValue(self, value)
+		_setSetCache(self, None)
 
 	def accept(self, visitor):
 		return visitor.visitSetExpr(self)
 
 
+_setSetObject = Set.object.__set__
+_setSetName = Set.name.__set__
+_setSetValue = Set.value.__set__
+_setSetCache = Set.cache.__set__
+
+
 class Super(Expr):
+	__slots__ = ("keyword", "method", "depth", "slot")
+	fields = ("keyword", "method")
+	annotations = ("depth", "slot")
+
 	def __init__(self, keyword: Token.Token, method: Token.Token):
-		self.keyword = keyword
-		self.method = method
+		_setSuperKeyword(self, keyword)
+		_setSuperMethod(self, method)
+		_setSuperDepth(self, None)
+		_setSuperSlot(self, None)
 
 	def accept(self, visitor):
 		return visitor.visitSuperExpr(self)
 
 
+_setSuperKeyword = Super.keyword.__set__
+_setSuperMethod = Super.method.__set__
+_setSuperDepth = Super.depth.__set__
+_setSuperSlot = Super.slot.__set__
+
+
 class This(Expr):
+	__slots__ = ("keyword", "depth", "slot")
+	fields = ("keyword",)
+	annotations = ("depth", "slot")
+
 	def __init__(self, keyword: Token.Token):
-		self.keyword = keyword
+		_setThisKeyword(self, keyword)
+		_setThisDepth(self, None)
+		_setThisSlot(self, None)
 
 	def accept(self, visitor):
 		return visitor.visitThisExpr(self)
 
 
+_setThisKeyword = This.keyword.__set__
+_setThisDepth = This.depth.__set__
+_setThisSlot = This.slot.__set__
+
+
 class Unary(Expr):
+	__slots__ = ("operator", "right", "quick", "profile")
+	fields = ("operator", "right")
+	annotations = ("quick", "profile")
+
 	def __init__(self, operator: Token.Token, right: Expr):
-		self.operator = operator
-		self.right = right
+		_setUnaryOperator(self, operator)
+		_setUnaryRight(self, right)
+		_setUnaryQuick(self, None)
+		_setUnaryProfile(self, None)
 
 	def accept(self, visitor):
 		return visitor.visitUnaryExpr(self)
 
 
+_setUnaryOperator = Unary.operator.__set__
+_setUnaryRight = Unary.right.__set__
+_setUnaryQuick = Unary.quick.__set__
+_setUnaryProfile = Unary.profile.__set__
+
+
 class Variable(Expr):
+	__slots__ = ("name", "depth", "slot", "constant")
+	fields = ("name",)
+	annotations = ("depth", "slot", "constant")
+
 	def __init__(self, name: Token.Token):
-		self.name = name
+		_setVariableName(self, name)
+		_setVariableDepth(self, None)
+		_setVariableSlot(self, None)
+		_setVariableConstant(self, False)
 
 	def accept(self, visitor):
 		return visitor.visitVariableExpr(self)
 
 
+_setVariableName = Variable.name.__set__
+_setVariableDepth = Variable.depth.__set__
+_setVariableSlot = Variable.slot.__set__
+_setVariableConstant = Variable.constant.__set__
+
+
 class Visitor(object):
 	def visitAssignExpr(self, expr: Assign):
 		raise NotImplementedError
@@ -0,0 +1,266 @@
+# coding=utf-8
+
+import typing
+from array import array
+import Expr
+import Stmt
+import Token
+from TokenBuffer import TOKEN_TYPES
+
+
+# How a field of a node is stored in its column.
+NODE = 0
+TOKEN = 1
+NODE_LIST = 2
+TOKEN_LIST = 3
+CONSTANT = 4
+
+MAX_FIELDS = 4
+MAX_ANNOTATIONS = 3
+NO_VALUE = -1
+# An annotation column holds OBJECTS - i for an annotation that is the
+# i-th entry of the table's objects.
+OBJECTS = -2
+
+
+def nodeClasses(module, base):
+    return [value for value in vars(module).values()
+            if isinstance(value, type) and issubclass(value, base) and value is not base]
+
+
+# Every node class, indexed by its kind number.
+NODE_CLASSES = nodeClasses(Expr, Expr.Expr) + nodeClasses(Stmt, Stmt.Stmt)
+
+
+def fieldStorage(annotation):
+    if annotation is Token.Token:
+        return TOKEN
+
+    if typing.get_origin(annotation) is list:
+        element, = typing.get_args(annotation)
+        return TOKEN_LIST if element is Token.Token else NODE_LIST
+
+    if annotation is object:
+        return CONSTANT
+
+    return NODE
+
+
+def fieldLayout(nodeClass):
+    """(name, storage) for each field, from the generated __init__'s annotations."""
+    annotations = nodeClass.__init__.__annotations__
+    return tuple((name, fieldStorage(annotations[name])) for name in nodeClass.fields)
+
+
+def annotationDefaults(nodeClass):
+    """The values the generated __init__ gives the annotations."""
+    blank = nodeClass(*(None for _ in nodeClass.fields))
+    return tuple(getattr(blank, name) for name in nodeClass.annotations)
+
+
+def encodeAnnotation(value):
+    return NO_VALUE if value is None else value
+
+
+# Builds the linked tree of Expr/Stmt objects. NodeTable has the same
+# constructor names, so the Parser can build either.
+TREE = type("TreeBuilder", (object,), {nodeClass.__name__: staticmethod(nodeClass) for nodeClass in NODE_CLASSES})()
+
+
+class NodeTable(object):
+    """Struct-of-arrays AST.
+
+    Every node is a row: its kind (an index into NODE_CLASSES) and up to four
+    int field columns. A field holds a node row, a token row, an offset into
+    the items column (where a list is stored as its length followed by its
+    elements) or an index into the constants of Literal nodes; NO_VALUE
+    stands for None. The tokens a tree keeps (names, operators, keywords)
+    are rows too: their type, lexeme and line.
+
+    The table is built by the Parser through the same constructor names as
+    the Expr/Stmt classes. What the constructors return, and what the table
+    hands out afterwards, are cursors: short-lived objects that subclass the
+    real node class, so they accept visitors and have the same fields, but
+    only hold the table and their row. Two cursors for the same row are
+    equal. The Resolver's annotations (depths, slots and scope sizes) are
+    int columns of their own, so annotating a cursor writes to the table.
+    The engines' annotations that aren't ints (a site's inline cache, say)
+    are kept in a list, which the column indexes.
+
+    The whole table is a handful of arrays and lists, so it pickles as a few
+    flat buffers.
+    """
+
+    def __init__(self):
+        self.kinds = array("B")
+        self.columns = [array("i") for _ in range(MAX_FIELDS)]
+        self.annotationColumns = [array("i") for _ in range(MAX_ANNOTATIONS)]
+        self.items = array("i")
+        self.constants = []
+        self.constantIndex = dict()
+        self.objects = []
+        self.tokenTypes = array("B")
+        self.tokenLines = array("i")
+        self.lexemes = []
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def add(self, kind, fields):
+        index = len(self.kinds)
+        self.kinds.append(kind)
+        layout = FIELD_LAYOUTS[kind]
+        for column, (_, storage), value in zip(self.columns, layout, fields):
+            column.append(self.encode(storage, value))
+        for column in self.columns[len(layout):]:
+            column.append(NO_VALUE)
+        defaults = ANNOTATION_DEFAULTS[kind]
+        for column, value in zip(self.annotationColumns, defaults):
+            column.append(encodeAnnotation(value))
+        for column in self.annotationColumns[len(defaults):]:
+            column.append(NO_VALUE)
+
+        return CURSOR_CLASSES[kind](self, index)
+
+    def encode(self, storage, value):
+        if storage == CONSTANT:
+            return self.addConstant(value)
+
+        if value is None:
+            return NO_VALUE
+
+        if storage == NODE:
+            return value.index
+        if storage == TOKEN:
+            return self.addToken(value)
+
+        offset = len(self.items)
+        self.items.append(len(value))
+        if storage == NODE_LIST:
+            self.items.extend(node.index for node in value)
+        else:
+            self.items.extend(self.addToken(token) for token in value)
+
+        return offset
+
+    def addConstant(self, value):
+        # True == 1.0 and -0.0 == 0.0 in Python, so the key is the type
+        # and the repr.
+        key = (type(value), repr(value))
+        index = self.constantIndex.get(key)
+        if index is None:
+            index = self.constantIndex[key] = len(self.constants)
+            self.constants.append(value)
+
+        return index
+
+    def addToken(self, token):
+        index = len(self.tokenTypes)
+        self.tokenTypes.append(token.type.value)
+        self.tokenLines.append(token.line)
+        self.lexemes.append(token.lexeme)
+        return index
+
+    def node(self, index):
+        if index == NO_VALUE:
+            return None
+
+        return CURSOR_CLASSES[self.kinds[index]](self, index)
+
+    def token(self, index):
+        if index == NO_VALUE:
+            return None
+
+        return Token.Token(TOKEN_TYPES[self.tokenTypes[index]], self.lexemes[index], None, self.tokenLines[index])
+
+    def field(self, index, position, storage):
+        value = self.columns[position][index]
+        if storage == NODE:
+            return self.node(value)
+        if storage == TOKEN:
+            return self.token(value)
+        if storage == CONSTANT:
+            return self.constants[value]
+
+        if value == NO_VALUE:
+            return None
+
+        length = self.items[value]
+        elements = self.items[value + 1:value + 1 + length]
+        if storage == NODE_LIST:
+            return [self.node(element) for element in elements]
+
+        return [self.token(element) for element in elements]
+
+    def annotation(self, index, position):
+        value = self.annotationColumns[position][index]
+        if value == NO_VALUE:
+            return None
+        if value <= OBJECTS:
+            return self.objects[OBJECTS - value]
+
+        return value
+
+    def annotate(self, index, position, value):
+        column = self.annotationColumns[position]
+        if value is None or isinstance(value, int):
+            column[index] = encodeAnnotation(value)
+        elif column[index] <= OBJECTS:
+            self.objects[OBJECTS - column[index]] = value
+        else:
+            column[index] = OBJECTS - len(self.objects)
+            self.objects.append(value)
+
+
+class FlatNode(object):
+    """Base of the cursor classes; a cursor is a (table, row) pair."""
+    __slots__ = ()
+
+    def __init__(self, table, index):
+        object.__setattr__(self, "table", table)
+        object.__setattr__(self, "index", index)
+
+    def __eq__(self, other):
+        return isinstance(other, FlatNode) and self.index == other.index and self.table is other.table
+
+    def __hash__(self):
+        return hash(self.index)
+
+    def annotate(self, **values):
+        for name, value in values.items():
+            self.table.annotate(self.index, self.annotations.index(name), value)
+
+    def __reduce__(self):
+        return type(self), (self.table, self.index)
+
+
+def cursorClass(kind, nodeClass):
+    def fieldProperty(position, storage):
+        return property(lambda self: self.table.field(self.index, position, storage))
+
+    def annotationProperty(position):
+        return property(lambda self: self.table.annotation(self.index, position))
+
+    namespace = {name: fieldProperty(position, storage)
+                 for position, (name, storage) in enumerate(FIELD_LAYOUTS[kind])}
+    namespace.update((name, annotationProperty(position)) for position, name in enumerate(nodeClass.annotations))
+    namespace["__slots__"] = ("table", "index")
+    namespace["__module__"] = __name__
+    namespace["__qualname__"] = "Flat" + nodeClass.__name__
+    return type("Flat" + nodeClass.__name__, (FlatNode, nodeClass), namespace)
+
+
+def builder(kind):
+    return lambda self, *fields: self.add(kind, fields)
+
+
+FIELD_LAYOUTS = [fieldLayout(nodeClass) for nodeClass in NODE_CLASSES]
+ANNOTATION_DEFAULTS = [annotationDefaults(nodeClass) for nodeClass in NODE_CLASSES]
+CURSOR_CLASSES = [cursorClass(kind, nodeClass) for kind, nodeClass in enumerate(NODE_CLASSES)]
+
+# NodeTable.Binary(left, operator, right) and so on, like TREE.
+for kind, nodeClass in enumerate(NODE_CLASSES):
+    setattr(NodeTable, nodeClass.__name__, builder(kind))
+
+# Cursors are pickled by class name, so they have to be found here.
+globals().update((cursor.__name__, cursor) for cursor in CURSOR_CLASSES)
@@ -5,38 +5,59 @@ import sys
 
 def GenerateAst(outputDir):
     stmtlist = [
-        "Block      : List[Stmt] statements",
+        "Block      : List[Stmt] statements ; size=0",
         "Expression : Expr.Expr expression",
-        "Function   : Token.Token name, List[Token.Token] params," + " List[Stmt] body",
-        "Class      : Token.Token name, Expr.Variable superclass," + " List[Function] methods",
+        "For        : Stmt initializer, Expr.Expr condition," + " Expr.Expr increment, Stmt body ; size=0, loop",
+        "Function   : Token.Token name, List[Token.Token] params," + " List[Stmt] body ; slot, size=0",
+        "Class      : Token.Token name, Expr.Variable superclass," + " List[Function] methods ; slot, size=0",
         "If         : Expr.Expr condition, Stmt thenBranch," + " Stmt elseBranch",
         "Print      : Expr.Expr expression",
-        "Return     : Token.Token keyword, Expr.Expr value",
-        "Var        : Token.Token name, Expr.Expr initializer",
+        "Return     : Token.Token keyword, Expr.Expr value ; tail=False",
+        "Var        : Token.Token name, Expr.Expr initializer ; slot",
         "While      : Expr.Expr condition, Stmt body"]
 
-    exprlist = ["Assign   : Token.Token name, Expr value",
-                "Binary   : Expr left, Token.Token operator, Expr right",
+    exprlist = ["Assign   : Token.Token name, Expr value ; depth, slot",
+                "Binary   : Expr left, Token.Token operator, Expr right ; quick, profile",
                 "Call     : Expr callee, Token.Token paren, List[Expr] arguments",
-                "Get      : Expr object, Token.Token name",
+                "Get      : Expr object, Token.Token name ; cache",
                 "Grouping : Expr expression",
                 "Literal  : object value",
-                "Logical  : Expr left, Token.Token operator, Expr right",
-                "Set      : Expr object, Token.Token name, Expr value",
-                "Super    : Token.Token keyword, Token.Token method",
-                "This     : Token.Token keyword",
-                "Unary    : Token.Token operator, Expr right",
-                "Variable : Token.Token name"]
-
-    def definetype(writer, baseName, className, fieldList):
-        writer.write('class ' + className + '(' + baseName + '):\n')
-        writer.write('\tdef __init__(self')
+                "Logical  : Expr left, Token.Token operator, Expr right ; quick, profile",
+                "Set      : Expr object, Token.Token name, Expr value ; cache",
+                "Super    : Token.Token keyword, Token.Token method ; depth, slot",
+                "This     : Token.Token keyword ; depth, slot",
+                "Unary    : Token.Token operator, Expr right ; quick, profile",
+                "Variable : Token.Token name ; depth, slot, constant=False"]
+
+    def tuplesource(names):
+        source = ', '.join('"' + na + '"' for na in names)
+        if len(names) == 1:
+            source += ','
+        return '(' + source + ')'
+
+    def definetype(writer, baseName, className, fieldList, annotationList):
         fields = []
         for f in fieldList:
             f = f.strip()
             ty, na = f.split(" ")
             fields.append([ty, na])
 
+        # Annotations are slots the Resolver fills in after parsing; they
+        # are not constructor arguments.
+        annotations = []
+        for a in annotationList:
+            na, _, default = a.strip().partition("=")
+            annotations.append([na, default or "None"])
+
+        writer.write('class ' + className + '(' + baseName + '):\n')
+        writer.write('\t__slots__ = ' + tuplesource([na for ty, na in fields] + [na for na, default in annotations]) + '\n')
+        if annotations:
+            writer.write('\tfields = ' + tuplesource([na for ty, na in fields]) + '\n')
+            writer.write('\tannotations = ' + tuplesource([na for na, default in annotations]) + '\n\n')
+        else:
+            writer.write('\tfields = __slots__\n\n')
+        writer.write('\tdef __init__(self')
+
         for f in fields:
             ty, na = f
             writer.write(', ' + na + ': ' + ty)
@@ -44,13 +65,28 @@ def GenerateAst(outputDir):
         writer.write('):\n')
         for f in fields:
             ty, na = f
-            writer.write('\t\tself.' + na + ' = ' + na + '\n')
+            writer.write('\t\t' + setterName(className, na) + '(self, ' + na + ')\n')
+        for na, default in annotations:
+            writer.write('\t\t' + setterName(className, na) + '(self, ' + default + ')\n')
 
         writer.write("\n")
 
         writer.write('\tdef accept(self, visitor):\n')
         writer.write('\t\treturn visitor.visit' + className + baseName + '(self)\n\n\n')
 
+        # __setattr__ is closed, so __init__ fills the slots through their
+        # descriptors, bound once here.
+        for f in fields:
+            ty, na = f
+            writer.write(setterName(className, na) + ' = ' + className + '.' + na + '.__set__\n')
+        for na, default in annotations:
+            writer.write(setterName(className, na) + ' = ' + className + '.' + na + '.__set__\n')
+
+        writer.write('\n\n')
+
+    def setterName(className, fieldName):
+        return '_set' + className + fieldName[0].upper() + fieldName[1:]
+
     def defineAst(outputDir, baseName, types):
         with open(os.path.join(outputDir, baseName + ".py"), "w") as fpy:
             fpy.write("# coding=utf-8\n\n")
@@ -60,24 +96,46 @@ def GenerateAst(outputDir):
             fpy.write('import Token\n\n\n')
 
             fpy.write('class ' + baseName + '(object):\n')
+            fpy.write('\t__slots__ = ()\n')
+            fpy.write('\tannotations = ()\n\n')
             fpy.write('\tdef accept(self, visitor):\n')
             fpy.write('\t\traise NotImplementedError\n\n')
 
             fpy.write('\tdef __setattr__(self, attr, value):\n')
-            fpy.write('\t\tif hasattr(self, attr):\n')
-            fpy.write('\t\t\traise Exception("Attempting to alter read-only value")\n\n')
-
-            fpy.write('\t\tself.__dict__[attr] = value\n\n\n')
+            fpy.write('\t\traise Exception("Attempting to alter read-only value")\n\n')
+
+            fpy.write('\tdef __delattr__(self, attr):\n')
+            fpy.write('\t\traise Exception("Attempting to alter read-only value")\n\n')
+
+            # The only slots that may change after __init__: the Resolver
+            # records where variables live on the nodes themselves, and the
+            # engines what they have learned about a site.
+            fpy.write('\tdef annotate(self, **values):\n')
+            fpy.write('\t\tfor attr, value in values.items():\n')
+            fpy.write('\t\t\tif attr not in self.annotations:\n')
+            fpy.write('\t\t\t\traise Exception("Attempting to alter read-only value")\n')
+            fpy.write('\t\t\tobject.__setattr__(self, attr, value)\n\n')
+
+            # The default pickling of a slotted object restores the slots
+            # with setattr; rebuild nodes through __init__ instead.
+            fpy.write('\tdef __reduce__(self):\n')
+            fpy.write('\t\treturn type(self), tuple(getattr(self, field) for field in self.fields), \\\n')
+            fpy.write('\t\t\ttuple(getattr(self, attr) for attr in self.annotations)\n\n')
+
+            fpy.write('\tdef __setstate__(self, state):\n')
+            fpy.write('\t\tfor attr, value in zip(self.annotations, state):\n')
+            fpy.write('\t\t\tobject.__setattr__(self, attr, value)\n\n\n')
 
             classNames = []
             for t in types:
                 className, fields = t.split(":", maxsplit=1)
                 className = className.strip()
                 classNames.append(className)
-                fields = fields.strip()
-                fieldList = fields.split(",")
+                fields, _, annotations = fields.partition(";")
+                fieldList = fields.strip().split(",")
+                annotationList = annotations.split(",") if annotations.strip() else []
 
-                definetype(fpy, baseName, className, fieldList)
+                definetype(fpy, baseName, className, fieldList, annotationList)
 
             fpy.write('class Visitor(object):\n')
 
@@ -0,0 +1,32 @@
+# coding=utf-8
+
+import sys
+
+
+class InternTable(object):
+    """Interns the names or strings seen in one compilation unit.
+
+    Every occurrence is replaced by the single sys.intern'd copy, so equal
+    names share memory and dict lookups keyed by them (environments,
+    fields, methods) succeed on the identity check without comparing
+    characters. The table also counts occurrences against distinct values.
+    """
+
+    def __init__(self):
+        self.values = dict()
+        self.occurrences = 0
+
+    def intern(self, text):
+        self.occurrences += 1
+        value = self.values.get(text)
+        if value is None:
+            value = self.values[text] = sys.intern(text)
+
+        return value
+
+    @property
+    def unique(self):
+        return len(self.values)
+
+    def __repr__(self):
+        return "{:d} unique / {:d} occurrences".format(self.unique, self.occurrences)
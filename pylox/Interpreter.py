@@ -9,11 +9,16 @@ import Pylox
 from RuntimeError import PyloxRuntimeError
 import Environment
 import LoxFunction
-from Return import Return
+from Return import RETURN
 from LoxClass import LoxClass, LoxInstance
+from CountedLoop import CountedLoop
+from Shape import InlineCache
+from NumArray import NumArrayFunc
+import Quickening
+from Quickening import SPECIALIZATIONS, SiteProfile
 
 
-class ClockFunc(LoxFunction.LoxCallable):
+class ClockFunc(LoxFunction.NativeFunction):
     @property
     def arity(self):
         return 0
@@ -21,9 +26,6 @@ class ClockFunc(LoxFunction.LoxCallable):
     def __call__(self, interpreter, arguments: List[object]):
         return time.time()
 
-    def __repr__(self):
-        return "<native fn>"
-
 
 class Interpreter(Expr.Visitor, Stmt.Visitor):
     def __init__(self):
@@ -31,10 +33,17 @@ class Interpreter(Expr.Visitor, Stmt.Visitor):
         self.registerBinaryOp()
         self.checkOps_set = {TokenType.GREATER, TokenType.GREATER_EQUAL, TokenType.LESS, TokenType.LESS_EQUAL,
                              TokenType.MINUS, TokenType.SLASH, TokenType.STAR}
-        self.globals = Environment.Environment()
+        self.globals = Environment.GlobalEnvironment()
         self.environment = self.globals
-        self.globals.define("clock", ClockFunc)
-        self.locals = dict()
+        self.globals.define("clock", ClockFunc())
+        self.globals.define("NumArray", NumArrayFunc())
+        self.returnValue = None
+        # A tail call waiting to be run; see LoxFunction.run.
+        self.pendingCall = None
+        # How many of the running Lox calls are tail calls, so take no
+        # Python frame of their own, and the most there have been.
+        self.tailDepth = 0
+        self.maxTailDepth = 0
 
     def interpret(self, statements):
         try:
@@ -45,10 +54,7 @@ class Interpreter(Expr.Visitor, Stmt.Visitor):
             Pylox.Lox.runtimeError(error)
 
     def execute(self, stmt):
-        stmt.accept(self)
-
-    def resolve(self, expr, depth):
-        self.locals[expr] = depth
+        return stmt.accept(self)
 
     def stringify(self, obj):
         if obj is None:
@@ -77,6 +83,15 @@ class Interpreter(Expr.Visitor, Stmt.Visitor):
     def visitUnaryExpr(self, expr):
         right = self.evaluate(expr.right)
 
+        quick = expr.quick
+        if quick:
+            guard, op = SPECIALIZATIONS[quick]
+            if type(right) is guard:
+                return op(right)
+            self.deoptimize(expr)
+        elif quick is None:
+            self.observe(expr, Quickening.unaryKind(expr.operator.type, right))
+
         if expr.operator.type == TokenType.MINUS:
             self.checkNumberOperands(expr.operator, right)
             return -float(right)
@@ -126,6 +141,15 @@ class Interpreter(Expr.Visitor, Stmt.Visitor):
         left = self.evaluate(expr.left)
         right = self.evaluate(expr.right)
 
+        quick = expr.quick
+        if quick:
+            guard, op = SPECIALIZATIONS[quick]
+            if type(left) is guard and type(right) is guard:
+                return op(left, right)
+            self.deoptimize(expr)
+        elif quick is None:
+            self.observe(expr, Quickening.binaryKind(expr.operator.type, left, right))
+
         op = self.binaryOp.get(expr.operator.type, None)
         if op is None:
             return None
@@ -135,6 +159,26 @@ class Interpreter(Expr.Visitor, Stmt.Visitor):
 
         return op(expr.operator, left, right)
 
+    def observe(self, expr, kind):
+        """Counts the operand types of a site still being observed; see Quickening.
+
+        Once they have settled the site's quick annotation picks its
+        specialization, or GENERIC, and the site stops being observed. The
+        counts are kept in the site's profile annotation.
+        """
+        profile = expr.profile
+        if profile is None:
+            profile = SiteProfile()
+            expr.annotate(profile=profile)
+        quick = profile.observe(kind)
+        if quick is not None:
+            expr.annotate(quick=quick)
+
+    def deoptimize(self, expr):
+        # The guard of a specialized site failed: it goes back to being
+        # observed, or stays generic after too many failures.
+        expr.annotate(quick=expr.profile.deoptimize())
+
     def checkNumberOperands(self, operator, left, right=None):
         if isinstance(left, float) and (isinstance(right, float) or right is None):
             return
@@ -152,30 +196,54 @@ class Interpreter(Expr.Visitor, Stmt.Visitor):
         value = None
         if stmt.initializer != None:
             value = self.evaluate(stmt.initializer)
-        self.environment.define(stmt.name.lexeme, value)
+        self.define(stmt.slot, stmt.name, value)
+
+    def define(self, slot, name, value):
+        # Declarations the Resolver gave no slot are globals.
+        if slot is None:
+            self.globals.define(name.lexeme, value)
+        else:
+            self.environment.values[slot] = value
 
     def visitVariableExpr(self, expr: Expr.Variable):
         return self.lookUpVariable(expr.name, expr)
 
     def lookUpVariable(self, name, expr):
-        distance = self.locals.get(expr, None)
-        if distance is not None:
-            return self.environment.getAt(distance, name.lexeme)
-        else:
-            return self.globals.get(name)
+        distance = expr.depth
+        if distance == 0:
+            return self.environment.values[expr.slot]
+        elif distance is not None:
+            return self.environment.getAt(distance, expr.slot)
+
+        slot = expr.slot
+        if slot is None:
+            slot = self.globalSlot(expr)
+        value = self.globals.values[slot]
+        if value is Environment.UNDEFINED:
+            raise PyloxRuntimeError(name, "Undefined variable '" + name.lexeme + "'.")
+        return value
+
+    def globalSlot(self, expr):
+        # A global site caches its slot in the global table on first use.
+        slot = self.globals.slot(expr.name.lexeme)
+        expr.annotate(slot=slot)
+        return slot
 
     def visitAssignExpr(self, expr: Expr.Assign):
         value = self.evaluate(expr.value)
 
-        distance = self.locals.get(expr, None)
-        if distance:
-            self.environment.assignAt(distance, expr.name, value)
+        distance = expr.depth
+        if distance is not None:
+            self.environment.assignAt(distance, expr.slot, value)
         else:
-            self.globals.assign(expr.name, value)
+            slot = expr.slot
+            if slot is None:
+                slot = self.globalSlot(expr)
+            self.globals.assignSlot(slot, expr.name, value)
         return value
 
     def visitBlockStmt(self, stmt):
-        self.executeBlock(stmt.statements, Environment.Environment(self.environment))
+        return self.executeBlock(stmt.statements, Environment.Environment(self.environment, [None] * stmt.size))
 
     def executeBlock(self, statements: List[Stmt.Stmt], environment: Environment.Environment):
         previous = self.environment
@@ -183,37 +251,142 @@ class Interpreter(Expr.Visitor, Stmt.Visitor):
             self.environment = environment
 
             for statement in statements:
-                self.execute(statement)
+                if self.execute(statement) is RETURN:
+                    return RETURN
         finally:
             self.environment = previous
 
     def visitIfStmt(self, stmt: Stmt.If):
         if self.isTruthy(self.evaluate(stmt.condition)):
-            self.execute(stmt.thenBranch)
+            return self.execute(stmt.thenBranch)
         elif stmt.elseBranch is not None:
-            self.execute(stmt.elseBranch)
+            return self.execute(stmt.elseBranch)
 
         return None
 
     def visitLogicalExpr(self, expr: Expr.Logical):
         left = self.evaluate(expr.left)
 
+        quick = expr.quick
+        if quick:
+            if type(left) is bool:
+                if left is (expr.operator.type == TokenType.OR):
+                    return left
+                return self.evaluate(expr.right)
+            self.deoptimize(expr)
+        elif quick is None:
+            self.observe(expr, Quickening.logicalKind(expr.operator.type, left))
+
         if expr.operator.type == TokenType.OR:
             if self.isTruthy(left):
                 return left
-            else:
-                if not self.isTruthy(left):
-                    return left
+        else:
+            if not self.isTruthy(left):
+                return left
 
         return self.evaluate(expr.right)
 
     def visitWhileStmt(self, stmt: Stmt.While):
         while self.isTruthy(self.evaluate(stmt.condition)):
-            self.execute(stmt.body)
+            if self.execute(stmt.body) is RETURN:
+                return RETURN
+
+    def visitForStmt(self, stmt: Stmt.For):
+        # One scope for the whole loop, instead of the blocks the for loop
+        # used to be desugared into.
+        previous = self.environment
+        try:
+            self.environment = Environment.Environment(previous, [None] * stmt.size)
+            if stmt.initializer is not None:
+                self.execute(stmt.initializer)
+
+            # The loop annotation is None until the first run, then the
+            # CountedLoop the loop matched, or False.
+            loop = stmt.loop
+            if loop is None:
+                loop = CountedLoop.match(stmt) or False
+                stmt.annotate(loop=loop)
+            if loop:
+                completion = self.runCountedLoop(loop, stmt.body)
+                if completion is not False:
+                    return completion
+
+            while stmt.condition is None or self.isTruthy(self.evaluate(stmt.condition)):
+                if self.execute(stmt.body) is RETURN:
+                    return RETURN
+                if stmt.increment is not None:
+                    self.evaluate(stmt.increment)
+        finally:
+            self.environment = previous
+
+    def runCountedLoop(self, loop: CountedLoop, body: Stmt.Stmt):
+        """Run a counted loop in Python; False if its operands aren't numbers.
+
+        Otherwise returns RETURN if the body returned, else None.
+        """
+        values = self.environment.values
+        slot = loop.slot
+        i = values[slot]
+        bound = self.evaluate(loop.bound)
+        if not isinstance(i, float) or not isinstance(bound, float):
+            return False
+
+        step = loop.step
+        if loop.inclusive:
+            while i <= bound:
+                values[slot] = i
+                if self.execute(body) is RETURN:
+                    return RETURN
+                i += step
+        else:
+            while i < bound:
+                values[slot] = i
+                if self.execute(body) is RETURN:
+                    return RETURN
+                i += step
+
+        values[slot] = i
+        return None
 
     def visitCallExpr(self, expr: Expr.Call):
-        callee = self.evaluate(expr.callee)
+        if isinstance(expr.callee, Expr.Get):
+            return self.invoke(expr, expr.callee)
+
+        return self.call(expr, self.evaluate(expr.callee))
+
+    def invoke(self, expr: Expr.Call, get: Expr.Get, tail=False):
+        """obj.name(...): a method is run with obj as its receiver, never bound.
 
+        A field shadows a method, so it is called like any other value.
+        Errors come in the same order as for a Get followed by a Call.
+        """
+        obj = self.evaluate(get.object)
+        if not isinstance(obj, LoxInstance):
+            raise PyloxRuntimeError(get.name, "Only instances have properties.")
+
+        entry = obj.find(get.name.lexeme, get.cache or self.inlineCache(get))
+        if entry is None:
+            raise PyloxRuntimeError(get.name, "Undefined property '" + get.name.lexeme + "'.")
+
+        _, slot, method = entry
+        if method is None:
+            return self.call(expr, obj.values[slot], tail)
+
+        arguments = [self.evaluate(argument) for argument in expr.arguments]
+        if len(arguments) != method.arity:
+            raise PyloxRuntimeError(expr.paren, "Expected " +
+                                    str(method.arity) + " arguments but got " +
+                                    str(len(arguments)) + ".")
+
+        if isinstance(method, LoxFunction.NativeMethod):
+            return method.call(self, obj, arguments, expr.paren)
+
+        if tail and not method.isInitializer:
+            return method.tailCall(self, obj, arguments)
+
+        return method.invoke(self, obj, arguments)
+
+    def call(self, expr: Expr.Call, callee, tail=False):
         arguments = []
         for argument in expr.arguments:
             arguments.append(self.evaluate(argument))
@@ -226,18 +399,39 @@ class Interpreter(Expr.Visitor, Stmt.Visitor):
                                     str(callee.arity) + " arguments but got " +
                                     str(len(arguments)) + ".")
 
+        if tail and isinstance(callee, LoxFunction.LoxFunction) and not callee.isInitializer:
+            return callee.tailCall(self, callee.receiver, arguments)
+
+        if isinstance(callee, LoxFunction.NativeFunction):
+            return callee.call(self, arguments, expr.paren)
+
         return callee(self, arguments)
 
     def visitFunctionStmt(self, stmt: Stmt.Function):
         func = LoxFunction.LoxFunction(stmt, self.environment, False)
-        self.environment.define(stmt.name.lexeme, func)
+        self.define(stmt.slot, stmt.name, func)
 
     def visitReturnStmt(self, stmt: Stmt.Return):
+        if stmt.tail:
+            return self.returnCall(stmt.value)
+
         value = None
         if stmt.value is not None:
             value = self.evaluate(stmt.value)
 
-        raise Return(value)
+        self.returnValue = value
+        return RETURN
+
+    def returnCall(self, call: Expr.Call):
+        # A tail call to a Lox function comes back as RETURN, left pending.
+        if isinstance(call.callee, Expr.Get):
+            value = self.invoke(call, call.callee, True)
+        else:
+            value = self.call(call, self.evaluate(call.callee), True)
+
+        if value is not RETURN:
+            self.returnValue = value
+        return RETURN
 
     def visitClassStmt(self, stmt: Stmt.Class):
         superclass = None
@@ -246,27 +440,28 @@ class Interpreter(Expr.Visitor, Stmt.Visitor):
             if not isinstance(superclass, LoxClass):
                 raise PyloxRuntimeError(stmt.superclass.name, "Superclass must be a class.")
 
-        self.environment.define(stmt.name.lexeme, None)
+        self.define(stmt.slot, stmt.name, None)
 
         if stmt.superclass:
-            self.environment = Environment.Environment(self.environment)
-            self.environment.define("super", superclass)
+            # Slot 0 is "super"; the others keep the superclass methods the
+            # class calls through super, once looked up.
+            self.environment = Environment.Environment(self.environment, [superclass] + [None] * (stmt.size - 1))
 
         methods = dict()
         for method in stmt.methods:
-            func = LoxFunction.LoxFunction(method, self.environment, method.name.lexeme is "init")
+            func = LoxFunction.LoxFunction(method, self.environment, method.name.lexeme == "init", True)
             methods[method.name.lexeme] = func
 
         klass = LoxClass(stmt.name.lexeme, superclass, methods)
         if superclass:
             self.environment = self.environment.enclosing
 
-        self.environment.assign(stmt.name, klass)
+        self.define(stmt.slot, stmt.name, klass)
 
     def visitGetExpr(self, expr: Expr.Get):
         obj = self.evaluate(expr.object)
         if isinstance(obj, LoxInstance):
-            return obj.get(expr.name)
+            return obj.get(expr.name, expr.cache or self.inlineCache(expr))
 
         raise PyloxRuntimeError(expr.name, "Only instances have properties.")
 
@@ -277,22 +472,33 @@ class Interpreter(Expr.Visitor, Stmt.Visitor):
             raise PyloxRuntimeError(expr.name, "Only instances have fields.")
 
         value = self.evaluate(expr.value)
-        obj.set(expr.name, value)
+        obj.set(expr.name, value, expr.cache or self.inlineCache(expr))
         return value
 
+    def inlineCache(self, expr):
+        # Each Get and Set site gets its InlineCache on first use.
+        cache = InlineCache()
+        expr.annotate(cache=cache)
+        return cache
+
     def visitThisExpr(self, expr: Expr.This):
         return self.lookUpVariable(expr.keyword, expr)
 
     def visitSuperExpr(self, expr: Expr.Super):
-        distance = self.locals[expr]
-        superclass = self.environment.getAt(distance, "super")
+        distance = expr.depth
+        environment = self.environment.ancestor(distance)
+
+        # "this" is slot 0 of the scope just inside the "super" one.
+        obj = self.environment.getAt(distance - 1, 0)
 
-        obj = self.environment.getAt(distance - 1, "this")
+        method = environment.values[expr.slot]
+        if method is None:
+            method = environment.values[0].findMethod(expr.method.lexeme)
 
-        method = superclass.findMethod(expr.method.lexeme)
+            if not method:
+                raise PyloxRuntimeError(expr.method, "Undefined property '" + expr.method.lexeme + "'.")
 
-        if not method:
-            raise PyloxRuntimeError(expr.method, "Undefined property '" + expr.method.lexeme + "'.")
+            environment.values[expr.slot] = method
 
         return method.bind(obj)
 
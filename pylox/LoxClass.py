@@ -3,63 +3,145 @@
 from LoxFunction import LoxCallable
 from typing import List
 from RuntimeError import PyloxRuntimeError
+from Shape import Shape
 
 
 class LoxInstance:
+    """An object: its class, and its fields as a list laid out by a Shape.
+
+    The engines pass an InlineCache per property site to find, get and
+    set; without one, a lookup goes through the shape's slots and the
+    class's methods.
+    """
+    __slots__ = ("klass", "shape", "values")
+
     def __init__(self, klass):
         self.klass = klass
-        self.fields = dict()
+        self.shape = klass.instanceShape
+        self.values = []
 
     def __repr__(self):
         return self.klass.name + " instance"
 
-    def get(self, name):
-        if name.lexeme in self.fields.keys():
-            return self.fields[name.lexeme]
+    def find(self, name, cache=None):
+        """The Get entry for name (see InlineCache), or None if it has neither field nor method."""
+        shape = self.shape
+        if cache is not None:
+            entry = cache.find(shape)
+            if entry is not None:
+                return entry
+
+        slot = shape.slots.get(name)
+        method = None
+        if slot is None:
+            method = self.klass.findMethod(name)
+            if method is None:
+                return None
+
+        entry = (shape, slot, method)
+        if cache is not None:
+            cache.add(entry)
+
+        return entry
+
+    def get(self, name, cache=None):
+        if cache is not None:
+            shape = self.shape
+            for entryShape, slot, method in cache.entries:
+                if entryShape is shape:
+                    if method is None:
+                        return self.values[slot]
+                    return method.bind(self)
+
+        entry = self.find(name.lexeme, cache)
+        if entry is None:
+            raise PyloxRuntimeError(name, "Undefined property '" + name.lexeme + "'.")
+
+        _, slot, method = entry
+        if method is None:
+            return self.values[slot]
+
+        return method.bind(self)
+
+    def set(self, name, value, cache=None):
+        self.setField(name.lexeme, value, cache)
+
+    def setField(self, name, value, cache=None):
+        shape = self.shape
+        entry = None if cache is None else cache.find(shape)
+        if entry is None:
+            slot = shape.slots.get(name)
+            next = None
+            if slot is None:
+                slot = len(self.values)
+                next = shape.withField(name)
+            entry = (shape, slot, next)
+            if cache is not None:
+                cache.add(entry)
+
+        _, slot, next = entry
+        if next is None:
+            self.values[slot] = value
+        else:
+            self.shape = next
+            self.values.append(value)
 
-        method = self.klass.findMethod(name.lexeme)
-        if method:
-            return method.bind(self)
-        print(self.fields.keys())
-        raise PyloxRuntimeError(name, "Undefined property '" + name.lexeme + "'.")
 
-    def set(self, name, value):
-        self.fields[name.lexeme] = value
+class LoxClass(LoxCallable, LoxInstance):
+    """A Lox class.
 
+    methodTable holds every method the class responds to, its own and the
+    inherited ones, merged when the class is made, so finding a method is
+    one dict lookup however deep the hierarchy. A class can't change once
+    made, so init and its arity are looked up once too.
+    """
 
-class LoxClass(LoxCallable, LoxInstance):
     def __init__(self, name, superclass, methods):
+        # The root shape of the class's instances, and of the class itself.
+        self.instanceShape = Shape()
         LoxInstance.__init__(self, self)
         self.name = name
-        self.methods = methods
+        self.methods = dict()
+        self.methodTable = dict()
+        self.superclass = None
+        self.initializer = None
+        self.initializerArity = 0
+        if superclass is not None:
+            self.inherit(superclass)
+        for methodName, method in methods.items():
+            self.addMethod(methodName, method)
+
+    def inherit(self, superclass):
         self.superclass = superclass
+        self.methodTable.update(superclass.methodTable)
+        self.cacheInitializer()
+
+    def addMethod(self, name, method):
+        self.methods[name] = method
+        self.methodTable[name] = method
+        if name == "init":
+            self.cacheInitializer()
+
+    def cacheInitializer(self):
+        self.initializer = self.methodTable.get("init")
+        self.initializerArity = 0 if self.initializer is None else self.initializer.arity
 
     def __repr__(self):
         return self.name
 
     def __call__(self, interpreter, arguments: List[object]):
         instance = LoxInstance(self)
-        initializer = self.findMethod("init")
+        initializer = self.initializer
 
         if initializer:
-            initializer.bind(instance)(interpreter, arguments)
+            initializer.invoke(interpreter, instance, arguments)
 
         return instance
 
     @property
     def arity(self):
-        initializer = self.findMethod("init")
-        if not initializer:
-            return 0
-
-        return initializer.arity
+        return self.initializerArity
 
     def findMethod(self, name):
-        if name in self.methods.keys():
-            return self.methods[name]
-
-        if self.superclass:
-            return self.superclass.findMethod(name)
-
-        return None
+        return self.methodTable.get(name)
 
@@ -3,7 +3,8 @@
 from typing import List
 import Stmt
 import Environment
-from Return import Return
+from Return import RETURN
+from RuntimeError import PyloxRuntimeError
 
 
 class LoxCallable:
@@ -18,29 +19,144 @@ class LoxCallable:
         return 0
 
 
+class NativeFunction(LoxCallable):
+    """A function written in Python.
+
+    It raises its runtime errors with no token, as it doesn't know where it
+    was called from. The engines call it through call(), which takes the
+    call's token and fills it in.
+    """
+
+    def call(self, interpreter, arguments: List[object], token):
+        try:
+            return self(interpreter, arguments)
+        except PyloxRuntimeError as error:
+            if error.token is None:
+                error.token = token
+            raise
+
+    def __repr__(self):
+        return "<native fn>"
+
+
+class NativeMethod(object):
+    """A method written in Python, as function(receiver, *arguments).
+
+    Like a LoxFunction method, one is kept in the class for all its
+    instances and bound to the receiver when it is looked up; the engines
+    run obj.method() through call() without binding it.
+    """
+    isInitializer = False
+
+    def __init__(self, function, arity):
+        self.function = function
+        self.arity = arity
+
+    def bind(self, instance):
+        return BoundNativeMethod(self, instance)
+
+    def call(self, interpreter, receiver, arguments: List[object], token):
+        # See NativeFunction.call.
+        try:
+            return self.function(receiver, *arguments)
+        except PyloxRuntimeError as error:
+            if error.token is None:
+                error.token = token
+            raise
+
+
+class BoundNativeMethod(NativeFunction):
+    def __init__(self, method: NativeMethod, receiver):
+        super(LoxCallable, self).__init__()
+        self.method = method
+        self.receiver = receiver
+
+    @property
+    def arity(self):
+        return self.method.arity
+
+    def __call__(self, interpreter, arguments: List[object]):
+        return self.method.function(self.receiver, *arguments)
+
+
 class LoxFunction(LoxCallable):
-    def __init__(self, declaration: Stmt.Function, closure: Environment.Environment, isInitializer):
+    """A function or method declared in Lox.
+
+    A method's scope starts with its receiver, then the parameters. bind()
+    only records the receiver; the environment is made when the method is
+    called, by invoke(), which the engines also use to call obj.method()
+    without binding it at all.
+    """
+
+    def __init__(self, declaration: Stmt.Function, closure: Environment.Environment, isInitializer,
+                 isMethod=False, receiver=None):
         super(LoxCallable, self).__init__()
         self.closure = closure
         self.declaration = declaration
         self.isInitializer = isInitializer
+        self.isMethod = isMethod
+        self.receiver = receiver
+        # Slots for the locals declared after the receiver and parameters.
+        self.locals = [None] * (declaration.size - len(declaration.params) - (1 if isMethod else 0))
 
     def __call__(self, interpreter, arguments: List[object]):
-        environment = Environment.Environment(self.closure)
-        for i in range(len(self.declaration.params)):
-            environment.define(self.declaration.params[i].lexeme, arguments[i])
+        if self.isMethod:
+            return self.invoke(interpreter, self.receiver, arguments)
 
-        try:
-            interpreter.executeBlock(self.declaration.body, environment)
-        except Return as returnValue:
-            if self.isInitializer:
-                return self.closure.getAt(0, "this")
-            return returnValue.value
+        # The parameters are the first slots of the function's scope.
+        return self.run(interpreter, Environment.Environment(self.closure, arguments + self.locals))
 
+    def invoke(self, interpreter, receiver, arguments: List[object]):
+        result = self.run(interpreter, Environment.Environment(self.closure, [receiver] + arguments + self.locals))
         if self.isInitializer:
-            return self.closure.getAt(0, "this")
-
-        return None
+            return receiver
+
+        return result
+
+    def tailCall(self, interpreter, receiver, arguments: List[object]):
+        """Calls the function from the run() loop of the one returning."""
+        values = [receiver] + arguments if self.isMethod else arguments
+        interpreter.pendingCall = (self, Environment.Environment(self.closure, values + self.locals))
+        return RETURN
+
+    def run(self, interpreter, environment):
+        """Runs the body, then the tail calls it ends with, in this frame.
+
+        A return statement whose value is a call to a Lox function doesn't
+        make the call: it leaves the function and its environment in the
+        interpreter's pendingCall and returns, and runTailCalls() runs the
+        functions left pending one after the other. Tail recursion then
+        takes no Python stack.
+        """
+        if interpreter.executeBlock(self.declaration.body, environment) is not RETURN:
+            return None
+
+        if interpreter.pendingCall is not None:
+            self.runTailCalls(interpreter)
+
+        return interpreter.returnValue
+
+    @staticmethod
+    def runTailCalls(interpreter):
+        # tailDepth counts the calls running in place of the frames they
+        # saved, which a stack trace of the Lox program would still show.
+        start = interpreter.tailDepth
+        try:
+            while interpreter.pendingCall is not None:
+                function, environment = interpreter.pendingCall
+                interpreter.pendingCall = None
+                interpreter.tailDepth += 1
+                if interpreter.tailDepth > interpreter.maxTailDepth:
+                    interpreter.maxTailDepth = interpreter.tailDepth
+
+                if function.execute(interpreter, environment) is not RETURN:
+                    interpreter.returnValue = None
+                    return
+        finally:
+            interpreter.tailDepth = start
+
+    def execute(self, interpreter, environment):
+        return interpreter.executeBlock(self.declaration.body, environment)
 
     @property
     def arity(self):
@@ -50,8 +166,6 @@ class LoxFunction(LoxCallable):
         return "<fn " + self.declaration.name.lexeme + ">"
 
     def bind(self, instance):
-        environment = Environment.Environment(self.closure)
-        environment.define("this", instance)
-        return LoxFunction(self.declaration, environment, self.isInitializer)
+        return LoxFunction(self.declaration, self.closure, self.isInitializer, True, instance)
 
 
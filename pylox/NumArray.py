@@ -0,0 +1,247 @@
+# coding=utf-8
+
+import math
+import operator
+from array import array
+from typing import List
+from RuntimeError import PyloxRuntimeError
+from LoxFunction import NativeFunction, NativeMethod
+from LoxClass import LoxClass, LoxInstance
+
+# NumPy, when it is installed; see loadBackend().
+numpy = None
+
+
+def fail(message):
+    # A native doesn't know its call site; see NativeFunction.call.
+    raise PyloxRuntimeError(None, message)
+
+
+class ArrayBackend(object):
+    """Bulk operations on array('d') buffers.
+
+    Each one runs as a C-level map over the buffer with a function from
+    math or operator, so the loop over the elements runs no bytecode. Sums
+    are rounded once, by math.fsum, so they come out the same whatever
+    order a backend adds in.
+    """
+    name = "array"
+
+    # The operations map() takes by name.
+    FUNCTIONS = {"abs": math.fabs, "ceil": math.ceil, "cos": math.cos, "exp": math.exp, "floor": math.floor,
+                 "log": math.log, "negate": operator.neg, "sin": math.sin, "sqrt": math.sqrt}
+
+    @staticmethod
+    def zeros(length):
+        return array("d", bytes(8 * length))
+
+    @staticmethod
+    def add(data, other):
+        if isinstance(other, float):
+            return array("d", map(other.__add__, data))
+
+        return array("d", map(operator.add, data, other))
+
+    @staticmethod
+    def multiply(data, other):
+        if isinstance(other, float):
+            return array("d", map(other.__mul__, data))
+
+        return array("d", map(operator.mul, data, other))
+
+    @staticmethod
+    def sum(data):
+        return math.fsum(data)
+
+    @staticmethod
+    def dot(data, other):
+        return math.fsum(map(operator.mul, data, other))
+
+    @classmethod
+    def map(cls, name, data):
+        try:
+            return array("d", map(cls.FUNCTIONS[name], data))
+        except ValueError:
+            fail("Math domain error in '" + name + "'.")
+        except OverflowError:
+            fail("Math range error in '" + name + "'.")
+
+
+class NumpyBackend(object):
+    """The same operations on NumPy arrays, used when NumPy is installed."""
+    name = "numpy"
+
+    FUNCTIONS = {"abs": "absolute", "ceil": "ceil", "cos": "cos", "exp": "exp", "floor": "floor",
+                 "log": "log", "negate": "negative", "sin": "sin", "sqrt": "sqrt"}
+
+    @staticmethod
+    def zeros(length):
+        return numpy.zeros(length)
+
+    @staticmethod
+    def add(data, other):
+        return numpy.add(data, other)
+
+    @staticmethod
+    def multiply(data, other):
+        return numpy.multiply(data, other)
+
+    @staticmethod
+    def sum(data):
+        return math.fsum(data.tolist())
+
+    @staticmethod
+    def dot(data, other):
+        return math.fsum(numpy.multiply(data, other).tolist())
+
+    @classmethod
+    def map(cls, name, data):
+        # Raise where array() would, instead of making NaNs and infinities.
+        try:
+            with numpy.errstate(invalid="raise", divide="raise", over="raise"):
+                return getattr(numpy, cls.FUNCTIONS[name])(data)
+        except FloatingPointError as error:
+            kind = "range" if "overflow" in str(error) else "domain"
+            fail("Math " + kind + " error in '" + name + "'.")
+
+
+# Where the bulk operations run; set when the first array is made.
+BACKEND = None
+
+
+def loadBackend():
+    # NumPy takes a while to import, so programs that make no arrays don't
+    # pay for it.
+    global numpy, BACKEND
+    if BACKEND is None:
+        try:
+            import numpy
+        except ImportError:
+            BACKEND = ArrayBackend
+        else:
+            BACKEND = NumpyBackend
+
+    return BACKEND
+
+
+class NumArray(LoxInstance):
+    """A fixed-length array of numbers, made by the NumArray() native.
+
+    To Lox it is an instance of a class whose methods are native, so every
+    engine reaches them as it reaches any method:
+
+        a.get(i)  a.set(i, x)  a.len()
+        a.add(b)  a.multiply(b)    elementwise, b an array or a number;
+                                   both return a new array
+        a.sum()  a.dot(b)
+        a.map(name)                a new array of "abs", "ceil", "cos",
+                                   "exp", "floor", "log", "negate", "sin"
+                                   or "sqrt" of each element
+
+    The numbers are kept in one buffer of doubles, and the bulk operations
+    run in the backend over the whole buffer.
+    """
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        LoxInstance.__init__(self, NUMARRAY_CLASS)
+        self.data = data
+
+    # The python engine reads and writes Lox properties as "f_" attributes.
+    def __getattr__(self, name):
+        if name.startswith("f_"):
+            entry = self.find(name[2:])
+            if entry is None:
+                fail("Undefined property '" + name[2:] + "'.")
+
+            _, slot, method = entry
+            return self.values[slot] if method is None else method.bind(self)
+
+        raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        if name.startswith("f_"):
+            self.setField(name[2:], value)
+        else:
+            object.__setattr__(self, name, value)
+
+    def index(self, value):
+        if not isinstance(value, float) or not value.is_integer():
+            fail("Array index must be a whole number.")
+        if not 0 <= value < len(self.data):
+            fail("Array index out of range.")
+
+        return int(value)
+
+    def operand(self, other):
+        if isinstance(other, float):
+            return other
+
+        return self.other(other).data
+
+    def other(self, other):
+        if not isinstance(other, NumArray):
+            fail("Operand must be a number or a NumArray.")
+        if len(other.data) != len(self.data):
+            fail("Arrays must have the same length.")
+
+        return other
+
+    def getElement(self, index):
+        return float(self.data[self.index(index)])
+
+    def setElement(self, index, value):
+        index = self.index(index)
+        if not isinstance(value, float):
+            fail("Array elements must be numbers.")
+
+        self.data[index] = value
+        return value
+
+    def length(self):
+        return float(len(self.data))
+
+    def add(self, other):
+        return NumArray(BACKEND.add(self.data, self.operand(other)))
+
+    def multiply(self, other):
+        return NumArray(BACKEND.multiply(self.data, self.operand(other)))
+
+    def sum(self):
+        return BACKEND.sum(self.data)
+
+    def dot(self, other):
+        if not isinstance(other, NumArray):
+            fail("Operand must be a NumArray.")
+
+        return BACKEND.dot(self.data, self.other(other).data)
+
+    def map(self, name):
+        if name not in BACKEND.FUNCTIONS:
+            fail("Unknown array operation '" + str(name) + "'.")
+
+        return NumArray(BACKEND.map(name, self.data))
+
+
+# A class of its own, for the name it prints and for its methods, which
+# every array shares.
+NUMARRAY_CLASS = LoxClass("NumArray", None, {
+    "get": NativeMethod(NumArray.getElement, 1), "set": NativeMethod(NumArray.setElement, 2),
+    "len": NativeMethod(NumArray.length, 0), "add": NativeMethod(NumArray.add, 1),
+    "multiply": NativeMethod(NumArray.multiply, 1), "sum": NativeMethod(NumArray.sum, 0),
+    "dot": NativeMethod(NumArray.dot, 1), "map": NativeMethod(NumArray.map, 1)})
+
+
+class NumArrayFunc(NativeFunction):
+    """NumArray(n): a NumArray of n zeros."""
+
+    @property
+    def arity(self):
+        return 1
+
+    def __call__(self, interpreter, arguments: List[object]):
+        length, = arguments
+        if not isinstance(length, float) or not length.is_integer() or length < 0:
+            fail("Array length must be a whole number, at least 0.")
+
+        return NumArray(loadBackend().zeros(int(length)))
@@ -0,0 +1,254 @@
+# coding=utf-8
+
+import Expr
+import Stmt
+from TokenType import TokenType
+from RuntimeError import PyloxRuntimeError
+import Quickening
+
+
+def countNodes(node):
+    if isinstance(node, list):
+        return sum(countNodes(child) for child in node)
+
+    if not isinstance(node, (Expr.Expr, Stmt.Stmt)):
+        return 0
+
+    fields = node.fields
+    return 1 + sum(countNodes(getattr(node, field)) for field in fields)
+
+
+class Optimizer(Expr.Visitor, Stmt.Visitor):
+    """Simplifies a resolved program before it runs.
+
+    Level 1 folds unary, binary and logical expressions whose operands are
+    literals, and drops Grouping nodes. Level 2 also prunes if/while/for
+    statements with a constant condition and expression statements that
+    are a bare literal. Level 0 leaves the program alone.
+
+    Constants are folded by letting the interpreter evaluate them, so the
+    result is exactly what it would compute at runtime. An expression that
+    raises (e.g. division by zero, "a" - 1) is kept as it is, so the error
+    is still raised when, and if, it runs, at the same line.
+
+    Nodes are immutable, so every node with a changed child is rebuilt; a
+    rebuilt node takes over the Resolver's annotations (depth, slot, scope
+    size) of the node it replaces.
+    """
+
+    def __init__(self, interpreter, level=2):
+        self.interpreter = interpreter
+        self.level = level
+        self.removed = 0
+
+    def optimize(self, statements):
+        if self.level <= 0:
+            return statements
+
+        before = countNodes(statements)
+        statements = self.statements(statements)
+        self.removed += before - countNodes(statements)
+        return statements
+
+    def statements(self, statements):
+        optimized = []
+        for statement in statements:
+            statement = statement.accept(self)
+            if statement is not None:
+                optimized.append(statement)
+
+        return optimized
+
+    def statement(self, stmt):
+        # A branch or loop body has to stay a statement; a pruned one
+        # becomes an empty block.
+        stmt = stmt.accept(self)
+        if stmt is None:
+            return Stmt.Block([])
+
+        return stmt
+
+    def evaluate(self, expr):
+        if expr is None:
+            return None
+
+        return expr.accept(self)
+
+    def fold(self, expr):
+        # Operands that are literals take the same path every time, so the
+        # site is generic from the start and evaluating it observes nothing.
+        expr.annotate(quick=Quickening.GENERIC)
+        try:
+            return Expr.Literal(self.interpreter.evaluate(expr))
+        except PyloxRuntimeError:
+            return expr
+
+    @staticmethod
+    def carry(old, new):
+        # A Block standing in for a For loop takes only its scope size.
+        new.annotate(**{name: getattr(old, name) for name in old.annotations if name in new.annotations})
+        return new
+
+    def visitBlockStmt(self, stmt: Stmt.Block):
+        statements = self.statements(stmt.statements)
+        return self.carry(stmt, Stmt.Block(statements))
+
+    def visitExpressionStmt(self, stmt: Stmt.Expression):
+        expression = self.evaluate(stmt.expression)
+        if self.level >= 2 and isinstance(expression, Expr.Literal):
+            return None
+
+        if expression is stmt.expression:
+            return stmt
+
+        return Stmt.Expression(expression)
+
+    def visitFunctionStmt(self, stmt: Stmt.Function):
+        return self.carry(stmt, Stmt.Function(stmt.name, stmt.params, self.statements(stmt.body)))
+
+    def visitClassStmt(self, stmt: Stmt.Class):
+        methods = [method.accept(self) for method in stmt.methods]
+        return self.carry(stmt, Stmt.Class(stmt.name, stmt.superclass, methods))
+
+    def visitIfStmt(self, stmt: Stmt.If):
+        condition = self.evaluate(stmt.condition)
+        if self.level >= 2 and isinstance(condition, Expr.Literal):
+            if self.interpreter.isTruthy(condition.value):
+                return stmt.thenBranch.accept(self)
+            if stmt.elseBranch is not None:
+                return stmt.elseBranch.accept(self)
+            return None
+
+        thenBranch = self.statement(stmt.thenBranch)
+        elseBranch = None
+        if stmt.elseBranch is not None:
+            elseBranch = self.statement(stmt.elseBranch)
+
+        return Stmt.If(condition, thenBranch, elseBranch)
+
+    def visitPrintStmt(self, stmt: Stmt.Print):
+        expression = self.evaluate(stmt.expression)
+        if expression is stmt.expression:
+            return stmt
+
+        return Stmt.Print(expression)
+
+    def visitReturnStmt(self, stmt: Stmt.Return):
+        value = self.evaluate(stmt.value)
+        if value is stmt.value:
+            return stmt
+
+        return self.carry(stmt, Stmt.Return(stmt.keyword, value))
+
+    def visitVarStmt(self, stmt: Stmt.Var):
+        initializer = self.evaluate(stmt.initializer)
+        if initializer is stmt.initializer:
+            return stmt
+
+        return self.carry(stmt, Stmt.Var(stmt.name, initializer))
+
+    def visitWhileStmt(self, stmt: Stmt.While):
+        condition = self.evaluate(stmt.condition)
+        if self.level >= 2 and isinstance(condition, Expr.Literal) \
+                and not self.interpreter.isTruthy(condition.value):
+            return None
+
+        return Stmt.While(condition, self.statement(stmt.body))
+
+    def visitForStmt(self, stmt: Stmt.For):
+        initializer = None
+        if stmt.initializer is not None:
+            initializer = stmt.initializer.accept(self)
+
+        condition = self.evaluate(stmt.condition)
+        if self.level >= 2 and isinstance(condition, Expr.Literal) \
+                and not self.interpreter.isTruthy(condition.value):
+            # Only the initializer runs, still in a scope of its own.
+            if initializer is None:
+                return None
+            return self.carry(stmt, Stmt.Block([initializer]))
+
+        increment = self.evaluate(stmt.increment)
+        return self.carry(stmt, Stmt.For(initializer, condition, increment, self.statement(stmt.body)))
+
+    def visitAssignExpr(self, expr: Expr.Assign):
+        value = self.evaluate(expr.value)
+        if value is expr.value:
+            return expr
+
+        return self.carry(expr, Expr.Assign(expr.name, value))
+
+    def visitBinaryExpr(self, expr: Expr.Binary):
+        left = self.evaluate(expr.left)
+        right = self.evaluate(expr.right)
+        if left is not expr.left or right is not expr.right:
+            expr = Expr.Binary(left, expr.operator, right)
+
+        if isinstance(left, Expr.Literal) and isinstance(right, Expr.Literal):
+            return self.fold(expr)
+
+        return expr
+
+    def visitCallExpr(self, expr: Expr.Call):
+        callee = self.evaluate(expr.callee)
+        arguments = [self.evaluate(argument) for argument in expr.arguments]
+        if callee is expr.callee and all(new is old for new, old in zip(arguments, expr.arguments)):
+            return expr
+
+        return Expr.Call(callee, expr.paren, arguments)
+
+    def visitGetExpr(self, expr: Expr.Get):
+        obj = self.evaluate(expr.object)
+        if obj is expr.object:
+            return expr
+
+        return Expr.Get(obj, expr.name)
+
+    def visitGroupingExpr(self, expr: Expr.Grouping):
+        return self.evaluate(expr.expression)
+
+    def visitLiteralExpr(self, expr: Expr.Literal):
+        return expr
+
+    def visitLogicalExpr(self, expr: Expr.Logical):
+        left = self.evaluate(expr.left)
+        right = self.evaluate(expr.right)
+        if isinstance(left, Expr.Literal):
+            # A truthy left operand of "or" and a falsy one of "and" is the
+            # result; otherwise it is skipped and the right operand is.
+            if (expr.operator.type == TokenType.OR) == self.interpreter.isTruthy(left.value):
+                return left
+
+            return right
+
+        if left is expr.left and right is expr.right:
+            return expr
+
+        return Expr.Logical(left, expr.operator, right)
+
+    def visitSetExpr(self, expr: Expr.Set):
+        obj = self.evaluate(expr.object)
+        value = self.evaluate(expr.value)
+        if obj is expr.object and value is expr.value:
+            return expr
+
+        return Expr.Set(obj, expr.name, value)
+
+    def visitSuperExpr(self, expr: Expr.Super):
+        return expr
+
+    def visitThisExpr(self, expr: Expr.This):
+        return expr
+
+    def visitUnaryExpr(self, expr: Expr.Unary):
+        right = self.evaluate(expr.right)
+        if right is not expr.right:
+            expr = Expr.Unary(expr.operator, right)
+
+        if isinstance(right, Expr.Literal):
+            return self.fold(expr)
+
+        return expr
+
+    def visitVariableExpr(self, expr: Expr.Variable):
+        return expr
@@ -0,0 +1,130 @@
+# coding=utf-8
+
+import re
+import os
+from concurrent.futures import ProcessPoolExecutor
+import Pylox
+
+
+# Only what is needed to follow nesting: strings and comments (so their
+# contents are skipped), brackets, statement ends, newlines and the keywords
+# that start a top-level declaration.
+BOUNDARY_REGEX = r'"[^"]*"?|//[^\n]*|[(){};]|\n|\b(?:fun|class|var)\b'
+BOUNDARY_PATTERN = re.compile(BOUNDARY_REGEX)
+BYTES_BOUNDARY_PATTERN = re.compile(BOUNDARY_REGEX.encode("ascii"))
+
+MIN_CHUNK_SIZE = 64 * 1024
+
+
+def splitSource(source, chunkSize):
+    """Split source into (chunk, first line) pairs at top-level declarations.
+
+    A split only happens in front of a "fun", "class" or "var" that follows
+    a ";" or "}" outside of any brackets, so every chunk holds whole
+    declarations and parses exactly as it would inside the full source.
+    """
+    binary = not isinstance(source, str)
+    pattern = BYTES_BOUNDARY_PATTERN if binary else BOUNDARY_PATTERN
+    if binary:
+        newline, quote, comment, semicolon, closeBrace, openers, closers = \
+            b"\n", b'"', b"//", b";", b"}", b"({", b")}"
+    else:
+        newline, quote, comment, semicolon, closeBrace, openers, closers = \
+            "\n", '"', "//", ";", "}", "({", ")}"
+
+    chunks = []
+    chunkStart = 0
+    chunkLine = 1
+    line = 1
+    depth = 0
+    afterStatement = False
+
+    for match in pattern.finditer(source):
+        text = match.group()
+        if text == newline:
+            line += 1
+            continue
+
+        if text[:1] == quote:
+            line += text.count(newline)
+            afterStatement = False
+        elif text[:2] == comment:
+            continue
+        elif text in openers:
+            depth += 1
+            afterStatement = False
+        elif text in closers:
+            depth -= 1
+            afterStatement = depth == 0 and text == closeBrace
+        elif text == semicolon:
+            afterStatement = depth == 0
+        else:
+            start = match.start()
+            if afterStatement and start - chunkStart >= chunkSize:
+                chunks.append((source[chunkStart:start], chunkLine))
+                chunkStart = start
+                chunkLine = line
+
+            afterStatement = False
+
+    chunks.append((source[chunkStart:], chunkLine))
+    return chunks
+
+
+def parseChunk(task):
+    """Scan and parse one chunk, collecting its errors instead of printing."""
+    source, line, scannerMode, parserMode, tokenBuffer, flatAst = task
+    lox = Pylox.Lox
+    lox.scannerMode = scannerMode
+    lox.parserMode = parserMode
+    lox.tokenBuffer = tokenBuffer
+    lox.flatAst = flatAst
+
+    try:
+        scanErrors = lox.errorSink = []
+        _, tokens = lox.scan(source, line)
+        parseErrors = lox.errorSink = []
+        statements = lox.parse(tokens)
+    finally:
+        lox.errorSink = None
+
+    return statements, scanErrors, parseErrors
+
+
+def parseSources(sources, workers):
+    """Run the front end over several sources with a pool of processes.
+
+    Returns the statements of all sources in order. Errors are reported in
+    the order a sequential run would report them: per source, all scan
+    errors before all parse errors, each in source order.
+    """
+    if not workers:
+        workers = os.cpu_count() or 1
+
+    lox = Pylox.Lox
+    tasks = []
+    owners = []
+    for index, source in enumerate(sources):
+        chunkSize = max(MIN_CHUNK_SIZE, len(source) // (workers * 4))
+        for chunk, line in splitSource(source, chunkSize):
+            tasks.append((chunk, line, lox.scannerMode, lox.parserMode, lox.tokenBuffer, lox.flatAst))
+            owners.append(index)
+
+    if workers == 1 or len(tasks) == 1:
+        results = [parseChunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(parseChunk, tasks))
+
+    statements = []
+    for index in range(len(sources)):
+        owned = [result for owner, result in zip(owners, results) if owner == index]
+        for _, scanErrors, _ in owned:
+            for message in scanErrors:
+                lox.reportMessage(message)
+        for chunkStatements, _, parseErrors in owned:
+            for message in parseErrors:
+                lox.reportMessage(message)
+            statements.extend(chunkStatements)
+
+    return statements
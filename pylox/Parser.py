@@ -3,16 +3,56 @@
 import Expr
 import Stmt
 from TokenType import TokenType
+from TokenBuffer import TOKEN_TYPES
+from FlatAst import TREE
 import Pylox
 
 
 class ParseError(RuntimeError):
     pass
 
+
+class Precedence:
+    NONE = 0
+    ASSIGNMENT = 1
+    OR = 2
+    AND = 3
+    EQUALITY = 4
+    COMPARISON = 5
+    TERM = 6
+    FACTOR = 7
+    UNARY = 8
+    CALL = 9
+
+
+# Binding power of every token that can continue an expression. Tokens that
+# are missing here end it.
+INFIX_PRECEDENCE = {TokenType.EQUAL: Precedence.ASSIGNMENT,
+                    TokenType.OR: Precedence.OR,
+                    TokenType.AND: Precedence.AND,
+                    TokenType.BANG_EQUAL: Precedence.EQUALITY,
+                    TokenType.EQUAL_EQUAL: Precedence.EQUALITY,
+                    TokenType.GREATER: Precedence.COMPARISON,
+                    TokenType.GREATER_EQUAL: Precedence.COMPARISON,
+                    TokenType.LESS: Precedence.COMPARISON,
+                    TokenType.LESS_EQUAL: Precedence.COMPARISON,
+                    TokenType.MINUS: Precedence.TERM,
+                    TokenType.PLUS: Precedence.TERM,
+                    TokenType.SLASH: Precedence.FACTOR,
+                    TokenType.STAR: Precedence.FACTOR,
+                    TokenType.LEFT_PAREN: Precedence.CALL,
+                    TokenType.DOT: Precedence.CALL}
+
 class Parser(object):
     def __init__(self, tokens):
         self.tokens = tokens
         self.current = 0
+        # Node constructors: FlatAst.TREE builds Expr/Stmt objects, a
+        # FlatAst.NodeTable builds rows of a flat table.
+        self.nodes = TREE
+        # Parse expressions with the original chain of one method per
+        # precedence level instead of parsePrecedence().
+        self.descent = False
         self.discards_tokens = {TokenType.CLASS, TokenType.FUN, TokenType.VAR, TokenType.FOR, TokenType.IF,
                                 TokenType.WHILE, TokenType.PRINT, TokenType.RETURN}
 
@@ -29,6 +69,11 @@ class Parser(object):
 
         return statements
 
+    def declarations(self):
+        """Yield each top-level declaration as soon as it has been parsed."""
+        while not self.isAtEnd():
+            yield self.declaration()
+
     def declaration(self):
         try:
             if self.match(TokenType.CLASS):
@@ -47,10 +92,9 @@ class Parser(object):
         name = self.consume(TokenType.IDENTIFIER, "Expect class name.")
         superclass = None
         if self.match(TokenType.LESS):
-            self.consume(TokenType.IDENTIFIER, "Expect superclass name.")
-            superclass = Expr.Variable(self.previous())
+            superclass = self.nodes.Variable(self.consume(TokenType.IDENTIFIER, "Expect superclass name."))
 
-        self.consume(TokenType.LEFT_BRACE, "Expect '{' before class body.")
+        self.expect(TokenType.LEFT_BRACE, "Expect '{' before class body.")
 
         methods = []
         while not self.check(TokenType.RIGHT_BRACE) and not self.isAtEnd():
@@ -59,13 +103,13 @@ class Parser(object):
             else:
                 methods.append(self.func("method"))
 
-        self.consume(TokenType.RIGHT_BRACE, "Expect '}' after class body.")
+        self.expect(TokenType.RIGHT_BRACE, "Expect '}' after class body.")
 
-        return Stmt.Class(name, superclass, methods)
+        return self.nodes.Class(name, superclass, methods)
 
     def func(self, kind: str):
         name = self.consume(TokenType.IDENTIFIER, "Expect " + kind + " name.")
-        self.consume(TokenType.LEFT_PAREN, "Expect '(' after " + kind + " name.")
+        self.expect(TokenType.LEFT_PAREN, "Expect '(' after " + kind + " name.")
 
         parameters = []
         if not self.check(TokenType.RIGHT_PAREN):
@@ -77,11 +121,11 @@ class Parser(object):
 
                 parameters.append(self.consume(TokenType.IDENTIFIER, "Expect parameter name."))
 
-        self.consume(TokenType.RIGHT_PAREN, "Expect ')' after parameters.")
+        self.expect(TokenType.RIGHT_PAREN, "Expect ')' after parameters.")
 
-        self.consume(TokenType.LEFT_BRACE, "Expect '{' before " + kind + " body.")
+        self.expect(TokenType.LEFT_BRACE, "Expect '{' before " + kind + " body.")
         body = self.block()
-        return Stmt.Function(name, parameters, body)
+        return self.nodes.Function(name, parameters, body)
 
     def varDeclaration(self):
         name = self.consume(TokenType.IDENTIFIER, "Expect variable name.")
@@ -90,11 +134,69 @@ class Parser(object):
         if self.match(TokenType.EQUAL):
             initializer = self.expression()
 
-        self.consume(TokenType.SEMICOLON, "Expect ';' after variable declaration.")
-        return Stmt.Var(name, initializer)
+        self.expect(TokenType.SEMICOLON, "Expect ';' after variable declaration.")
+        return self.nodes.Var(name, initializer)
 
     def expression(self):
-        return self.assignment()
+        if self.descent:
+            return self.assignment()
+
+        return self.parsePrecedence(Precedence.ASSIGNMENT)
+
+    def parsePrecedence(self, precedence):
+        """Pratt parser for everything from assignment down to primary.
+
+        Builds the same trees as assignment() and the methods below it, but
+        a binary operator costs one loop iteration here instead of a call
+        through every precedence level.
+        """
+        tokentype = self.peekType()
+        if tokentype == TokenType.IDENTIFIER:
+            self.advance()
+            expr = self.nodes.Variable(self.previous())
+        elif tokentype == TokenType.NUMBER or tokentype == TokenType.STRING:
+            self.advance()
+            expr = self.nodes.Literal(self.previousLiteral())
+        elif tokentype == TokenType.BANG or tokentype == TokenType.MINUS:
+            self.advance()
+            operator = self.previous()
+            right = self.parsePrecedence(Precedence.UNARY)
+            expr = self.nodes.Unary(operator, right)
+        else:
+            expr = self.primary()
+
+        while True:
+            tokentype = self.peekType()
+            infix = INFIX_PRECEDENCE.get(tokentype, Precedence.NONE)
+            if infix < precedence:
+                return expr
+
+            self.advance()
+
+            if tokentype == TokenType.LEFT_PAREN:
+                expr = self.finishCall(expr)
+            elif tokentype == TokenType.DOT:
+                name = self.consume(TokenType.IDENTIFIER, "Expect property name after '.'.")
+                expr = self.nodes.Get(expr, name)
+            elif tokentype == TokenType.EQUAL:
+                equals = self.previous()
+                value = self.parsePrecedence(Precedence.ASSIGNMENT)
+
+                if isinstance(expr, Expr.Variable):
+                    return self.nodes.Assign(expr.name, value)
+                elif isinstance(expr, Expr.Get):
+                    return self.nodes.Set(expr.object, expr.name, value)
+
+                self.error(equals, "Invalid assignment target.")
+                return expr
+            elif tokentype == TokenType.OR or tokentype == TokenType.AND:
+                operator = self.previous()
+                right = self.parsePrecedence(infix + 1)
+                expr = self.nodes.Logical(expr, operator, right)
+            else:
+                operator = self.previous()
+                right = self.parsePrecedence(infix + 1)
+                expr = self.nodes.Binary(expr, operator, right)
 
     def assignment(self):
         expr = self.orexpression()
@@ -105,9 +207,9 @@ class Parser(object):
 
             if isinstance(expr, Expr.Variable):
                 name = expr.name
-                return Expr.Assign(name, value)
+                return self.nodes.Assign(name, value)
             elif isinstance(expr, Expr.Get):
-                return Expr.Set(expr.object, expr.name, value)
+                return self.nodes.Set(expr.object, expr.name, value)
 
             self.error(equals, "Invalid assignment target.")
 
@@ -119,7 +221,7 @@ class Parser(object):
         while self.match(TokenType.OR):
             operator = self.previous()
             right = self.andexpression()
-            expr = Expr.Logical(expr, operator, right)
+            expr = self.nodes.Logical(expr, operator, right)
 
         return expr
 
@@ -129,21 +231,21 @@ class Parser(object):
         while self.match(TokenType.AND):
             operator = self.previous()
             right = self.equality()
-            expr = Expr.Logical(expr, operator, right)
+            expr = self.nodes.Logical(expr, operator, right)
 
         return expr
 
     def ifStatement(self):
-        self.consume(TokenType.LEFT_PAREN, "Expect '(' after 'if'.")
+        self.expect(TokenType.LEFT_PAREN, "Expect '(' after 'if'.")
         condition = self.expression()
-        self.consume(TokenType.RIGHT_PAREN, "Expect ')' after if condition.")
+        self.expect(TokenType.RIGHT_PAREN, "Expect ')' after if condition.")
 
         thenBranch = self.statement()
         elseBranch = None
         if self.match(TokenType.ELSE):
             elseBranch = self.statement()
 
-        return Stmt.If(condition, thenBranch, elseBranch)
+        return self.nodes.If(condition, thenBranch, elseBranch)
 
     def statement(self):
         if self.match(TokenType.FOR):
@@ -162,7 +264,7 @@ class Parser(object):
             return self.whileStatement()
 
         if self.match(TokenType.LEFT_BRACE):
-            return Stmt.Block(self.block())
+            return self.nodes.Block(self.block())
 
         return self.expressionStatement()
 
@@ -172,17 +274,17 @@ class Parser(object):
         if not self.check(TokenType.SEMICOLON):
             value = self.expression()
 
-        self.consume(TokenType.SEMICOLON, "Expect ';' after return value.")
-        return Stmt.Return(keyword, value)
+        self.expect(TokenType.SEMICOLON, "Expect ';' after return value.")
+        return self.nodes.Return(keyword, value)
 
     def whileStatement(self):
-        self.consume(TokenType.LEFT_PAREN, "Expect '(' after 'while'.")
+        self.expect(TokenType.LEFT_PAREN, "Expect '(' after 'while'.")
         condition = self.expression()
-        self.consume(TokenType.RIGHT_PAREN, "Expect ')' after condition.")
+        self.expect(TokenType.RIGHT_PAREN, "Expect ')' after condition.")
 
         body = self.statement()
 
-        return Stmt.While(condition, body)
+        return self.nodes.While(condition, body)
 
     def block(self):
         statements = []
@@ -190,21 +292,21 @@ class Parser(object):
             statements.append(self.declaration())
 
         #print("block", statements[0].name)
-        self.consume(TokenType.RIGHT_BRACE, "Expect '}' after block.")
+        self.expect(TokenType.RIGHT_BRACE, "Expect '}' after block.")
         return statements
 
     def printStatement(self):
         value = self.expression()
-        self.consume(TokenType.SEMICOLON, "Expect ';' after value.")
-        return Stmt.Print(value)
+        self.expect(TokenType.SEMICOLON, "Expect ';' after value.")
+        return self.nodes.Print(value)
 
     def expressionStatement(self):
         expr = self.expression()
-        self.consume(TokenType.SEMICOLON, "Expect ';' after expression.")
-        return Stmt.Expression(expr)
+        self.expect(TokenType.SEMICOLON, "Expect ';' after expression.")
+        return self.nodes.Expression(expr)
 
     def forStatement(self):
-        self.consume(TokenType.LEFT_PAREN, "Expect '(' after 'for'.")
+        self.expect(TokenType.LEFT_PAREN, "Expect '(' after 'for'.")
 
         if self.match(TokenType.SEMICOLON):
             initializer = None
@@ -217,27 +319,17 @@ class Parser(object):
         if not self.check(TokenType.SEMICOLON):
             condition = self.expression()
 
-        self.consume(TokenType.SEMICOLON, "Expect ';' after loop condition.")
+        self.expect(TokenType.SEMICOLON, "Expect ';' after loop condition.")
 
         increment = None
         if not self.check(TokenType.RIGHT_PAREN):
             increment = self.expression()
 
-        self.consume(TokenType.RIGHT_PAREN, "Expect ')' after for clauses.")
+        self.expect(TokenType.RIGHT_PAREN, "Expect ')' after for clauses.")
 
         body = self.statement()
-        if increment:
-            body = Stmt.Block([body, Stmt.Expression(increment)])
-
-        if not condition:
-            condition = Expr.Literal(True)
 
-        body = Stmt.While(condition, body)
-
-        if initializer:
-            body = Stmt.Block([initializer, body])
-
-        return body
+        return self.nodes.For(initializer, condition, increment, body)
 
     def equality(self):
         expr = self.comparison()
@@ -245,7 +337,7 @@ class Parser(object):
         while self.match(TokenType.BANG_EQUAL, TokenType.EQUAL_EQUAL):
             operator = self.previous()
             right = self.comparison()
-            expr = Expr.Binary(expr, operator, right)
+            expr = self.nodes.Binary(expr, operator, right)
 
         return expr
 
@@ -278,6 +370,15 @@ class Parser(object):
     def previous(self):
         return self.tokens[self.current - 1]
 
+    def peekType(self):
+        return self.peek().type
+
+    def previousType(self):
+        return self.previous().type
+
+    def previousLiteral(self):
+        return self.previous().literal
+
     def comparison(self):
         expr = self.term()
 
@@ -285,7 +386,7 @@ class Parser(object):
                          TokenType.LESS, TokenType.LESS_EQUAL):
             operator = self.previous()
             right = self.term()
-            expr = Expr.Binary(expr, operator, right)
+            expr = self.nodes.Binary(expr, operator, right)
 
         return expr
 
@@ -295,7 +396,7 @@ class Parser(object):
         while self.match(TokenType.MINUS, TokenType.PLUS):
             operator = self.previous()
             right = self.factor()
-            expr = Expr.Binary(expr, operator, right)
+            expr = self.nodes.Binary(expr, operator, right)
 
         return expr
 
@@ -305,7 +406,7 @@ class Parser(object):
         while self.match(TokenType.SLASH, TokenType.STAR):
             operator = self.previous()
             right = self.unary()
-            expr = Expr.Binary(expr, operator, right)
+            expr = self.nodes.Binary(expr, operator, right)
 
         return expr
 
@@ -313,7 +414,7 @@ class Parser(object):
         if self.match(TokenType.BANG, TokenType.MINUS):
             operator = self.previous()
             right = self.unary()
-            return Expr.Unary(operator, right)
+            return self.nodes.Unary(operator, right)
 
         return self.call()
 
@@ -325,7 +426,7 @@ class Parser(object):
                 expr = self.finishCall(expr)
             elif self.match(TokenType.DOT):
                 name = self.consume(TokenType.IDENTIFIER, "Expect property name after '.'.")
-                expr = Expr.Get(expr, name)
+                expr = self.nodes.Get(expr, name)
             else:
                 break
 
@@ -341,37 +442,37 @@ class Parser(object):
                 arguments.append(self.expression())
 
         paren = self.consume(TokenType.RIGHT_PAREN, "Expect ')' after arguments.")
-        return Expr.Call(callee, paren, arguments)
+        return self.nodes.Call(callee, paren, arguments)
 
     def primary(self):
         if self.match(TokenType.FALSE):
-            return Expr.Literal(False)
+            return self.nodes.Literal(False)
 
         if self.match(TokenType.TRUE):
-            return Expr.Literal(True)
+            return self.nodes.Literal(True)
 
         if self.match(TokenType.NIL):
-            return Expr.Literal(None)
+            return self.nodes.Literal(None)
 
         if self.match(TokenType.NUMBER, TokenType.STRING):
-            return Expr.Literal(self.previous().literal)
+            return self.nodes.Literal(self.previousLiteral())
 
         if self.match(TokenType.SUPER):
             keyword = self.previous()
-            self.consume(TokenType.DOT, "Expect '.' after 'super'.")
+            self.expect(TokenType.DOT, "Expect '.' after 'super'.")
             method = self.consume(TokenType.IDENTIFIER, "Expect superclass method name.")
-            return Expr.Super(keyword, method)
+            return self.nodes.Super(keyword, method)
 
         if self.match(TokenType.THIS):
-            return Expr.This(self.previous())
+            return self.nodes.This(self.previous())
 
         if self.match(TokenType.IDENTIFIER):
-            return Expr.Variable(self.previous())
+            return self.nodes.Variable(self.previous())
 
         if self.match(TokenType.LEFT_PAREN):
             expr = self.expression()
-            self.consume(TokenType.RIGHT_PAREN, "Expect ')' after expression.")
-            return Expr.Grouping(expr)
+            self.expect(TokenType.RIGHT_PAREN, "Expect ')' after expression.")
+            return self.nodes.Grouping(expr)
 
         raise self.error(self.peek(), "Expect expression.")
 
@@ -381,6 +482,13 @@ class Parser(object):
 
         raise self.error(self.peek(), message)
 
+    def expect(self, tokentype, message):
+        """Like consume(), for tokens the tree does not keep."""
+        if not self.check(tokentype):
+            raise self.error(self.peek(), message)
+
+        self.advance()
+
     def error(self, token, message):
         Pylox.Lox.error(token=token, message=message)
         return ParseError()
@@ -389,15 +497,88 @@ class Parser(object):
         self.advance()
 
         while not self.isAtEnd():
-            if self.previous().type == TokenType.SEMICOLON:
+            if self.previousType() == TokenType.SEMICOLON:
                 return
 
-            if self.peek().type in self.discards_tokens:
+            if self.peekType() in self.discards_tokens:
                 return
 
             self.advance()
 
 
+class StreamingParser(Parser):
+    """Parser that pulls tokens from an iterator, e.g. Scanner.iterTokens().
+
+    The grammar only ever looks at the current and the previous token, so
+    those two are all that is kept around.
+    """
+
+    def __init__(self, tokens):
+        super(StreamingParser, self).__init__([])
+        self.tokenIter = iter(tokens)
+        self.previousToken = None
+        self.currentToken = next(self.tokenIter)
+
+    def advance(self):
+        if not self.isAtEnd():
+            self.previousToken = self.currentToken
+            self.currentToken = next(self.tokenIter)
+
+        return self.previousToken
+
+    def peek(self):
+        return self.currentToken
+
+    def previous(self):
+        return self.previousToken
+
+
+class BufferParser(Parser):
+    """Parser whose cursor walks a TokenBuffer.
+
+    Token types are compared straight from the buffer's type column, and
+    a Token object is only built for tokens the tree keeps or an error
+    message needs, never for punctuation that is just skipped over.
+    """
+
+    def __init__(self, buffer):
+        super(BufferParser, self).__init__(buffer)
+        self.types = buffer.types
+        self.eofIndex = len(buffer) - 1
+
+    def check(self, tokentype):
+        if self.current >= self.eofIndex:
+            return False
+
+        return TOKEN_TYPES[self.types[self.current]] is tokentype
+
+    def advance(self):
+        if self.current < self.eofIndex:
+            self.current += 1
+
+    def consume(self, tokentype, message):
+        self.expect(tokentype, message)
+        return self.previous()
+
+    def isAtEnd(self):
+        return self.current >= self.eofIndex
+
+    def peek(self):
+        return self.tokens.token(self.current)
+
+    def previous(self):
+        return self.tokens.token(self.current - 1)
+
+    def peekType(self):
+        return self.tokens.type(self.current)
+
+    def previousType(self):
+        return self.tokens.type(self.current - 1)
+
+    def previousLiteral(self):
+        return self.tokens.literal(self.current - 1)
+
+
 if __name__ == "__main__":
     import Token
 
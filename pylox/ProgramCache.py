@@ -0,0 +1,171 @@
+# coding=utf-8
+
+import os
+import sys
+import pickle
+import zlib
+import hashlib
+import gc
+import contextlib
+
+
+# Bump whenever the Stmt/Expr classes or the resolution data change shape,
+# so entries written by an older interpreter are never loaded.
+VERSION = "pylox-ast-10"
+
+MAGIC = b"LOXC"
+
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+
+
+@contextlib.contextmanager
+def collectorPaused():
+    # Unpickling a tree allocates objects by the hundred thousand, and the
+    # cyclic collector would otherwise walk the growing tree over and over;
+    # it takes several times longer than the unpickling itself.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def defaultDirectory():
+    directory = os.environ.get("PYLOX_CACHE_DIR")
+    if directory:
+        return directory
+
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "pylox")
+
+
+class ProgramCache(object):
+    """Keeps parsed and resolved programs on disk, like .pyc files for Lox.
+
+    An entry is keyed by the hash of the sources together with VERSION and
+    the Python version, and holds the resolved statements (the Resolver
+    annotates the nodes themselves), pickled and zlib-compressed. Loading an
+    entry replaces scanning, parsing and resolving. Reading an entry marks
+    it as recently used; when the directory grows past maxSize the least
+    recently used entries are removed.
+    """
+
+    def __init__(self, directory=None, maxSize=None):
+        self.directory = directory or defaultDirectory()
+        if maxSize is None:
+            maxSize = int(os.environ.get("PYLOX_CACHE_SIZE", DEFAULT_MAX_SIZE))
+        self.maxSize = maxSize
+
+    def key(self, sources, variant=""):
+        """Hash sources; variant tells apart programs built with other options."""
+        digest = hashlib.sha256()
+        digest.update(VERSION.encode("ascii"))
+        digest.update(sys.version.encode("utf-8"))
+        digest.update(variant.encode("utf-8"))
+        for source in sources:
+            data = source.encode("utf-8") if isinstance(source, str) else source
+            # The length keeps ["ab", "c"] and ["a", "bc"] apart.
+            digest.update(len(data).to_bytes(8, "little"))
+            digest.update(data)
+
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".loxc")
+
+    def load(self, key):
+        """Return the statements for key, or None on a miss."""
+        path = self.path(key)
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except OSError:
+            return None
+
+        try:
+            if data[:len(MAGIC)] != MAGIC:
+                raise ValueError("not a cache entry")
+
+            with collectorPaused():
+                statements = pickle.loads(zlib.decompress(data[len(MAGIC):]))
+            if not isinstance(statements, list):
+                raise ValueError("not a program")
+        except Exception:
+            # A damaged or foreign entry is as good as none.
+            self.remove(path)
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return statements
+
+    def store(self, key, statements):
+        try:
+            with collectorPaused():
+                data = MAGIC + zlib.compress(pickle.dumps(statements, pickle.HIGHEST_PROTOCOL))
+        except (pickle.PicklingError, RecursionError):
+            return False
+
+        if len(data) > self.maxSize:
+            return False
+
+        path = self.path(key)
+        temporary = "{:s}.{:d}.tmp".format(path, os.getpid())
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temporary, "wb") as file:
+                file.write(data)
+            os.replace(temporary, path)
+        except OSError:
+            self.remove(temporary)
+            return False
+
+        self.evict()
+        return True
+
+    def entries(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+
+        entries = []
+        for name in names:
+            if not name.endswith(".loxc"):
+                continue
+
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        return entries
+
+    def evict(self):
+        """Remove the least recently used entries until under maxSize."""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.maxSize:
+                break
+
+            self.remove(path)
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            self.remove(path)
+
+    @staticmethod
+    def remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
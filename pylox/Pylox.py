@@ -1,12 +1,26 @@
 #coding=utf-8
 
 import sys
+import argparse
+import contextlib
+import mmap
 import Scanner
+import RegexScanner
 import TokenType
+from TokenBuffer import TokenBuffer
+from FlatAst import NodeTable
 import Parser
 import AstPrinter
 import Interpreter
 import Resolver
+from Compiler import Compiler
+from VM import VM
+from StackInterpreter import StackInterpreter, STACK_LIMIT
+from Transpiler import Transpiler
+from Optimizer import Optimizer
+import ParallelFrontEnd
+import Quickening
+from ProgramCache import ProgramCache
 
 
 class Lox(object):
@@ -15,31 +29,151 @@ class Lox(object):
     exit_status = {64: "EX_USAGE ", 65: "EX_DATAERR",
                     66: "EX_NOINPUT", 70: "EX_SOFTWARE"}
     interpreter = Interpreter.Interpreter()
+    compiler = Compiler(interpreter)
+    vm = VM(interpreter)
+    stackInterpreter = StackInterpreter(interpreter)
+    transpiler = Transpiler(interpreter)
+    engines = ("tree", "closure", "vm", "python", "stack")
+    engine = "tree"
+    scanners = ("classic", "regex")
+    scannerMode = "classic"
+    streaming = False
+    tokenBuffer = False
+    mappedInput = False
+    showStats = False
+    parsers = ("pratt", "descent")
+    parserMode = "pratt"
+    workers = None
+    errorSink = None
+    cache = None
+    optimizeLevel = 2
+    flatAst = False
+    # With --stats, what the tree engine has run, for quickeningStats().
+    executed = []
 
     @classmethod
     def main(cls, argv):
-        if len(argv) > 2:
-            print("Usage: python Pylox.py [script]")
-            cls.exit(64)
-        elif len(argv) == 2:
-            cls.runFile(argv[1])
+        argparser = argparse.ArgumentParser(prog="Pylox.py", usage="python Pylox.py [options] [script ...]")
+        argparser.add_argument("scripts", nargs="*", metavar="script",
+                               help="several scripts are run as one program, in order")
+        argparser.add_argument("--scanner", choices=cls.scanners, default="classic",
+                               help="lexer engine: character-at-a-time or master regex")
+        argparser.add_argument("--parser", choices=cls.parsers, default="pratt",
+                               help="expression parser: precedence climbing or one method per level")
+        argparser.add_argument("--engine", choices=cls.engines, default="tree",
+                               help="run the program by walking the tree, as compiled closures, as bytecode, as generated Python "
+                                    "or by walking the tree from an explicit stack")
+        argparser.add_argument("--stack-limit", type=int, default=STACK_LIMIT, metavar="ENTRIES",
+                               help="with --engine stack, how many entries its control stack may hold before "
+                                    "a call is a stack overflow (default: %(default)d)")
+        argparser.add_argument("--dump-python", metavar="FILE",
+                               help="with --engine python, append the generated Python source to FILE")
+        argparser.add_argument("--stream", action="store_true",
+                               help="run each top-level declaration as soon as it is parsed")
+        argparser.add_argument("--token-buffer", action="store_true",
+                               help="keep tokens in a compact array buffer (uses the regex scanner)")
+        argparser.add_argument("--mmap", action="store_true",
+                               help="scan the script's bytes through mmap instead of reading it into a str")
+        argparser.add_argument("--flat-ast", action="store_true",
+                               help="keep the syntax tree in a compact array table (slower to run, not optimized)")
+        argparser.add_argument("--parallel", action="store_true",
+                               help="scan and parse chunks of the scripts in a process pool (not with --stream)")
+        argparser.add_argument("--workers", type=int, default=0,
+                               help="process pool size for --parallel (default: one per core)")
+        argparser.add_argument("-O", "--optimize", type=int, choices=(0, 1, 2), default=2,
+                               help="0: off, 1: fold constants, 2: also prune constant branches (default)")
+        argparser.add_argument("--no-cache", action="store_true",
+                               help="always scan, parse and resolve instead of loading a cached program")
+        argparser.add_argument("--stats", action="store_true",
+                               help="print front-end and runtime counters to stderr")
+        args = argparser.parse_args(argv[1:])
+
+        cls.scannerMode = args.scanner
+        cls.parserMode = args.parser
+        cls.engine = args.engine
+        cls.transpiler.dumpFile = args.dump_python
+        cls.stackInterpreter.limit = args.stack_limit
+        cls.streaming = args.stream
+        cls.tokenBuffer = args.token_buffer
+        cls.mappedInput = args.mmap
+        cls.showStats = args.stats
+        cls.workers = args.workers if args.parallel else None
+        cls.optimizeLevel = args.optimize
+        cls.flatAst = args.flat_ast
+        cls.cache = None if args.no_cache else ProgramCache()
+
+        if args.scripts:
+            cls.runFiles(args.scripts)
         else:
             cls.runPrompt()
 
     @classmethod
     def runFile(cls, path):
-        print("run file", path)
-        with open(path) as file:
-            bytes = file.read()
+        cls.runFiles([path])
+
+    @classmethod
+    def runFiles(cls, paths):
+        with contextlib.ExitStack() as stack:
+            sources = []
+            for path in paths:
+                print("run file", path)
+                sources.append(cls.readFile(path, stack))
 
-        #print(type(bytes))
-        cls.run(bytes)
+            if cls.cache is not None and not cls.streaming:
+                cls.runCached(sources)
+            else:
+                cls.runSources(sources)
+
+        # Calls the engines running LoxFunctions made as tail calls are
+        # missing from the Python stack, but not from the program's logic.
+        if cls.engine in ("tree", "closure"):
+            cls.stat("max tail call depth", cls.interpreter.maxTailDepth)
+        elif cls.engine == "stack":
+            cls.stat("max frames", cls.stackInterpreter.maxFrames)
+        if cls.engine == "tree":
+            cls.quickeningStats()
 
         if cls.hadError:
             cls.exit(65)
         if cls.hadRuntimeError:
             cls.exit(70)
 
+    @classmethod
+    def runCached(cls, sources):
+        key = cls.cache.key(sources, "O{:d}{:s}".format(cls.optimizeLevel, " flat" if cls.flatAst else ""))
+        entry = cls.cache.load(key)
+        if entry is not None:
+            cls.stat("cache", "hit " + key)
+            cls.execute(entry)
+            return
+
+        cls.stat("cache", "miss " + key)
+        statements = cls.frontEnd(sources)
+        statements = cls.resolveStatements(statements)
+        if statements is None:
+            return
+
+        # Only programs without static errors are cached; a run that has to
+        # report errors always goes through the front end again.
+        cls.cache.store(key, statements)
+        cls.execute(statements)
+
+    @classmethod
+    def readFile(cls, path, stack):
+        if not cls.mappedInput:
+            with open(path) as file:
+                bytes = file.read()
+
+            #print(type(bytes))
+            return bytes
+
+        with open(path, "rb") as file:
+            try:
+                return stack.enter_context(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+            except ValueError:
+                # An empty file can't be mapped.
+                return b""
+
     @classmethod
     def runPrompt(cls):
         while True:
@@ -55,25 +189,167 @@ class Lox(object):
 
     @classmethod
     def run(cls, source):
-        scanner = Scanner.Scanner(source)
-        tokens = scanner.scanTokens()
+        cls.runSources([source])
 
-        parser = Parser.Parser(tokens)
-        statements = parser.parse()
-
-        if cls.hadError:
+    @classmethod
+    def runSources(cls, sources):
+        if cls.streaming:
+            for source in sources:
+                cls.runStreaming(source)
+                if cls.hadError or cls.hadRuntimeError:
+                    return
             return
 
-        resolver = Resolver.Resolver(cls.interpreter)
-        resolver.resolve(statements)
+        cls.runStatements(cls.frontEnd(sources))
 
-        if cls.hadError:
+    @classmethod
+    def frontEnd(cls, sources):
+        if cls.workers is not None:
+            return ParallelFrontEnd.parseSources(sources, cls.workers)
+
+        statements = []
+        for source in sources:
+            scanner, tokens = cls.scan(source)
+            statements.extend(cls.parse(tokens))
+            cls.internStats(scanner)
+
+        return statements
+
+    @classmethod
+    def scan(cls, source, line=1):
+        scanner = cls.makeScanner(source)
+        scanner.line = line
+        if cls.tokenBuffer:
+            return scanner, scanner.scanTokenBuffer()
+
+        return scanner, scanner.scanTokens()
+
+    @classmethod
+    def parse(cls, tokens):
+        if isinstance(tokens, TokenBuffer):
+            parser = Parser.BufferParser(tokens)
+        else:
+            parser = Parser.Parser(tokens)
+        parser.descent = cls.parserMode == "descent"
+        if cls.flatAst:
+            parser.nodes = NodeTable()
+
+        return parser.parse()
+
+    @classmethod
+    def runStatements(cls, statements):
+        statements = cls.resolveStatements(statements)
+        if statements is None:
             return
 
-        cls.interpreter.interpret(statements)
+        cls.execute(statements)
 
         #print(AstPrinter.AstPrinter().print(expression))
 
+    @classmethod
+    def resolveStatements(cls, statements):
+        """Resolve and optimize statements.
+
+        Returns the optimized statements, annotated by the Resolver, or None
+        after an error.
+        """
+        if cls.hadError:
+            return None
+
+        resolver = Resolver.Resolver()
+        resolver.resolveProgram(statements)
+
+        if cls.hadError:
+            return None
+
+        return cls.optimize(statements)
+
+    @classmethod
+    def optimize(cls, statements):
+        # The optimizer rebuilds nodes as Expr/Stmt objects, which would
+        # undo a flat table's savings.
+        optimizer = Optimizer(cls.interpreter, 0 if cls.flatAst else cls.optimizeLevel)
+        statements = optimizer.optimize(statements)
+        cls.stat("optimizer", "{:d} nodes removed".format(optimizer.removed))
+        return statements
+
+    @classmethod
+    def execute(cls, statements):
+        if cls.engine == "closure":
+            cls.compiler.interpret(statements)
+        elif cls.engine == "vm":
+            cls.vm.interpret(statements)
+        elif cls.engine == "python":
+            cls.transpiler.interpret(statements)
+        elif cls.engine == "stack":
+            cls.stackInterpreter.interpret(statements)
+        else:
+            cls.interpreter.interpret(statements)
+            if cls.showStats:
+                cls.executed.append(statements)
+
+    @classmethod
+    def runStreaming(cls, source):
+        scanner = cls.makeScanner(source)
+        parser = Parser.StreamingParser(scanner.iterTokens())
+        parser.descent = cls.parserMode == "descent"
+        if cls.flatAst:
+            parser.nodes = NodeTable()
+        resolver = Resolver.Resolver()
+
+        try:
+            cls.runDeclarations(parser, resolver)
+        finally:
+            cls.internStats(scanner)
+
+    @classmethod
+    def runDeclarations(cls, parser, resolver):
+        for statement in parser.declarations():
+            # After the first static error keep parsing to report the rest,
+            # but stop running anything, like run() does for the whole file.
+            if cls.hadError:
+                continue
+
+            resolver.resolveProgram([statement])
+            if cls.hadError:
+                continue
+
+            cls.execute(cls.optimize([statement]))
+            if cls.hadRuntimeError:
+                return
+
+    @classmethod
+    def quickeningStats(cls):
+        # Sites never specialized nor deoptimized aren't worth a line.
+        sites = [expr for expr in Quickening.profiledSites(cls.executed)
+                 if expr.profile.specializations or expr.profile.deoptimizations]
+        cls.stat("quickening", "{:d} specializations, {:d} deoptimizations".format(
+            sum(expr.profile.specializations for expr in sites),
+            sum(expr.profile.deoptimizations for expr in sites)))
+        for expr in sorted(sites, key=lambda expr: expr.operator.line):
+            profile = expr.profile
+            state = "observed" if expr.quick is None else Quickening.NAMES[expr.quick]
+            cls.stat("quickened site", "line {:d} '{:s}' {:s}: {:d} specializations, {:d} deoptimizations".format(
+                expr.operator.line, expr.operator.lexeme, state, profile.specializations, profile.deoptimizations))
+
+    @classmethod
+    def internStats(cls, unit):
+        cls.stat("interned names", unit.names)
+        cls.stat("interned strings", unit.strings)
+
+    @classmethod
+    def stat(cls, label, value):
+        if cls.showStats:
+            print("[stats] {:s}: {}".format(label, value), file=sys.stderr)
+
+    @classmethod
+    def makeScanner(cls, source):
+        # Only the regex scanner works over bytes or fills a TokenBuffer.
+        if cls.scannerMode == "regex" or cls.tokenBuffer or not isinstance(source, str):
+            return RegexScanner.RegexScanner(source)
+
+        return Scanner.Scanner(source)
+
     @classmethod
     def error(cls, line=-1, message="", token=None):
         if token is None:
@@ -91,7 +367,16 @@ class Lox(object):
 
     @classmethod
     def report(cls, line, where, message):
-        print("[line {:d}] Error{:s}: {:s}".format(line, where, message))
+        cls.reportMessage("[line {:d}] Error{:s}: {:s}".format(line, where, message))
+
+    @classmethod
+    def reportMessage(cls, message):
+        # With an errorSink (see ParallelFrontEnd) errors are collected
+        # to be replayed later in a deterministic order.
+        if cls.errorSink is not None:
+            cls.errorSink.append(message)
+        else:
+            print(message)
         cls.hadError = True
 
     @classmethod
@@ -100,4 +385,7 @@ class Lox(object):
 
 
 if __name__ == "__main__":
-    Lox.main(sys.argv)
+    # The other modules report errors through "import Pylox", so go through
+    # that module instead of this __main__ copy to share a single Lox class.
+    import Pylox
+    Pylox.Lox.main(sys.argv)
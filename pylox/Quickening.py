@@ -0,0 +1,134 @@
+# coding=utf-8
+
+import operator
+import Expr
+import Stmt
+from TokenType import TokenType
+
+
+# A site is specialized once it has seen the same operand types this many
+# times in a row, and given up on (left generic) if it hasn't settled
+# after OBSERVATION_LIMIT runs or has been deoptimized DEOPTIMIZATION_LIMIT
+# times.
+WARMUP = 2
+OBSERVATION_LIMIT = 16
+DEOPTIMIZATION_LIMIT = 4
+
+# The quick annotation of a site that always takes the generic path; a
+# site still being observed has None.
+GENERIC = 0
+
+# Indexed by the quick annotation of a specialized site: the type its
+# operands must have, and the operation to run on them. The names are for
+# --stats.
+SPECIALIZATIONS = [None]
+NAMES = ["generic"]
+
+# (operator type, operand type) -> index in SPECIALIZATIONS, one table per
+# node class.
+BINARY = dict()
+UNARY = dict()
+LOGICAL = dict()
+
+
+def specialize(table, operatorType, guard, op, name):
+    table[(operatorType, guard)] = len(SPECIALIZATIONS)
+    SPECIALIZATIONS.append((guard, op))
+    NAMES.append(name)
+
+
+# Division stays generic, for its check of the divisor.
+for operatorType, op in ((TokenType.PLUS, operator.add), (TokenType.MINUS, operator.sub),
+                         (TokenType.STAR, operator.mul),
+                         (TokenType.GREATER, operator.gt), (TokenType.GREATER_EQUAL, operator.ge),
+                         (TokenType.LESS, operator.lt), (TokenType.LESS_EQUAL, operator.le),
+                         (TokenType.EQUAL_EQUAL, operator.eq), (TokenType.BANG_EQUAL, operator.ne)):
+    specialize(BINARY, operatorType, float, op, "number " + operatorType.name)
+
+for operatorType, op in ((TokenType.PLUS, operator.add),
+                         (TokenType.EQUAL_EQUAL, operator.eq), (TokenType.BANG_EQUAL, operator.ne)):
+    specialize(BINARY, operatorType, str, op, "string " + operatorType.name)
+
+specialize(UNARY, TokenType.MINUS, float, operator.neg, "number MINUS")
+specialize(UNARY, TokenType.BANG, bool, operator.not_, "boolean BANG")
+
+# A boolean left operand is its own truth value.
+specialize(LOGICAL, TokenType.OR, bool, None, "boolean OR")
+specialize(LOGICAL, TokenType.AND, bool, None, "boolean AND")
+
+
+def profiledSites(statements):
+    """The Binary, Unary and Logical nodes in statements that have a profile."""
+    nodes = list(statements)
+    while nodes:
+        node = nodes.pop()
+        if isinstance(node, list):
+            nodes.extend(node)
+        elif isinstance(node, (Expr.Expr, Stmt.Stmt)):
+            if isinstance(node, (Expr.Binary, Expr.Unary, Expr.Logical)) and node.profile is not None:
+                yield node
+            nodes.extend(getattr(node, field) for field in node.fields)
+
+
+def binaryKind(operatorType, left, right):
+    """The specialization for these operands, or GENERIC if there is none."""
+    if type(left) is not type(right):
+        return GENERIC
+
+    return BINARY.get((operatorType, type(left)), GENERIC)
+
+
+def unaryKind(operatorType, right):
+    return UNARY.get((operatorType, type(right)), GENERIC)
+
+
+def logicalKind(operatorType, left):
+    return LOGICAL.get((operatorType, type(left)), GENERIC)
+
+
+class SiteProfile(object):
+    """What the interpreter has seen at one Binary, Unary or Logical site.
+
+    It is the site's profile annotation, made when the site is first
+    observed.
+
+    observe() and deoptimize() return the quick annotation the site moves
+    to, or None while it stays under observation.
+    """
+    __slots__ = ("kind", "streak", "observations", "specializations", "deoptimizations")
+
+    def __init__(self):
+        self.kind = GENERIC
+        self.streak = 0
+        self.observations = 0
+        self.specializations = 0
+        self.deoptimizations = 0
+
+    def observe(self, kind):
+        self.observations += 1
+        if kind == self.kind:
+            self.streak += 1
+        else:
+            self.kind = kind
+            self.streak = 1
+
+        if self.streak >= WARMUP:
+            if kind != GENERIC:
+                self.specializations += 1
+            return kind
+
+        if self.observations >= OBSERVATION_LIMIT:
+            self.kind = GENERIC
+            return GENERIC
+
+        return None
+
+    def deoptimize(self):
+        self.deoptimizations += 1
+        self.streak = 0
+        self.observations = 0
+        if self.deoptimizations >= DEOPTIMIZATION_LIMIT:
+            self.kind = GENERIC
+            return GENERIC
+
+        return None
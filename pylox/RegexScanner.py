@@ -0,0 +1,150 @@
+# coding=utf-8
+
+import re
+from TokenType import TokenType, ONE_CHAR_TOKENS, TWO_CHAR_TOKENS, KEYWORDS
+from Token import Token
+from TokenBuffer import TokenBuffer, literalOf
+from InternTable import InternTable
+import Pylox
+
+
+# Every alternative is a single capture group, so match.lastindex tells which
+# kind of lexeme was found without looking at the text again. Blanks in front
+# of a lexeme are skipped as part of the same match, and the catch-all
+# alternative guarantees that the matches cover the whole source.
+MASTER_REGEX = r'''
+    [ \t\r]*
+    (?:(\n[ \t\r\n]*)                # 1 newlines
+  | (//[^\n]*)                      # 2 comment
+  | ("[^"]*")                       # 3 string
+  | ("[^"]*)                        # 4 unterminated string
+  | ([0-9]+(?:\.[0-9]+)?)           # 5 number
+  | ([A-Za-z_][A-Za-z0-9_]*)        # 6 identifier or keyword
+  | (!=|==|<=|>=|[(){},.\-+;*/!=<>]) # 7 operator
+  | (UNEXPECTED)                    # 8 unexpected character
+  | \Z)                            # trailing blanks
+'''
+
+MASTER_PATTERN = re.compile(MASTER_REGEX.replace("UNEXPECTED", "."), re.VERBOSE | re.DOTALL)
+
+# Over raw UTF-8 bytes an unexpected character may span several bytes; match
+# the whole sequence so it is reported once, as it is for a str source.
+BYTES_MASTER_PATTERN = re.compile(MASTER_REGEX.replace("UNEXPECTED", r"[\xc0-\xff][\x80-\xbf]*|.").encode("ascii"),
+                                  re.VERBOSE | re.DOTALL)
+
+NEWLINES = 1
+COMMENT = 2
+STRING = 3
+UNTERMINATED_STRING = 4
+NUMBER = 5
+IDENTIFIER = 6
+OPERATOR = 7
+
+
+def operatorTable():
+    operators = dict(ONE_CHAR_TOKENS)
+    operators["/"] = TokenType.SLASH
+    for c, (withEqual, alone) in TWO_CHAR_TOKENS.items():
+        operators[c] = alone
+        operators[c + "="] = withEqual
+
+    return operators
+
+
+OPERATORS = operatorTable()
+BYTES_OPERATORS = {text.encode("ascii"): tokentype for text, tokentype in OPERATORS.items()}
+BYTES_KEYWORDS = {text.encode("ascii"): tokentype for text, tokentype in KEYWORDS.items()}
+LITERAL_TYPES = {TokenType.NUMBER, TokenType.EOF}
+
+
+class RegexScanner(object):
+    """Scans whole lexemes with one compiled master regex.
+
+    Produces the same token list and reports the same errors as
+    Scanner.Scanner, but does a single regex step and a table lookup per
+    lexeme instead of several method calls per character.
+
+    The source may also be a bytes-like object such as an mmap of the
+    script, which is scanned as UTF-8 without decoding it as a whole; only
+    the lexemes that end up in tokens are decoded.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.tokens = []
+        self.line = 1
+        self.names = InternTable()
+        self.strings = InternTable()
+        self.binary = not isinstance(source, str)
+        if self.binary:
+            self.pattern, self.operators, self.keywords, self.newline = \
+                BYTES_MASTER_PATTERN, BYTES_OPERATORS, BYTES_KEYWORDS, b"\n"
+        else:
+            self.pattern, self.operators, self.keywords, self.newline = \
+                MASTER_PATTERN, OPERATORS, KEYWORDS, "\n"
+
+    def scanTokens(self):
+        self.tokens.extend(self.iterTokens())
+        return self.tokens
+
+    def iterTokens(self):
+        source = self.source
+        binary = self.binary
+        internName = self.names.intern
+        internString = self.strings.intern
+        for tokentype, start, end, line in self.iterLexemes():
+            lexeme = source[start:end]
+            if binary:
+                lexeme = lexeme.decode("utf-8")
+
+            if tokentype is TokenType.IDENTIFIER:
+                yield Token(tokentype, internName(lexeme), None, line)
+            elif tokentype is TokenType.STRING:
+                yield Token(tokentype, lexeme, internString(lexeme[1:-1]), line)
+            elif tokentype in LITERAL_TYPES:
+                yield Token(tokentype, lexeme, literalOf(tokentype, lexeme), line)
+            else:
+                yield Token(tokentype, lexeme, None, line)
+
+    def scanTokenBuffer(self):
+        buffer = TokenBuffer(self.source, self.names, self.strings)
+        append = buffer.append
+        for tokentype, start, end, line in self.iterLexemes():
+            append(tokentype, start, end, line)
+
+        return buffer
+
+    def iterLexemes(self):
+        """Yield (type, start, end, line) for each token, without its text."""
+        operators = self.operators
+        keywords = self.keywords
+        newline = self.newline
+        line = self.line
+
+        for match in self.pattern.finditer(self.source):
+            kind = match.lastindex
+            if kind is None:
+                break
+
+            start, end = match.span(kind)
+            if kind == OPERATOR:
+                yield operators[match.group(kind)], start, end, line
+            elif kind == IDENTIFIER:
+                yield keywords.get(match.group(kind), TokenType.IDENTIFIER), start, end, line
+            elif kind == NEWLINES:
+                line += match.group(kind).count(newline)
+            elif kind == NUMBER:
+                yield TokenType.NUMBER, start, end, line
+            elif kind == STRING:
+                line += match.group(kind).count(newline)
+                yield TokenType.STRING, start, end, line
+            elif kind == COMMENT:
+                continue
+            elif kind == UNTERMINATED_STRING:
+                line += match.group(kind).count(newline)
+                Pylox.Lox.error(line, "Unterminated string.")
+            else:
+                Pylox.Lox.error(line, "Unexpected character.")
+
+        self.line = line
+        yield TokenType.EOF, len(self.source), len(self.source), line
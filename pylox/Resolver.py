@@ -28,20 +28,50 @@ class VarUsed:
 
 
 class Resolver(Expr.Visitor, Stmt.Visitor):
-    def __init__(self, interpreter):
-        self.interpreter = interpreter
+    """Checks the program and records on the nodes where each local lives.
+
+    Every variable of a scope gets a slot, numbered in declaration order.
+    A reference to a local is annotated with (depth, slot): how many scopes
+    out it was declared, and its slot there. Declarations are annotated
+    with their slot, and nodes that open a scope with its size, so the
+    engines can allocate environments as fixed-size lists. The scope that
+    holds "super" also gets a slot for each method name used with super in
+    the class, where the engines keep the superclass method once found, and
+    a Super node's slot is that one.
+
+    Globals keep depth None; a read of a global the program never
+    reassigns (declared once, never assigned) is annotated as constant, so
+    the engines may bind its value once it is defined.
+    """
+
+    def __init__(self):
         self.scopes = []
         self.currentFunction = FunctionType.NONE
         self.currentClass = ClassType.NONE
         self.var_used = []
+        self.slots = []
+        self.globalNames = set()
+        self.reassigned = set()
+        self.globalReads = []
+
+    def resolveProgram(self, statements):
+        """Resolves top-level statements: a program, or the next part of a streamed one."""
+        self.resolve(statements)
+
+        # Only after the whole program is it known which globals it
+        # reassigns. A later part of a stream may still reassign one of
+        # these; the engines watch for that.
+        for expr in self.globalReads:
+            expr.annotate(constant=expr.name.lexeme not in self.reassigned)
+        self.globalReads = []
 
     def visitBlockStmt(self, stmt: Stmt.Block):
         self.beginScope()
         self.resolve(stmt.statements)
-        self.endScope()
+        stmt.annotate(size=self.endScope())
 
     def visitVarStmt(self, stmt: Stmt.Var):
-        self.declare(stmt.name)
+        stmt.annotate(slot=self.declare(stmt.name))
         if stmt.initializer is not None:
             self.resolve(stmt.initializer)
 
@@ -59,8 +89,10 @@ class Resolver(Expr.Visitor, Stmt.Visitor):
     def beginScope(self):
         self.scopes.append(dict())
         self.var_used.append(dict())
+        self.slots.append(dict())
 
     def endScope(self):
+        """Closes the innermost scope and returns its number of slots."""
         self.scopes.pop()
 
         var_used = self.var_used.pop()
@@ -69,14 +101,29 @@ class Resolver(Expr.Visitor, Stmt.Visitor):
                 Pylox.Lox.error(token=var_used[var].token,
                                 message="Variable " + var + " is never used in this scope.")
 
+        return len(self.slots.pop())
+
     def declare(self, name):
+        """Adds name to the innermost scope and returns its slot (None for a global)."""
         if len(self.scopes) == 0:
-            return
+            if name.lexeme in self.globalNames:
+                self.reassigned.add(name.lexeme)
+            self.globalNames.add(name.lexeme)
+            return None
 
         if name.lexeme in self.scopes[-1].keys():
             Pylox.Lox.error(token=name, message="Already variable with this name in this scope.")
 
-        self.scopes[-1][name.lexeme] = VarUsed(False, name)
+        # False until define: reading the variable in its own initializer
+        # would find an empty slot.
+        self.scopes[-1][name.lexeme] = False
+        slots = self.slots[-1]
+        return slots.setdefault(name.lexeme, len(slots))
+
+    def declareImplicit(self, name):
+        """Puts "this" or "super" in slot 0 of the innermost scope."""
+        self.scopes[-1][name] = True
+        self.slots[-1][name] = 0
 
     def define(self, name):
         if len(self.scopes) == 0:
@@ -92,11 +139,13 @@ class Resolver(Expr.Visitor, Stmt.Visitor):
                 Pylox.Lox.error(token=expr.name, message="Can't read local variable in its own initializer.")
 
         self.resolveLocal(expr, expr.name)
+        if expr.depth is None:
+            self.globalReads.append(expr)
 
     def resolveLocal(self, expr: Expr.Expr, name: Token.Token):
         for i in range(len(self.scopes) - 1, -1, -1):
             if name.lexeme in self.scopes[i].keys():
-                self.interpreter.resolve(expr, len(self.scopes) - 1 - i)
+                expr.annotate(depth=len(self.scopes) - 1 - i, slot=self.slots[i][name.lexeme])
                 if name.lexeme in self.var_used[i].keys():
                     self.var_used[i][name.lexeme].used = True
                 return
@@ -104,9 +153,11 @@ class Resolver(Expr.Visitor, Stmt.Visitor):
     def visitAssignExpr(self, expr: Expr.Assign):
         self.resolve(expr.value)
         self.resolveLocal(expr, expr.name)
+        if expr.depth is None:
+            self.reassigned.add(expr.name.lexeme)
 
     def visitFunctionStmt(self, stmt: Stmt.Function):
-        self.declare(stmt.name)
+        stmt.annotate(slot=self.declare(stmt.name))
         self.define(stmt.name)
 
         self.resolveFunction(stmt, FunctionType.FUNCTION)
@@ -116,12 +167,16 @@ class Resolver(Expr.Visitor, Stmt.Visitor):
         self.currentFunction = type
 
         self.beginScope()
+        # A method's receiver is slot 0 of its own scope, so a call can bind
+        # "this" and the arguments in one environment.
+        if type in (FunctionType.METHOD, FunctionType.INITIALIZER):
+            self.declareImplicit("this")
         for param in func.params:
             self.declare(param)
             self.define(param)
 
         self.resolve(func.body)
-        self.endScope()
+        func.annotate(size=self.endScope())
 
         self.currentFunction = enclosingFunction
 
@@ -131,7 +186,7 @@ class Resolver(Expr.Visitor, Stmt.Visitor):
     def visitIfStmt(self, stmt: Stmt.If):
         self.resolve(stmt.condition)
         self.resolve(stmt.thenBranch)
-        if not stmt.elseBranch:
+        if stmt.elseBranch is not None:
             self.resolve(stmt.elseBranch)
 
     def visitPrintStmt(self, stmt: Stmt.Print):
@@ -139,17 +194,31 @@ class Resolver(Expr.Visitor, Stmt.Visitor):
 
     def visitReturnStmt(self, stmt: Stmt.Return):
         if self.currentFunction == FunctionType.NONE:
-            Pylox.Lox.error(stmt.keyword, "Can't return from top-level code.")
+            Pylox.Lox.error(token=stmt.keyword, message="Can't return from top-level code.")
 
         if stmt.value is not None:
             if self.currentFunction == FunctionType.INITIALIZER:
-                Pylox.Lox.error(stmt.keyword, "Can't return a value from an initializer.")
+                Pylox.Lox.error(token=stmt.keyword, message="Can't return a value from an initializer.")
             self.resolve(stmt.value)
+            # return f(x); is a tail call: the engines may reuse the
+            # returning call's frame for it.
+            if isinstance(stmt.value, Expr.Call):
+                stmt.annotate(tail=True)
 
     def visitWhileStmt(self, stmt: Stmt.While):
         self.resolve(stmt.condition)
         self.resolve(stmt.body)
 
+    def visitForStmt(self, stmt: Stmt.For):
+        # The interpreter runs the whole loop in one scope that holds the
+        # initializer's variable.
+        self.beginScope()
+        self.resolve(stmt.initializer)
+        self.resolve(stmt.condition)
+        self.resolve(stmt.increment)
+        self.resolve(stmt.body)
+        stmt.annotate(size=self.endScope())
+
     def visitBinaryExpr(self, expr: Expr.Binary):
         self.resolve(expr.left)
         self.resolve(expr.right)
@@ -177,11 +246,11 @@ class Resolver(Expr.Visitor, Stmt.Visitor):
         enclosingClass = self.currentClass
         self.currentClass = ClassType.CLASS
 
-        self.declare(stmt.name)
+        stmt.annotate(slot=self.declare(stmt.name))
         self.define(stmt.name)
 
         if stmt.superclass and (stmt.name.lexeme == stmt.superclass.name.lexeme):
-            Pylox.Lox.error(stmt.superclass.name, "A class can't inherit from itself.")
+            Pylox.Lox.error(token=stmt.superclass.name, message="A class can't inherit from itself.")
 
         if stmt.superclass:
             self.currentClass = ClassType.SUBCLASS
@@ -189,22 +258,17 @@ class Resolver(Expr.Visitor, Stmt.Visitor):
 
         if stmt.superclass:
             self.beginScope()
-            self.scopes[-1]["super"] = True
-
-        self.beginScope()
-        self.scopes[-1]["this"] = True
+            self.declareImplicit("super")
 
         for method in stmt.methods:
             declaration = FunctionType.METHOD
-            if method.name.lexeme is "init":
+            if method.name.lexeme == "init":
                 declaration = FunctionType.INITIALIZER
 
             self.resolveFunction(method, declaration)
 
-        self.endScope()
-
         if stmt.superclass:
-            self.endScope()
+            stmt.annotate(size=self.endScope())
 
         self.currentClass = enclosingClass
 
@@ -217,15 +281,19 @@ class Resolver(Expr.Visitor, Stmt.Visitor):
 
     def visitThisExpr(self, expr: Expr.This):
         if self.currentClass == ClassType.NONE:
-            Pylox.Lox.error(expr.keyword, "Can't use 'this' outside of a class.")
+            Pylox.Lox.error(token=expr.keyword, message="Can't use 'this' outside of a class.")
 
         self.resolveLocal(expr, expr.keyword)
 
     def visitSuperExpr(self, expr: Expr.Super):
         if self.currentClass == ClassType.NONE:
-            Pylox.Lox.error(expr.keyword, "Can't use 'super' outside of a class.")
+            Pylox.Lox.error(token=expr.keyword, message="Can't use 'super' outside of a class.")
         elif self.currentClass != ClassType.SUBCLASS:
-            Pylox.Lox.error(expr.keyword, "Can't use 'super' in a class with no superclass.")
+            Pylox.Lox.error(token=expr.keyword, message="Can't use 'super' in a class with no superclass.")
         self.resolveLocal(expr, expr.keyword)
 
+        if expr.depth is not None:
+            slots = self.slots[len(self.scopes) - 1 - expr.depth]
+            expr.annotate(slot=slots.setdefault("super." + expr.method.lexeme, len(slots)))
+
 
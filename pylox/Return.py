@@ -1,9 +1,9 @@
 # coding=utf-8
 
 
-class Return(RuntimeError):
-    def __init__(self, value):
-        super(RuntimeError, self).__init__()
-        self.value = value
-
-
+# What executing a statement returns once a return statement has run in
+# it; the value being returned is left in the interpreter's returnValue.
+# Blocks, ifs and loops pass RETURN on at once and a function call stops
+# there, so a return leaves the statements around it without raising an
+# exception. Every other statement returns something else, usually None.
+RETURN = object()
@@ -6,4 +6,5 @@ class PyloxRuntimeError(RuntimeError):
         super(RuntimeError, self).__init__()
 
         self.token = token
-        self.message = message
\ No newline at end of file
+        self.message = message
+
@@ -1,7 +1,8 @@
 # coding=utf-8
 
-from TokenType import TokenType
+from TokenType import TokenType, ONE_CHAR_TOKENS, TWO_CHAR_TOKENS, KEYWORDS
 from Token import Token
+from InternTable import InternTable
 import Pylox
 
 
@@ -12,33 +13,11 @@ class Scanner(object):
         self.start = 0
         self.current = 0
         self.line = 1
-        self.one_char_tokens_dict = {"(": TokenType.LEFT_PAREN, ")": TokenType.RIGHT_PAREN,
-                                     '{': TokenType.LEFT_BRACE, '}': TokenType.RIGHT_BRACE,
-                                     ',': TokenType.COMMA, '.': TokenType.DOT,
-                                     '-': TokenType.MINUS, '+': TokenType.PLUS,
-                                     ';': TokenType.SEMICOLON, '*': TokenType.STAR}
-
-        self.two_char_tokens_dict = {"!": (TokenType.BANG_EQUAL, TokenType.BANG),
-                                     "=": (TokenType.EQUAL_EQUAL, TokenType.EQUAL),
-                                     "<": (TokenType.LESS_EQUAL, TokenType.LESS),
-                                     ">": (TokenType.GREATER_EQUAL, TokenType.GREATER)}
-
-        self.keywords_dict = {"and": TokenType.AND,
-                                "class": TokenType.CLASS,
-                                "else": TokenType.ELSE,
-                                "false": TokenType.FALSE,
-                                "for": TokenType.FOR,
-                                "fun": TokenType.FUN,
-                                "if": TokenType.IF,
-                                "nil": TokenType.NIL,
-                                "or": TokenType.OR,
-                                "print": TokenType.PRINT,
-                                "return": TokenType.RETURN,
-                                "super": TokenType.SUPER,
-                                "this": TokenType.THIS,
-                                "true": TokenType.TRUE,
-                                "var": TokenType.VAR,
-                                "while": TokenType.WHILE}
+        self.one_char_tokens_dict = ONE_CHAR_TOKENS
+        self.two_char_tokens_dict = TWO_CHAR_TOKENS
+        self.keywords_dict = KEYWORDS
+        self.names = InternTable()
+        self.strings = InternTable()
 
     def scanTokens(self):
         while not self.isAtEnd():
@@ -48,28 +27,38 @@ class Scanner(object):
         self.tokens.append(Token(TokenType.EOF, "", "", self.line))
         return self.tokens
 
+    def iterTokens(self):
+        """Yield the tokens one at a time instead of collecting them all."""
+        while not self.isAtEnd():
+            self.start = self.current
+            self.scanToken()
+            if self.tokens:
+                yield self.tokens.pop()
+
+        yield Token(TokenType.EOF, "", "", self.line)
+
     def scanToken(self):
         c = self.advance()
-        if c in self.one_char_tokens_dict.keys():
+        if c in self.one_char_tokens_dict:
             self.addToken(self.one_char_tokens_dict[c])
 
-        elif c in self.two_char_tokens_dict.keys():
+        elif c in self.two_char_tokens_dict:
             self.addToken(self.two_char_tokens_dict[c][0] if self.match("=") else self.two_char_tokens_dict[c][1])
 
-        elif c is "/":
+        elif c == "/":
             if self.match("/"):
                 while self.peek() != "\n" and not self.isAtEnd():
                     self.advance()
             else:
                 self.addToken(TokenType.SLASH)
 
-        elif c is " " or c is "\r" or c is "\t":
+        elif c == " " or c == "\r" or c == "\t":
             return
 
-        elif c is "\n":
+        elif c == "\n":
             self.line += 1
 
-        elif c is '"':
+        elif c == '"':
             self.string()
 
         # elif c is 'o':
@@ -85,8 +74,9 @@ class Scanner(object):
                 Pylox.Lox.error(self.line, "Unexpected character.")
             return
 
-    def addToken(self, tokentype, literal=None):
-        text = self.source[self.start:self.current]
+    def addToken(self, tokentype, literal=None, text=None):
+        if text is None:
+            text = self.source[self.start:self.current]
         self.tokens.append(Token(tokentype, text, literal, self.line))
 
     def isAtEnd(self):
@@ -126,7 +116,7 @@ class Scanner(object):
         self.advance()
 
         value = self.source[self.start + 1:self.current - 1]
-        self.addToken(TokenType.STRING, value)
+        self.addToken(TokenType.STRING, self.strings.intern(value))
 
     def isDigit(self, c):
         return '0' <= c <= '9'
@@ -162,7 +152,7 @@ class Scanner(object):
         text = self.source[self.start:self.current]
         type = self.keywords_dict.get(text, None)
         if type is None:
-            type = TokenType.IDENTIFIER
-
-        self.addToken(type)
+            self.addToken(TokenType.IDENTIFIER, text=self.names.intern(text))
+        else:
+            self.addToken(type)
 
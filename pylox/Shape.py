@@ -0,0 +1,60 @@
+# coding=utf-8
+
+
+# How many shapes one property site keeps entries for; a site that sees
+# more is megamorphic and the rest go the slow way.
+POLYMORPHIC_LIMIT = 4
+
+
+class Shape(object):
+    """The layout of an instance's fields, shared by instances built alike.
+
+    slots maps each field name to its index in the instance's list of
+    values. Setting a field the shape lacks moves the instance along the
+    transition for that name to the next shape, made once and then reused,
+    so instances that get the same fields in the same order share their
+    shapes. Every class has a root shape of its own, so a shape also tells
+    which class an instance belongs to.
+    """
+    __slots__ = ("slots", "transitions")
+
+    def __init__(self, slots=None):
+        self.slots = dict() if slots is None else slots
+        self.transitions = dict()
+
+    def withField(self, name):
+        shape = self.transitions.get(name)
+        if shape is None:
+            slots = dict(self.slots)
+            slots[name] = len(slots)
+            shape = self.transitions[name] = Shape(slots)
+
+        return shape
+
+
+class InlineCache(object):
+    """What one Get or Set site has found, keyed by the shape it met.
+
+    A Get entry is (shape, slot, method): the slot of the field, or None
+    and the method the name finds. A Set entry is (shape, slot, next): the
+    slot written, and the shape the instance moves to when the field is
+    new, else None. Shapes are compared by identity, so a hit hashes
+    nothing.
+    """
+    __slots__ = ("entries",)
+
+    def __init__(self):
+        self.entries = []
+
+    def find(self, shape):
+        for entry in self.entries:
+            if entry[0] is shape:
+                return entry
+
+        return None
+
+    def add(self, entry):
+        if len(self.entries) < POLYMORPHIC_LIMIT:
+            self.entries.append(entry)
+
+        return entry
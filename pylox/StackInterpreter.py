@@ -0,0 +1,408 @@
+# coding=utf-8
+
+from typing import List
+import Expr
+import Stmt
+from TokenType import TokenType
+import Pylox
+from RuntimeError import PyloxRuntimeError
+from Environment import Environment
+from LoxFunction import LoxCallable, LoxFunction, NativeFunction, NativeMethod
+from LoxClass import LoxClass, LoxInstance
+
+
+# The most entries the control stack may hold; a call that would go past
+# it is a stack overflow.
+STACK_LIMIT = 1000000
+
+
+class StackInterpreter(Expr.Visitor, Stmt.Visitor):
+    """Execution engine that walks the tree without recursing in Python.
+
+    The work to do is a list of (continuation, node) entries: run() pops
+    one and calls it, and a visit pushes the steps of its node instead of
+    making them, the last step first. Expressions leave their values on a
+    value stack, where the step after them picks them up. A Lox call pushes
+    a frame: the caller's environment, and the height of the control stack,
+    which a return statement cuts back to. So the depth of Lox recursion,
+    and of expression nesting, costs list entries, not Python frames; when
+    the control stack would outgrow its limit, the call fails with a
+    "Stack overflow." runtime error. A call that is the value of a return
+    statement takes over the returning call's frame.
+
+    It shares the interpreter's globals, environment, inline caches and
+    output formatting, and behaves like Interpreter, runtime errors
+    included.
+    """
+
+    def __init__(self, interpreter, limit=STACK_LIMIT):
+        self.interpreter = interpreter
+        self.limit = limit
+        self.work = []
+        self.values = []
+        self.frames = []
+        self.maxFrames = 0
+
+    def interpret(self, statements):
+        self.schedule(statements)
+        try:
+            self.run()
+        except PyloxRuntimeError as error:
+            Pylox.Lox.runtimeError(error)
+        finally:
+            self.work = []
+            self.values = []
+            self.frames = []
+            self.interpreter.environment = self.interpreter.globals
+
+    def run(self):
+        work = self.work
+        while work:
+            continuation, node = work.pop()
+            continuation(node)
+
+    def visit(self, node):
+        node.accept(self)
+
+    def schedule(self, statements: List[Stmt.Stmt]):
+        visit = self.visit
+        self.work.extend((visit, statement) for statement in reversed(statements))
+
+    def restore(self, environment):
+        self.interpreter.environment = environment
+
+    def discard(self, _):
+        self.values.pop()
+
+    def visitLiteralExpr(self, expr: Expr.Literal):
+        self.values.append(expr.value)
+
+    def visitGroupingExpr(self, expr: Expr.Grouping):
+        self.work.append((self.visit, expr.expression))
+
+    def visitUnaryExpr(self, expr: Expr.Unary):
+        self.work.append((self.unary, expr))
+        self.work.append((self.visit, expr.right))
+
+    def unary(self, expr: Expr.Unary):
+        right = self.values.pop()
+        if expr.operator.type == TokenType.MINUS:
+            self.interpreter.checkNumberOperands(expr.operator, right)
+            self.values.append(-float(right))
+        elif expr.operator.type == TokenType.BANG:
+            self.values.append(not self.interpreter.isTruthy(right))
+        else:
+            self.values.append(None)
+
+    def visitBinaryExpr(self, expr: Expr.Binary):
+        self.work.append((self.binary, expr))
+        self.work.append((self.visit, expr.right))
+        self.work.append((self.visit, expr.left))
+
+    def binary(self, expr: Expr.Binary):
+        right = self.values.pop()
+        left = self.values.pop()
+        interpreter = self.interpreter
+
+        op = interpreter.binaryOp.get(expr.operator.type, None)
+        if op is None:
+            self.values.append(None)
+            return
+
+        if expr.operator.type in interpreter.checkOps_set:
+            interpreter.checkNumberOperands(expr.operator, left, right)
+
+        self.values.append(op(expr.operator, left, right))
+
+    def visitLogicalExpr(self, expr: Expr.Logical):
+        self.work.append((self.logical, expr))
+        self.work.append((self.visit, expr.left))
+
+    def logical(self, expr: Expr.Logical):
+        # The left operand stays as the value when it decides.
+        left = self.values[-1]
+        if expr.operator.type == TokenType.OR:
+            if self.interpreter.isTruthy(left):
+                return
+        elif not self.interpreter.isTruthy(left):
+            return
+
+        self.values.pop()
+        self.work.append((self.visit, expr.right))
+
+    def visitVariableExpr(self, expr: Expr.Variable):
+        self.values.append(self.interpreter.lookUpVariable(expr.name, expr))
+
+    def visitAssignExpr(self, expr: Expr.Assign):
+        self.work.append((self.assign, expr))
+        self.work.append((self.visit, expr.value))
+
+    def assign(self, expr: Expr.Assign):
+        value = self.values[-1]
+        interpreter = self.interpreter
+
+        distance = expr.depth
+        if distance is not None:
+            interpreter.environment.assignAt(distance, expr.slot, value)
+        else:
+            slot = expr.slot
+            if slot is None:
+                slot = interpreter.globalSlot(expr)
+            interpreter.globals.assignSlot(slot, expr.name, value)
+
+    def visitThisExpr(self, expr: Expr.This):
+        self.values.append(self.interpreter.visitThisExpr(expr))
+
+    def visitSuperExpr(self, expr: Expr.Super):
+        self.values.append(self.interpreter.visitSuperExpr(expr))
+
+    def visitGetExpr(self, expr: Expr.Get):
+        self.work.append((self.getProperty, expr))
+        self.work.append((self.visit, expr.object))
+
+    def getProperty(self, expr: Expr.Get):
+        obj = self.values.pop()
+        if not isinstance(obj, LoxInstance):
+            raise PyloxRuntimeError(expr.name, "Only instances have properties.")
+
+        interpreter = self.interpreter
+        self.values.append(obj.get(expr.name, expr.cache or interpreter.inlineCache(expr)))
+
+    def visitSetExpr(self, expr: Expr.Set):
+        self.work.append((self.setObject, expr))
+        self.work.append((self.visit, expr.object))
+
+    def setObject(self, expr: Expr.Set):
+        # The object is checked before the value is evaluated.
+        if not isinstance(self.values[-1], LoxInstance):
+            raise PyloxRuntimeError(expr.name, "Only instances have fields.")
+
+        self.work.append((self.setProperty, expr))
+        self.work.append((self.visit, expr.value))
+
+    def setProperty(self, expr: Expr.Set):
+        value = self.values.pop()
+        obj = self.values.pop()
+        interpreter = self.interpreter
+        obj.set(expr.name, value, expr.cache or interpreter.inlineCache(expr))
+        self.values.append(value)
+
+    def visitCallExpr(self, expr: Expr.Call):
+        """Pushes the callee, then the arguments; a method call pushes its receiver first.
+
+        Like Interpreter.invoke(), obj.name(...) runs a method with obj as
+        its receiver without binding it. A field is called like any other
+        value, with None for the receiver.
+        """
+        work = self.work
+        callee = expr.callee
+        if isinstance(callee, Expr.Get):
+            work.append((self.invoke, expr))
+            self.scheduleArguments(expr.arguments)
+            work.append((self.findMethod, callee))
+            work.append((self.visit, callee.object))
+        else:
+            work.append((self.call, expr))
+            self.scheduleArguments(expr.arguments)
+            work.append((self.visit, callee))
+
+    def scheduleArguments(self, arguments: List[Expr.Expr]):
+        visit = self.visit
+        self.work.extend((visit, argument) for argument in reversed(arguments))
+
+    def findMethod(self, get: Expr.Get):
+        obj = self.values.pop()
+        if not isinstance(obj, LoxInstance):
+            raise PyloxRuntimeError(get.name, "Only instances have properties.")
+
+        interpreter = self.interpreter
+        entry = obj.find(get.name.lexeme, get.cache or interpreter.inlineCache(get))
+        if entry is None:
+            raise PyloxRuntimeError(get.name, "Undefined property '" + get.name.lexeme + "'.")
+
+        _, slot, method = entry
+        if method is None:
+            self.values.append(None)
+            self.values.append(obj.values[slot])
+        else:
+            self.values.append(obj)
+            self.values.append(method)
+
+    def call(self, expr: Expr.Call):
+        arguments = self.popArguments(len(expr.arguments))
+        self.callValue(expr, self.values.pop(), arguments)
+
+    def invoke(self, expr: Expr.Call):
+        arguments = self.popArguments(len(expr.arguments))
+        callee = self.values.pop()
+        receiver = self.values.pop()
+        if receiver is None:
+            self.callValue(expr, callee, arguments)
+            return
+
+        if len(arguments) != callee.arity:
+            raise PyloxRuntimeError(expr.paren, "Expected " +
+                                    str(callee.arity) + " arguments but got " +
+                                    str(len(arguments)) + ".")
+
+        if isinstance(callee, NativeMethod):
+            self.values.append(callee.call(self.interpreter, receiver, arguments, expr.paren))
+        else:
+            self.enter(expr, callee, receiver, arguments)
+
+    def popArguments(self, count):
+        values = self.values
+        arguments = values[len(values) - count:]
+        del values[len(values) - count:]
+        return arguments
+
+    def callValue(self, expr: Expr.Call, callee, arguments: List[object]):
+        if not isinstance(callee, LoxCallable):
+            raise PyloxRuntimeError(expr.paren, "Can only call functions and classes.")
+
+        if len(arguments) != callee.arity:
+            raise PyloxRuntimeError(expr.paren, "Expected " +
+                                    str(callee.arity) + " arguments but got " +
+                                    str(len(arguments)) + ".")
+
+        if isinstance(callee, LoxFunction):
+            self.enter(expr, callee, callee.receiver, arguments)
+        elif isinstance(callee, LoxClass):
+            instance = LoxInstance(callee)
+            if callee.initializer is None:
+                self.values.append(instance)
+            else:
+                self.enter(expr, callee.initializer, instance, arguments)
+        elif isinstance(callee, NativeFunction):
+            self.values.append(callee.call(self.interpreter, arguments, expr.paren))
+        else:
+            self.values.append(callee(self.interpreter, arguments))
+
+    def enter(self, expr: Expr.Call, function: LoxFunction, receiver, arguments: List[object]):
+        """Starts running function's body: a new frame, or the returning call's for a tail call.
+
+        A frame is (environment, height, initialized): the caller's
+        environment, the height of the control stack under the frame's
+        leave() entry, and the instance an initializer returns, else None.
+        """
+        work = self.work
+        if work and work[-1][0] == self.returnValue and not function.isInitializer:
+            # return f(x); the returning call's frame now runs f, and its
+            # leave() entry ends it.
+            del work[self.frames[-1][1] + 1:]
+        else:
+            if len(work) >= self.limit:
+                raise PyloxRuntimeError(expr.paren, "Stack overflow.")
+
+            self.frames.append((self.interpreter.environment, len(work),
+                                receiver if function.isInitializer else None))
+            if len(self.frames) > self.maxFrames:
+                self.maxFrames = len(self.frames)
+            work.append((self.leave, None))
+
+        values = [receiver] + arguments if function.isMethod else arguments
+        self.interpreter.environment = Environment(function.closure, values + function.locals)
+        self.schedule(function.declaration.body)
+
+    def leave(self, _):
+        # The body ran to its end without a return statement.
+        self.values.append(None)
+        self.returnValue(None)
+
+    def returnValue(self, _):
+        environment, height, initialized = self.frames.pop()
+        del self.work[height:]
+        self.interpreter.environment = environment
+        if initialized is not None:
+            self.values[-1] = initialized
+
+    def visitExpressionStmt(self, stmt: Stmt.Expression):
+        self.work.append((self.discard, None))
+        self.work.append((self.visit, stmt.expression))
+
+    def visitPrintStmt(self, stmt: Stmt.Print):
+        self.work.append((self.printValue, None))
+        self.work.append((self.visit, stmt.expression))
+
+    def printValue(self, _):
+        print(self.interpreter.stringify(self.values.pop()))
+
+    def visitVarStmt(self, stmt: Stmt.Var):
+        if stmt.initializer is None:
+            self.interpreter.define(stmt.slot, stmt.name, None)
+            return
+
+        self.work.append((self.defineVariable, stmt))
+        self.work.append((self.visit, stmt.initializer))
+
+    def defineVariable(self, stmt: Stmt.Var):
+        self.interpreter.define(stmt.slot, stmt.name, self.values.pop())
+
+    def visitBlockStmt(self, stmt: Stmt.Block):
+        previous = self.interpreter.environment
+        self.work.append((self.restore, previous))
+        self.schedule(stmt.statements)
+        self.interpreter.environment = Environment(previous, [None] * stmt.size)
+
+    def visitIfStmt(self, stmt: Stmt.If):
+        self.work.append((self.branch, stmt))
+        self.work.append((self.visit, stmt.condition))
+
+    def branch(self, stmt: Stmt.If):
+        if self.interpreter.isTruthy(self.values.pop()):
+            self.work.append((self.visit, stmt.thenBranch))
+        elif stmt.elseBranch is not None:
+            self.work.append((self.visit, stmt.elseBranch))
+
+    def visitWhileStmt(self, stmt: Stmt.While):
+        self.work.append((self.whileBody, stmt))
+        self.work.append((self.visit, stmt.condition))
+
+    def whileBody(self, stmt: Stmt.While):
+        if self.interpreter.isTruthy(self.values.pop()):
+            self.work.append((self.visitWhileStmt, stmt))
+            self.work.append((self.visit, stmt.body))
+
+    def visitForStmt(self, stmt: Stmt.For):
+        # One scope for the whole loop, as in Interpreter.
+        previous = self.interpreter.environment
+        self.work.append((self.restore, previous))
+        self.work.append((self.forCondition, stmt))
+        if stmt.initializer is not None:
+            self.work.append((self.visit, stmt.initializer))
+        self.interpreter.environment = Environment(previous, [None] * stmt.size)
+
+    def forCondition(self, stmt: Stmt.For):
+        if stmt.condition is None:
+            self.forBody(stmt)
+            return
+
+        self.work.append((self.forTest, stmt))
+        self.work.append((self.visit, stmt.condition))
+
+    def forTest(self, stmt: Stmt.For):
+        if self.interpreter.isTruthy(self.values.pop()):
+            self.forBody(stmt)
+
+    def forBody(self, stmt: Stmt.For):
+        self.work.append((self.forCondition, stmt))
+        if stmt.increment is not None:
+            self.work.append((self.discard, None))
+            self.work.append((self.visit, stmt.increment))
+        self.work.append((self.visit, stmt.body))
+
+    def visitFunctionStmt(self, stmt: Stmt.Function):
+        self.interpreter.visitFunctionStmt(stmt)
+
+    def visitReturnStmt(self, stmt: Stmt.Return):
+        if stmt.value is None:
+            self.values.append(None)
+            self.returnValue(None)
+            return
+
+        self.work.append((self.returnValue, None))
+        self.work.append((self.visit, stmt.value))
+
+    def visitClassStmt(self, stmt: Stmt.Class):
+        # The superclass is a variable, so this doesn't recurse.
+        self.interpreter.visitClassStmt(stmt)
@@ -6,97 +6,221 @@ import Token
 
 
 class Stmt(object):
+	__slots__ = ()
+	annotations = ()
+
 	def accept(self, visitor):
 		raise NotImplementedError
 
 	def __setattr__(self, attr, value):
-		if hasattr(self, attr):
-			raise Exception("Attempting to alter read-only value")
+		raise Exception("Attempting to alter read-only value")
+
+	def __delattr__(self, attr):
+		raise Exception("Attempting to alter read-only value")
+
+	def annotate(self, **values):
+		for attr, value in values.items():
+			if attr not in self.annotations:
+				raise Exception("Attempting to alter read-only value")
+			object.__setattr__(self, attr, value)
 
-		self.__dict__[attr] = value
+	def __reduce__(self):
+		return type(self), tuple(getattr(self, field) for field in self.fields), \
+			tuple(getattr(self, attr) for attr in self.annotations)
+
+	def __setstate__(self, state):
+		for attr, value in zip(self.annotations, state):
+			object.__setattr__(self, attr, value)
 
 
 class Block(Stmt):
+	__slots__ = ("statements", "size")
+	fields = ("statements",)
+	annotations = ("size",)
+
 	def __init__(self, statements: List[Stmt]):
-		self.statements = statements
+		_setBlockStatements(self, statements)
+		_setBlockSize(self, 0)
 
 	def accept(self, visitor):
 		return visitor.visitBlockStmt(self)
 
 
+_setBlockStatements = Block.statements.__set__
+_setBlockSize = Block.size.__set__
+
+
 class Expression(Stmt):
+	__slots__ = ("expression",)
+	fields = __slots__
+
 	def __init__(self, expression: Expr.Expr):
-		self.expression = expression
+		_setExpressionExpression(self, expression)
 
 	def accept(self, visitor):
 		return visitor.visitExpressionStmt(self)
 
 
+_setExpressionExpression = Expression.expression.__set__
+
+
+class For(Stmt):
+	__slots__ = ("initializer", "condition", "increment", "body", "size", "loop")
+	fields = ("initializer", "condition", "increment", "body")
+	annotations = ("size", "loop")
+
+	def __init__(self, initializer: Stmt, condition: Expr.Expr, increment: Expr.Expr, body: Stmt):
+		_setForInitializer(self, initializer)
+		_setForCondition(self, condition)
+		_setForIncrement(self, increment)
+		_setForBody(self, body)
+		_setForSize(self, 0)
+		_setForLoop(self, None)
+
+	def accept(self, visitor):
+		return visitor.visitForStmt(self)
+
+
+_setForInitializer = For.initializer.__set__
+_setForCondition = For.condition.__set__
+_setForIncrement = For.increment.__set__
+_setForBody = For.body.__set__
+_setForSize = For.size.__set__
+_setForLoop = For.loop.__set__
+
+
 class Function(Stmt):
+	__slots__ = ("name", "params", "body", "slot", "size")
+	fields = ("name", "params", "body")
+	annotations = ("slot", "size")
+
 	def __init__(self, name: Token.Token, params: List[Token.Token], body: List[Stmt]):
-		self.name = name
-		self.params = params
-		self.body = body
+		_setFunctionName(self, name)
+		_setFunctionParams(self, params)
+		_setFunctionBody(self, body)
+		_setFunctionSlot(self, None)
+		_setFunctionSize(self, 0)
 
 	def accept(self, visitor):
 		return visitor.visitFunctionStmt(self)
 
 
+_setFunctionName = Function.name.__set__
+_setFunctionParams = Function.params.__set__
+_setFunctionBody = Function.body.__set__
+_setFunctionSlot = Function.slot.__set__
+_setFunctionSize = Function.size.__set__
+
+
 class Class(Stmt):
+	__slots__ = ("name", "superclass", "methods", "slot", "size")
+	fields = ("name", "superclass", "methods")
+	annotations = ("slot", "size")
+
 	def __init__(self, name: Token.Token, superclass: Expr.Variable, methods: List[Function]):
-		self.name = name
-		self.superclass = superclass
-		self.methods = methods
+		_setClassName(self, name)
+		_setClassSuperclass(self, superclass)
+		_setClassMethods(self, methods)
+		_setClassSlot(self, None)
+		_setClassSize(self, 0)
 
 	def accept(self, visitor):
 		return visitor.visitClassStmt(self)
 
 
+_setClassName = Class.name.__set__
+_setClassSuperclass = Class.superclass.__set__
+_setClassMethods = Class.methods.__set__
+_setClassSlot = Class.slot.__set__
+_setClassSize = Class.size.__set__
+
+
 class If(Stmt):
+	__slots__ = ("condition", "thenBranch", "elseBranch")
+	fields = __slots__
+
 	def __init__(self, condition: Expr.Expr, thenBranch: Stmt, elseBranch: Stmt):
-		self.condition = condition
-		self.thenBranch = thenBranch
-		self.elseBranch = elseBranch
+		_setIfCondition(self, condition)
+		_setIfThenBranch(self, thenBranch)
+		_setIfElseBranch(self, elseBranch)
 
 	def accept(self, visitor):
 		return visitor.visitIfStmt(self)
 
 
+_setIfCondition = If.condition.__set__
+_setIfThenBranch = If.thenBranch.__set__
+_setIfElseBranch = If.elseBranch.__set__
+
+
 class Print(Stmt):
+	__slots__ = ("expression",)
+	fields = __slots__
+
 	def __init__(self, expression: Expr.Expr):
-		self.expression = expression
+		_setPrintExpression(self, expression)
 
 	def accept(self, visitor):
 		return visitor.visitPrintStmt(self)
 
 
+_setPrintExpression = Print.expression.__set__
+
+
 class Return(Stmt):
+	__slots__ = ("keyword", "value", "tail")
+	fields = ("keyword", "value")
+	annotations = ("tail",)
+
 	def __init__(self, keyword: Token.Token, value: Expr.Expr):
-		self.keyword = keyword
-		self.value = value
+		_setReturnKeyword(self, keyword)
+		_setReturnValue(self, value)
+		_setReturnTail(self, False)
 
 	def accept(self, visitor):
 		return visitor.visitReturnStmt(self)
 
 
+_setReturnKeyword = Return.keyword.__set__
+_setReturnValue = Return.value.__set__
+_setReturnTail = Return.tail.__set__
+
+
 class Var(Stmt):
+	__slots__ = ("name", "initializer", "slot")
+	fields = ("name", "initializer")
+	annotations = ("slot",)
+
 	def __init__(self, name: Token.Token, initializer: Expr.Expr):
-		self.name = name
-		self.initializer = initializer
+		_setVarName(self, name)
+		_setVarInitializer(self, initializer)
+		_setVarSlot(self, None)
 
 	def accept(self, visitor):
 		return visitor.visitVarStmt(self)
 
 
+_setVarName = Var.name.__set__
+_setVarInitializer = Var.initializer.__set__
+_setVarSlot = Var.slot.__set__
+
+
 class While(Stmt):
+	__slots__ = ("condition", "body")
+	fields = __slots__
+
 	def __init__(self, condition: Expr.Expr, body: Stmt):
-		self.condition = condition
-		self.body = body
+		_setWhileCondition(self, condition)
+		_setWhileBody(self, body)
 
 	def accept(self, visitor):
 		return visitor.visitWhileStmt(self)
 
 
+_setWhileCondition = While.condition.__set__
+_setWhileBody = While.body.__set__
+
+
 class Visitor(object):
 	def visitBlockStmt(self, stmt: Block):
 		raise NotImplementedError
@@ -104,6 +228,9 @@ class Visitor(object):
 	def visitExpressionStmt(self, stmt: Expression):
 		raise NotImplementedError
 
+	def visitForStmt(self, stmt: For):
+		raise NotImplementedError
+
 	def visitFunctionStmt(self, stmt: Function):
 		raise NotImplementedError
 
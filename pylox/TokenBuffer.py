@@ -0,0 +1,86 @@
+# coding=utf-8
+
+from array import array
+from TokenType import TokenType
+from Token import Token
+from InternTable import InternTable
+
+
+# TokenType members indexed by their value, to turn a stored int back into
+# the enum without going through TokenType(value).
+TOKEN_TYPES = sorted(TokenType, key=lambda tokentype: tokentype.value)
+
+
+def literalOf(tokentype, lexeme):
+    if tokentype is TokenType.NUMBER:
+        return float(lexeme)
+
+    if tokentype is TokenType.STRING:
+        return lexeme[1:-1]
+
+    if tokentype is TokenType.EOF:
+        return ""
+
+    return None
+
+
+class TokenBuffer(object):
+    """Struct-of-arrays token list.
+
+    Each token is a row of four array columns: its type, the start and end
+    offset of its lexeme in the source, and its line. Lexemes, literals and
+    Token objects are only built when somebody asks for them. A bytes-like
+    source (e.g. an mmap) is decoded one lexeme at a time. Names and string
+    values are interned as they are materialized.
+    """
+
+    def __init__(self, source, names=None, strings=None):
+        self.source = source
+        self.names = InternTable() if names is None else names
+        self.strings = InternTable() if strings is None else strings
+        self.binary = not isinstance(source, str)
+        self.types = array("B")
+        self.starts = array("q")
+        self.ends = array("q")
+        self.lines = array("i")
+
+    def __len__(self):
+        return len(self.types)
+
+    def append(self, tokentype, start, end, line):
+        self.types.append(tokentype.value)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.lines.append(line)
+
+    def type(self, index):
+        return TOKEN_TYPES[self.types[index]]
+
+    def lexeme(self, index):
+        lexeme = self.source[self.starts[index]:self.ends[index]]
+        if self.binary:
+            return lexeme.decode("utf-8")
+
+        return lexeme
+
+    def literal(self, index):
+        tokentype = self.type(index)
+        if tokentype is TokenType.STRING:
+            return self.strings.intern(self.lexeme(index)[1:-1])
+
+        return literalOf(tokentype, self.lexeme(index))
+
+    def line(self, index):
+        return self.lines[index]
+
+    def token(self, index):
+        tokentype = self.type(index)
+        lexeme = self.lexeme(index)
+        if tokentype is TokenType.IDENTIFIER:
+            return Token(tokentype, self.names.intern(lexeme), None, self.lines[index])
+
+        return Token(tokentype, lexeme, self.literal(index), self.lines[index])
+
+    def __iter__(self):
+        for index in range(len(self.types)):
+            yield self.token(index)
@@ -52,3 +52,31 @@ class TokenType(Enum):
 
     EOF = 38
 
+
+ONE_CHAR_TOKENS = {"(": TokenType.LEFT_PAREN, ")": TokenType.RIGHT_PAREN,
+                   '{': TokenType.LEFT_BRACE, '}': TokenType.RIGHT_BRACE,
+                   ',': TokenType.COMMA, '.': TokenType.DOT,
+                   '-': TokenType.MINUS, '+': TokenType.PLUS,
+                   ';': TokenType.SEMICOLON, '*': TokenType.STAR}
+
+TWO_CHAR_TOKENS = {"!": (TokenType.BANG_EQUAL, TokenType.BANG),
+                   "=": (TokenType.EQUAL_EQUAL, TokenType.EQUAL),
+                   "<": (TokenType.LESS_EQUAL, TokenType.LESS),
+                   ">": (TokenType.GREATER_EQUAL, TokenType.GREATER)}
+
+KEYWORDS = {"and": TokenType.AND,
+            "class": TokenType.CLASS,
+            "else": TokenType.ELSE,
+            "false": TokenType.FALSE,
+            "for": TokenType.FOR,
+            "fun": TokenType.FUN,
+            "if": TokenType.IF,
+            "nil": TokenType.NIL,
+            "or": TokenType.OR,
+            "print": TokenType.PRINT,
+            "return": TokenType.RETURN,
+            "super": TokenType.SUPER,
+            "this": TokenType.THIS,
+            "true": TokenType.TRUE,
+            "var": TokenType.VAR,
+            "while": TokenType.WHILE}
@@ -0,0 +1,925 @@
+# coding=utf-8
+
+import types
+import itertools
+import Expr
+import Stmt
+from TokenType import TokenType
+import Pylox
+from Token import Token
+from RuntimeError import PyloxRuntimeError
+from LoxFunction import LoxCallable
+from Environment import UNDEFINED
+from NumArray import NumArray
+
+
+# A marker in generated text: "the code that follows is for this Lox line".
+MARK = "\x00"
+
+NUMBER_OPERATORS = {TokenType.MINUS: "-", TokenType.STAR: "*",
+                    TokenType.GREATER: ">", TokenType.GREATER_EQUAL: ">=",
+                    TokenType.LESS: "<", TokenType.LESS_EQUAL: "<="}
+
+BOOLEAN_OPERATORS = {TokenType.GREATER, TokenType.GREATER_EQUAL, TokenType.LESS, TokenType.LESS_EQUAL,
+                     TokenType.EQUAL_EQUAL, TokenType.BANG_EQUAL}
+
+
+def mark(line):
+    return MARK + str(line) + MARK
+
+
+def fail(message):
+    # The line is filled in from the traceback; see Transpiler.lineOf.
+    raise PyloxRuntimeError(None, message)
+
+
+class LoxType(type):
+    """Metaclass of the generated classes.
+
+    Lox properties are Python attributes with an "f_" prefix, so a Lox
+    name never meets a Python one. Instances keep their fields in their
+    __dict__ and find methods through the MRO, as Lox does. A class is an
+    instance too in Lox: its own fields live in loxFields, where its
+    instances can't see them, and its methods are bound to it.
+    """
+
+    def __init__(cls, name, bases, namespace):
+        super(LoxType, cls).__init__(name, bases, namespace)
+        type.__setattr__(cls, "loxFields", dict())
+
+    def __repr__(cls):
+        return type.__getattribute__(cls, "loxName")
+
+    def __getattribute__(cls, name):
+        if not name.startswith("f_"):
+            return type.__getattribute__(cls, name)
+
+        fields = type.__getattribute__(cls, "__dict__")["loxFields"]
+        if name in fields:
+            return fields[name]
+
+        method = cls.findMethod(name)
+        if method is None:
+            fail("Undefined property '" + name[2:] + "'.")
+
+        return types.MethodType(method, cls)
+
+    def __setattr__(cls, name, value):
+        if name.startswith("f_"):
+            type.__getattribute__(cls, "__dict__")["loxFields"][name] = value
+        else:
+            type.__setattr__(cls, name, value)
+
+    def findMethod(cls, name):
+        for klass in cls.__mro__:
+            method = klass.__dict__.get(name)
+            if type(method) is types.FunctionType:
+                return method
+
+        return None
+
+
+class LoxObject(object, metaclass=LoxType):
+    loxName = "LoxObject"
+
+    def __repr__(self):
+        return type(self).loxName + " instance"
+
+
+# NumArray is a native instance with "f_" attributes of its own.
+INSTANCE_TYPES = (LoxObject, LoxType, NumArray)
+
+
+def superclass(value):
+    if type(value) is not LoxType:
+        fail("Superclass must be a class.")
+
+    return value
+
+
+def checkInstance(value):
+    if not isinstance(value, INSTANCE_TYPES):
+        fail("Only instances have fields.")
+
+    return value
+
+
+def divide(left, right):
+    if not (type(left) is float and type(right) is float):
+        fail("Operand must be a number.")
+
+    fail("Float division must be non-zero.")
+
+
+def runTailCalls(function, arguments):
+    """Runs a tail call to a function compiled with a loxTail body, then the
+    tail calls that body returns, one after the other. Lox values are never
+    tuples, so a tuple returned is a (function, arguments) call to make."""
+    while True:
+        if type(function) is types.MethodType:
+            result = function.__func__.loxTail(function.__self__, *arguments)
+        else:
+            result = function.loxTail(*arguments)
+        if type(result) is not tuple:
+            return result
+        function, arguments = result
+
+
+def arityError(arity, count):
+    def error(*arguments):
+        fail("Expected " + str(arity) + " arguments but got " + str(count) + ".")
+
+    return error
+
+
+class Binding(object):
+    """A Lox local variable and the Python name it is compiled to."""
+
+    def __init__(self, name, pyName, function, inLoop):
+        self.name = name
+        self.pyName = pyName
+        self.function = function
+        self.inLoop = inLoop
+        self.captured = False
+        self.assigned = False
+
+    @property
+    def boxed(self):
+        # The tree walker gives each loop iteration a fresh variable, but a
+        # Python closure would share one; captured variables declared in a
+        # loop live in a one-element list that closures take as a default.
+        return self.captured and self.inLoop
+
+
+class FunctionInfo(object):
+    def __init__(self, enclosing):
+        self.enclosing = enclosing
+        self.loopDepth = 0
+        self.scope = None
+        self.free = []
+        self.nonlocals = []
+        # Whether functions or classes are declared inside it.
+        self.closures = False
+
+
+class Transpiler(object):
+    """Execution engine that translates the program to Python source.
+
+    Lox functions become Python functions whose Lox locals are Python
+    locals; closures capture them as Python closures do, with nonlocal for
+    assignments. Lox classes become Python classes (see LoxType), and
+    arithmetic is inlined with its type checks. The generated module goes
+    through compile() and exec(), so CPython's own interpreter runs the
+    program.
+
+    Scoping comes from the Resolver: a name it left unresolved is a global,
+    kept in its slot of the interpreter's global table. A global the
+    Resolver found constant is read as a Python global of the generated
+    module instead, which every write to it keeps in step. Before generating
+    code, analyze() binds every local declaration to a unique Python name
+    and finds the variables captured by closures.
+
+    Python functions can't drop their frame for a tail call, but a function
+    that declares no closures runs its tail calls to itself as a loop: the
+    arguments are stored into the parameters and the body starts over.
+    A function with other tail calls is compiled twice, the second copy
+    being its loxTail: there, a tail call to a function that has a loxTail
+    of its own is returned as (function, arguments) instead of being made,
+    and runTailCalls() makes the calls so returned in a loop, as
+    LoxFunction.runTailCalls does for the tree walker. Tail recursion, to
+    itself or through other functions and methods, then takes no stack.
+
+    The generated source starts a new line wherever the Lox line changes,
+    and lineMaps maps those lines back, so the line of a runtime error is
+    the line of the instruction that failed.
+    """
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.dumpFile = None
+        self.lineMaps = dict()
+        self.counter = itertools.count(1)
+        self.boundGlobals = dict()
+        self.namespace = self.runtime()
+
+    def runtime(self):
+        interpreter = self.interpreter
+        stringifyValue = interpreter.stringify
+
+        def stringify(value):
+            if type(value) is types.FunctionType:
+                return "<fn " + value.__name__ + ">"
+            if type(value) is types.MethodType:
+                return "<fn " + value.__func__.__name__ + ">"
+
+            return stringifyValue(value)
+
+        def callable(callee, count):
+            # What a call site calls, when the callee isn't a plain function
+            # of the right arity. Errors are raised by the returned function,
+            # after the arguments have been evaluated.
+            if type(callee) is types.FunctionType:
+                return arityError(callee.__code__.co_argcount, count)
+
+            if type(callee) is types.MethodType:
+                arity = callee.__func__.__code__.co_argcount - 1
+                return callee if arity == count else arityError(arity, count)
+
+            if type(callee) is LoxType:
+                initializer = callee.findMethod("f_init")
+                arity = 0 if initializer is None else initializer.__code__.co_argcount - 1
+                if arity != count:
+                    return arityError(arity, count)
+
+                def construct(*arguments):
+                    instance = object.__new__(callee)
+                    if initializer is not None:
+                        initializer(instance, *arguments)
+                    return instance
+
+                return construct
+
+            if isinstance(callee, LoxCallable):
+                if callee.arity != count:
+                    return arityError(callee.arity, count)
+
+                return lambda *arguments: callee(interpreter, list(arguments))
+
+            def notCallable(*arguments):
+                fail("Can only call functions and classes.")
+
+            return notCallable
+
+        def assignGlobal(slot, value):
+            if globals[slot] is UNDEFINED:
+                fail("Undefined variable '" + interpreter.globals.names[slot] + "'.")
+            globals[slot] = value
+            bound = boundGlobals.get(slot)
+            if bound is not None:
+                namespace[bound] = value
+            return value
+
+        globals = interpreter.globals.values
+        boundGlobals = self.boundGlobals
+        namespace = {"G": globals, "UNDEFINED": UNDEFINED, "FUNCTION": types.FunctionType,
+                     "METHOD": types.MethodType, "ADDABLE": (float, str),
+                     "INSTANCE_TYPES": INSTANCE_TYPES, "LoxObject": LoxObject,
+                     "fail": fail, "superclass": superclass, "checkInstance": checkInstance, "divide": divide,
+                     "runTailCalls": runTailCalls, "callable": callable, "assignGlobal": assignGlobal, "stringify": stringify}
+        namespace["NS"] = namespace
+        return namespace
+
+    def interpret(self, statements):
+        filename = "<lox {:d}>".format(next(self.counter))
+        source, lines = self.transpile(statements)
+        if self.dumpFile is not None:
+            with open(self.dumpFile, "a") as dump:
+                dump.write("# " + filename + "\n" + source)
+
+        try:
+            code = compile(source, filename, "exec")
+        except (SyntaxError, RecursionError, MemoryError):
+            # Expressions nested deeper than CPython's parser allows.
+            self.interpreter.interpret(statements)
+            return
+
+        self.lineMaps[filename] = lines
+        exec(code, self.namespace)
+        try:
+            self.namespace["main"]()
+        except PyloxRuntimeError as error:
+            if error.token is None:
+                error.token = Token(None, "", None, self.lineOf(error.__traceback__))
+            Pylox.Lox.runtimeError(error)
+        except (NameError, AttributeError, RecursionError) as error:
+            runtimeError = self.translate(error)
+            if runtimeError is None:
+                raise
+            Pylox.Lox.runtimeError(runtimeError)
+
+    def lineOf(self, traceback):
+        line = 0
+        while traceback is not None:
+            lines = self.lineMaps.get(traceback.tb_frame.f_code.co_filename)
+            if lines is not None:
+                line = lines[traceback.tb_lineno - 1]
+            traceback = traceback.tb_next
+
+        return line
+
+    def translate(self, error):
+        """The Lox runtime error for a Python error raised by generated code."""
+        if isinstance(error, RecursionError):
+            message = "Stack overflow."
+        else:
+            # Only an error raised by the generated code itself is one of
+            # ours; anything deeper is a bug.
+            traceback = error.__traceback__
+            while traceback.tb_next is not None:
+                traceback = traceback.tb_next
+            if traceback.tb_frame.f_code.co_filename not in self.lineMaps:
+                return None
+
+            if isinstance(error, NameError):
+                # A constant global read before it is defined.
+                message = "Undefined variable '" + error.name[2:] + "'."
+            elif isinstance(error.obj, (LoxObject, super)):
+                message = "Undefined property '" + error.name[2:] + "'."
+            else:
+                message = "Only instances have properties."
+
+        return PyloxRuntimeError(Token(None, "", None, self.lineOf(error.__traceback__)), message)
+
+    def transpile(self, statements):
+        self.references = dict()
+        self.functions = dict()
+        self.scopes = []
+        self.function = FunctionInfo(None)
+        for statement in statements:
+            self.analyze(statement)
+
+        self.output = []
+        self.indent = 0
+        self.depth = 0
+        self.returnValue = None
+        self.tailLoop = None
+        self.tailBody = False
+        self.tailCalls = False
+        self.emit("def main():")
+        self.indent += 1
+        self.emitFunctionHeader(self.function)
+        self.suite(statements)
+        self.indent -= 1
+        return self.assemble()
+
+    def assemble(self):
+        source = []
+        lines = []
+        currentLine = 0
+        for indent, text in self.output:
+            prefix = "    " * indent
+            pieces = text.split(MARK)
+            physical = prefix + pieces[0]
+            for position in range(1, len(pieces), 2):
+                line = int(pieces[position])
+                if line != currentLine and physical.strip():
+                    source.append(physical)
+                    lines.append(currentLine)
+                    physical = prefix
+                currentLine = line
+                physical += pieces[position + 1]
+            source.append(physical)
+            lines.append(currentLine)
+
+        return "\n".join(source) + "\n", lines
+
+    # Analysis: bind each local declaration to a Python name.
+
+    def declare(self, name):
+        if not self.scopes:
+            return None
+
+        binding = Binding(name, name + "_" + str(next(self.counter)), self.function, self.function.loopDepth > 0)
+        self.scopes[-1][name] = binding
+        return binding
+
+    def reference(self, node, name, assign=False):
+        if name != "this" and node.depth is None:
+            if isinstance(node, Expr.Variable) and node.constant:
+                self.bindGlobal(name)
+            return
+
+        for scope in reversed(self.scopes):
+            binding = scope.get(name)
+            if binding is not None:
+                break
+        else:
+            return
+
+        self.references[node] = binding
+        if assign:
+            binding.assigned = True
+        function = self.function
+        if binding.function is function:
+            return
+
+        binding.captured = True
+        if assign and binding not in function.nonlocals:
+            function.nonlocals.append(binding)
+        while function is not binding.function:
+            if binding not in function.free:
+                function.free.append(binding)
+            function = function.enclosing
+
+    def bindGlobal(self, name):
+        slot = self.interpreter.globals.slot(name)
+        if slot not in self.boundGlobals:
+            pyName = self.boundGlobals[slot] = "g_" + name
+            value = self.interpreter.globals.values[slot]
+            if value is not UNDEFINED:
+                self.namespace[pyName] = value
+
+    def globalTarget(self, name):
+        """The assignment target(s) that store the global name."""
+        slot = self.interpreter.globals.slot(name)
+        target = "G[" + str(slot) + "]"
+        if slot in self.boundGlobals:
+            target += " = NS[" + repr(self.boundGlobals[slot]) + "]"
+        return target
+
+    def analyzeFunction(self, stmt: Stmt.Function, receiver):
+        self.function.closures = True
+        function = self.function = self.functions[stmt] = FunctionInfo(self.function)
+        function.scope = dict()
+        self.scopes.append(function.scope)
+        if receiver:
+            self.declare("this")
+        for param in stmt.params:
+            self.declare(param.lexeme)
+        for statement in stmt.body:
+            self.analyze(statement)
+        self.scopes.pop()
+        self.function = function.enclosing
+
+    def analyze(self, node):
+        if isinstance(node, list):
+            for child in node:
+                self.analyze(child)
+        elif isinstance(node, Stmt.Block):
+            self.scopes.append(dict())
+            self.analyze(node.statements)
+            self.scopes.pop()
+        elif isinstance(node, Stmt.Var):
+            self.analyze(node.initializer)
+            self.references[node] = self.declare(node.name.lexeme)
+        elif isinstance(node, Stmt.Function):
+            self.references[node] = self.declare(node.name.lexeme)
+            self.analyzeFunction(node, False)
+        elif isinstance(node, Stmt.Class):
+            self.references[node] = self.declare(node.name.lexeme)
+            self.analyze(node.superclass)
+            for method in node.methods:
+                self.analyzeFunction(method, True)
+        elif isinstance(node, Stmt.For):
+            self.scopes.append(dict())
+            self.analyze(node.initializer)
+            self.analyze(node.condition)
+            self.analyze(node.increment)
+            self.function.loopDepth += 1
+            self.analyze(node.body)
+            self.function.loopDepth -= 1
+            self.scopes.pop()
+        elif isinstance(node, Stmt.While):
+            self.analyze(node.condition)
+            self.function.loopDepth += 1
+            self.analyze(node.body)
+            self.function.loopDepth -= 1
+        elif isinstance(node, Expr.Variable):
+            self.reference(node, node.name.lexeme)
+        elif isinstance(node, Expr.Assign):
+            self.analyze(node.value)
+            self.reference(node, node.name.lexeme, assign=True)
+        elif isinstance(node, (Expr.This, Expr.Super)):
+            self.reference(node, "this")
+        elif isinstance(node, (Expr.Expr, Stmt.Stmt)):
+            for field in node.fields:
+                self.analyze(getattr(node, field))
+
+    # Generation.
+
+    def emit(self, text):
+        self.output.append((self.indent, text))
+
+    def suite(self, statements):
+        count = len(self.output)
+        for statement in statements:
+            statement.accept(self)
+        if len(self.output) == count:
+            self.emit("pass")
+
+    def body(self, stmt):
+        self.indent += 1
+        self.suite(stmt.statements if isinstance(stmt, Stmt.Block) else [stmt])
+        self.indent -= 1
+
+    def emitFunctionHeader(self, function: FunctionInfo):
+        nonlocals = [binding.pyName for binding in function.nonlocals if not binding.boxed]
+        if nonlocals:
+            self.emit("nonlocal " + ", ".join(nonlocals))
+
+    def parameters(self, stmt: Stmt.Function, receiver):
+        function = self.functions[stmt]
+        names = [receiver] if receiver is not None else []
+        names += [function.scope[param.lexeme].pyName for param in stmt.params]
+        boxes = [binding.pyName for binding in function.free if binding.boxed]
+        if boxes:
+            names += ["*"] + [name + "=" + name for name in boxes]
+        return ", ".join(names)
+
+    def define(self, stmt, binding, value):
+        """Stores value, the Python name of a function or class just made."""
+        if binding is None:
+            self.emit(self.globalTarget(stmt.name.lexeme) + " = " + value)
+        elif binding.boxed:
+            self.emit(binding.pyName + "[0] = " + value)
+
+    def defineName(self, binding):
+        if binding is None or binding.boxed:
+            name = "_" + str(next(self.counter)) + "_"
+            if binding is not None:
+                self.emit(binding.pyName + " = [None]")
+            return name
+
+        return binding.pyName
+
+    def emitFunction(self, stmt: Stmt.Function, name, receiver=None, initializer=False):
+        tailCalls, self.tailCalls = self.tailCalls, False
+        self.emitDefinition(stmt, name, receiver, initializer)
+        self.emit(name + ".__name__ = " + repr(stmt.name.lexeme))
+        if self.tailCalls:
+            body = "_" + str(next(self.counter)) + "_"
+            self.emitDefinition(stmt, name, receiver, initializer, body)
+            self.emit(name + ".loxTail = " + body)
+            self.emit("del " + body)
+        self.tailCalls = tailCalls
+
+    def emitDefinition(self, stmt: Stmt.Function, name, receiver, initializer, tailBody=None):
+        """Defines the function name, or with tailBody, its loxTail."""
+        self.emit("def " + (tailBody or name) + "(" + self.parameters(stmt, receiver) + "):")
+        self.indent += 1
+        function = self.functions[stmt]
+        self.emitFunctionHeader(function)
+        depth, returnValue, tailLoop = self.depth, self.returnValue, self.tailLoop
+        self.depth, self.returnValue = 0, receiver if initializer else None
+        self.tailLoop = None
+        tailBody, self.tailBody = self.tailBody, tailBody is not None
+        if receiver is None and self.loopsTailCalls(stmt, name):
+            self.tailLoop = (name, [function.scope[param.lexeme].pyName for param in stmt.params])
+            self.emit("while True:")
+            self.indent += 1
+        self.suite(stmt.body)
+        if self.tailLoop is not None:
+            self.emit("return None")
+            self.indent -= 1
+        self.depth, self.returnValue, self.tailLoop = depth, returnValue, tailLoop
+        self.tailBody = tailBody
+        if initializer:
+            self.emit("return " + receiver)
+        self.indent -= 1
+
+    def loopsTailCalls(self, stmt: Stmt.Function, name):
+        """Whether the function's tail calls to itself can be a loop.
+
+        Rerunning the body reuses its Python locals, so no closure may have
+        captured them, and name, which the loop checks the callee against,
+        must be the function itself: a local binding the program assigns
+        could come to hold another one.
+        """
+        if self.functions[stmt].closures:
+            return False
+        binding = self.references[stmt]
+        if binding is not None and not binding.boxed and binding.assigned:
+            return False
+
+        return self.hasTailCall(stmt.body, len(stmt.params))
+
+    def hasTailCall(self, statements, arity):
+        # Tail calls inside a loop are left alone, as continue would go
+        # to that loop.
+        for statement in statements:
+            if isinstance(statement, Stmt.Return):
+                if statement.tail and len(statement.value.arguments) == arity:
+                    return True
+            elif isinstance(statement, Stmt.Block):
+                if self.hasTailCall(statement.statements, arity):
+                    return True
+            elif isinstance(statement, Stmt.If):
+                branches = [statement.thenBranch] if statement.elseBranch is None else \
+                    [statement.thenBranch, statement.elseBranch]
+                if self.hasTailCall(branches, arity):
+                    return True
+
+        return False
+
+    def visitBlockStmt(self, stmt: Stmt.Block):
+        for statement in stmt.statements:
+            statement.accept(self)
+
+    def visitExpressionStmt(self, stmt: Stmt.Expression):
+        expr = stmt.expression
+        if isinstance(expr, Expr.Assign):
+            self.assignStatement(expr)
+        elif isinstance(expr, Expr.Set):
+            self.setStatement(expr)
+        else:
+            self.emit("(" + self.expression(expr) + ")")
+
+    def visitFunctionStmt(self, stmt: Stmt.Function):
+        binding = self.references[stmt]
+        name = self.defineName(binding)
+        self.emitFunction(stmt, name)
+        self.define(stmt, binding, name)
+
+    def visitClassStmt(self, stmt: Stmt.Class):
+        binding = self.references[stmt]
+        name = self.defineName(binding)
+        base = "LoxObject"
+        if stmt.superclass is not None:
+            base = mark(stmt.superclass.name.line) + "superclass(" + self.expression(stmt.superclass) + ")"
+
+        self.emit("class " + name + "(" + base + "):")
+        self.indent += 1
+        self.emit("loxName = " + repr(stmt.name.lexeme))
+        for method in stmt.methods:
+            receiver = self.functions[method].scope["this"].pyName
+            self.emitFunction(method, "f_" + method.name.lexeme, receiver, method.name.lexeme == "init")
+        self.indent -= 1
+        self.define(stmt, binding, name)
+
+    def visitIfStmt(self, stmt: Stmt.If):
+        self.emit("if " + self.condition(stmt.condition) + ":")
+        self.body(stmt.thenBranch)
+        if stmt.elseBranch is not None:
+            self.emit("else:")
+            self.body(stmt.elseBranch)
+
+    def visitPrintStmt(self, stmt: Stmt.Print):
+        self.emit("print(stringify(" + self.expression(stmt.expression) + "))")
+
+    def visitReturnStmt(self, stmt: Stmt.Return):
+        if stmt.tail:
+            self.tailCall(stmt.value)
+        elif stmt.value is None:
+            self.emit("return " + str(self.returnValue))
+        else:
+            self.emit("return (" + self.expression(stmt.value) + ")")
+
+    def tailCall(self, call: Expr.Call):
+        """return f(...); made without a Python frame where it can be.
+
+        In a function that loops its tail calls to itself, a call to itself
+        starts the body over. A call to a function with a loxTail is run by
+        runTailCalls(), or returned to it from a loxTail body. Anything else
+        is called here: it has no tail calls, so its frame is the last.
+        """
+        callee = self.temp("f")
+        self.emit(callee + " = " + self.expression(call.callee))
+        count = len(call.arguments)
+        if self.tailLoop is not None and count == len(self.tailLoop[1]):
+            name, parameters = self.tailLoop
+            self.emit("if " + callee + " is " + name + ":")
+            self.indent += 1
+            arguments = ", ".join("(" + self.expression(argument) + ")" for argument in call.arguments)
+            if arguments:
+                self.emit(", ".join(parameters) + " = " + arguments)
+            self.emit("continue")
+            self.indent -= 1
+
+        self.tailCalls = True
+        self.emit(callee + " = (" + callee + " if type(" + callee + ") is FUNCTION and " + callee +
+                  ".__code__.co_argcount == " + str(count) + " else callable(" + callee + ", " + str(count) + "))")
+        arguments = ", ".join(self.expression(argument) for argument in call.arguments)
+        pending = callee + ", (" + arguments + ("," if count == 1 else "") + ")"
+        pending = "(" + pending + ")" if self.tailBody else "runTailCalls(" + pending + ")"
+        # A bound method's attributes are its function's, but looking one up
+        # that isn't there raises and catches an AttributeError.
+        self.emit("return (" + pending + " if hasattr(" + callee + ".__func__ if type(" + callee +
+                  ") is METHOD else " + callee + ", 'loxTail') else " + mark(call.paren.line) + callee +
+                  "(" + arguments + "))")
+
+    def visitVarStmt(self, stmt: Stmt.Var):
+        value = "None" if stmt.initializer is None else self.expression(stmt.initializer)
+        binding = self.references[stmt]
+        if binding is None:
+            self.emit(self.globalTarget(stmt.name.lexeme) + " = (" + value + ")")
+        elif binding.boxed:
+            self.emit(binding.pyName + " = [" + value + "]")
+        else:
+            self.emit(binding.pyName + " = (" + value + ")")
+
+    def visitWhileStmt(self, stmt: Stmt.While):
+        self.emit("while " + self.condition(stmt.condition) + ":")
+        self.loopBody(stmt.body)
+
+    def visitForStmt(self, stmt: Stmt.For):
+        if stmt.initializer is not None:
+            stmt.initializer.accept(self)
+
+        condition = "True" if stmt.condition is None else self.condition(stmt.condition)
+        self.emit("while " + condition + ":")
+        self.loopBody(stmt.body)
+        if stmt.increment is not None:
+            self.indent += 1
+            self.visitExpressionStmt(Stmt.Expression(stmt.increment))
+            self.indent -= 1
+
+    def loopBody(self, stmt):
+        tailLoop, self.tailLoop = self.tailLoop, None
+        self.body(stmt)
+        self.tailLoop = tailLoop
+
+    def assignStatement(self, expr: Expr.Assign):
+        binding = self.references.get(expr)
+        value = self.expression(expr.value)
+        if binding is None:
+            temp = self.temp("v")
+            self.emit(temp + " = (" + value + ")")
+            slot = str(self.interpreter.globals.slot(expr.name.lexeme))
+            self.emit(self.globalTarget(expr.name.lexeme) + " = (" + temp + " if G[" + slot + "] is not UNDEFINED else " +
+                      mark(expr.name.line) + "fail(" + repr("Undefined variable '" + expr.name.lexeme + "'.") + "))")
+        elif binding.boxed:
+            self.emit(binding.pyName + "[0] = (" + value + ")")
+        else:
+            self.emit(binding.pyName + " = (" + value + ")")
+
+    def setStatement(self, expr: Expr.Set):
+        field = "f_" + expr.name.lexeme
+        obj = expr.object
+        if isinstance(obj, Expr.This):
+            target = self.variable(obj, "this")
+        else:
+            target = self.temp("v")
+            self.emit(target + " = (" + self.expression(obj) + ")")
+            self.emit("if not isinstance(" + target + ", INSTANCE_TYPES): (" + mark(expr.name.line) +
+                      "fail('Only instances have fields.'))")
+        self.emit(target + "." + field + " = (" + self.expression(expr.value) + ")")
+
+    # Expressions: each compiles to an atom or a parenthesized expression.
+
+    def expression(self, expr):
+        self.depth += 1
+        try:
+            return expr.accept(self)
+        finally:
+            self.depth -= 1
+
+    def temp(self, kind):
+        return "_" + kind + str(self.depth)
+
+    def isBoolean(self, expr):
+        if isinstance(expr, Expr.Binary):
+            return expr.operator.type in BOOLEAN_OPERATORS
+        if isinstance(expr, Expr.Unary):
+            return expr.operator.type == TokenType.BANG
+        if isinstance(expr, Expr.Literal):
+            return isinstance(expr.value, bool)
+        if isinstance(expr, Expr.Grouping):
+            return self.isBoolean(expr.expression)
+        return False
+
+    def condition(self, expr):
+        value = self.expression(expr)
+        if self.isBoolean(expr):
+            return value
+
+        temp = self.temp("c")
+        return "((" + temp + " := " + value + ") is not None and " + temp + " is not False)"
+
+    def operand(self, expr, kind):
+        """(value, evaluation, type) of an operand: a pure expression is used
+        as it is, anything else is evaluated once into a temporary."""
+        self.depth += 1
+        try:
+            if isinstance(expr, Expr.Literal) and isinstance(expr.value, (float, str)):
+                return repr(expr.value), repr(expr.value), type(expr.value).__name__
+
+            code = expr.accept(self)
+            if isinstance(expr, (Expr.Variable, Expr.This)) and self.references.get(expr) is not None:
+                return code, code, None
+
+            temp = self.temp(kind)
+            return temp, "(" + temp + " := " + code + ")", None
+        finally:
+            self.depth -= 1
+
+    def typeCheck(self, left, right, types):
+        """Python that evaluates both operands, then checks their types."""
+        leftValue, leftCode, leftType = left
+        rightValue, rightCode, rightType = right
+        if leftType is not None and rightType is not None:
+            return "True" if leftType == rightType and leftType in types else "False"
+        if leftType is not None:
+            return "type(" + rightCode + ") is " + leftType if leftType in types else "False"
+        if rightType is not None:
+            return "type(" + leftCode + ") is " + rightType if rightType in types else "False"
+        if len(types) == 1:
+            return "type(" + leftCode + ") is type(" + rightCode + ") is " + types[0]
+        return "type(" + leftCode + ") is type(" + rightCode + ") in ADDABLE"
+
+    def visitAssignExpr(self, expr: Expr.Assign):
+        binding = self.references.get(expr)
+        value = self.expression(expr.value)
+        if binding is None:
+            slot = self.interpreter.globals.slot(expr.name.lexeme)
+            return "(" + mark(expr.name.line) + "assignGlobal(" + str(slot) + ", " + value + "))"
+        if binding.boxed:
+            temp = self.temp("v")
+            return "(" + binding.pyName + ".__setitem__(0, " + temp + " := " + value + ") or " + temp + ")"
+        return "(" + binding.pyName + " := " + value + ")"
+
+    def visitBinaryExpr(self, expr: Expr.Binary):
+        operator = expr.operator.type
+        left = self.operand(expr.left, "l")
+        right = self.operand(expr.right, "r")
+        if operator in (TokenType.EQUAL_EQUAL, TokenType.BANG_EQUAL):
+            symbol, identity = ("==", "is") if operator == TokenType.EQUAL_EQUAL else ("!=", "is not")
+            if left[2] is not None or right[2] is not None:
+                return "(" + left[1] + " " + symbol + " " + right[1] + ")"
+            # Python's bound methods are equal when they bind the same
+            # function to the same object; in Lox every access binds a
+            # method anew, and two values are only equal if they are one.
+            return ("(" + left[0] + " " + identity + " " + right[1] + " if type(" + left[1] + ") is METHOD else " +
+                    left[0] + " " + symbol + " " + right[1] + ")")
+
+        error = mark(expr.operator.line)
+        if operator == TokenType.PLUS:
+            check = self.typeCheck(left, right, ("float", "str"))
+            return ("(" + left[0] + " + " + right[0] + " if " + check + " else " + error +
+                    "fail('Operands must be two numbers or two strings.'))")
+
+        if operator == TokenType.SLASH:
+            check = self.typeCheck(left, right, ("float",))
+            return ("(" + left[0] + " / " + right[0] + " if " + check + " and abs(" + right[0] + ") >= 1e-15 else " +
+                    error + "divide(" + left[0] + ", " + right[0] + "))")
+
+        symbol = NUMBER_OPERATORS.get(operator)
+        if symbol is None:
+            return "(" + left[1] + ", " + right[1] + ", None)[2]"
+
+        check = self.typeCheck(left, right, ("float",))
+        return ("(" + left[0] + " " + symbol + " " + right[0] + " if " + check + " else " + error +
+                "fail('Operand must be a number.'))")
+
+    def visitCallExpr(self, expr: Expr.Call):
+        return self.call(expr, self.operand(expr.callee, "f"))
+
+    def call(self, expr: Expr.Call, callee):
+        arguments = ", ".join(self.expression(argument) for argument in expr.arguments)
+        count = len(expr.arguments)
+        # A Lox function is a Python function; anything else goes through
+        # callable(), which hands back what to call.
+        function = ("(" + callee[0] + " if type(" + callee[1] + ") is FUNCTION and " + callee[0] +
+                    ".__code__.co_argcount == " + str(count) + " else callable(" + callee[0] + ", " + str(count) + "))")
+        return "(" + mark(expr.paren.line) + function + "(" + arguments + "))"
+
+    def visitGetExpr(self, expr: Expr.Get):
+        return "((" + self.expression(expr.object) + ")." + mark(expr.name.line) + "f_" + expr.name.lexeme + ")"
+
+    def visitGroupingExpr(self, expr: Expr.Grouping):
+        return self.expression(expr.expression)
+
+    def visitLiteralExpr(self, expr: Expr.Literal):
+        return repr(expr.value)
+
+    def visitLogicalExpr(self, expr: Expr.Logical):
+        left = self.expression(expr.left)
+        right = self.expression(expr.right)
+        temp = self.temp("v")
+        truthy = "(" + temp + " := " + left + ") is not None and " + temp + " is not False"
+        if expr.operator.type == TokenType.OR:
+            return "(" + temp + " if " + truthy + " else " + right + ")"
+        return "(" + right + " if " + truthy + " else " + temp + ")"
+
+    def visitSetExpr(self, expr: Expr.Set):
+        obj = mark(expr.name.line) + "checkInstance(" + self.expression(expr.object) + ")"
+        temp = self.temp("v")
+        return ("(setattr(" + obj + ", 'f_" + expr.name.lexeme + "', " + temp + " := " +
+                self.expression(expr.value) + ") or " + temp + ")")
+
+    def visitSuperExpr(self, expr: Expr.Super):
+        this = self.variable(expr, "this")
+        return "(super(__class__, " + this + ")." + mark(expr.method.line) + "f_" + expr.method.lexeme + ")"
+
+    def visitThisExpr(self, expr: Expr.This):
+        return self.variable(expr, "this")
+
+    def visitUnaryExpr(self, expr: Expr.Unary):
+        if expr.operator.type == TokenType.BANG:
+            if self.isBoolean(expr.right):
+                return "(not " + self.expression(expr.right) + ")"
+            temp = self.temp("v")
+            return "((" + temp + " := " + self.expression(expr.right) + ") is None or " + temp + " is False)"
+
+        value, code, valueType = self.operand(expr.right, "v")
+        if expr.operator.type != TokenType.MINUS:
+            return "(" + code + ", None)[1]"
+
+        check = "True" if valueType == "float" else "type(" + code + ") is float"
+        return ("(-" + value + " if " + check + " else " + mark(expr.operator.line) +
+                "fail('Operand must be a number.'))")
+
+    def visitVariableExpr(self, expr: Expr.Variable):
+        return self.variable(expr, expr.name.lexeme, expr.name.line)
+
+    def variable(self, expr, name, line=0):
+        binding = self.references.get(expr)
+        if binding is None:
+            slot = self.interpreter.globals.slot(name)
+            if slot in self.boundGlobals:
+                return "(" + mark(line) + self.boundGlobals[slot] + ")"
+            temp = self.temp("g")
+            return ("(" + temp + " if (" + temp + " := G[" + str(slot) + "]) is not UNDEFINED else " + mark(line) +
+                    "fail(" + repr("Undefined variable '" + name + "'.") + "))")
+        if binding.boxed:
+            return binding.pyName + "[0]"
+        return binding.pyName
@@ -0,0 +1,493 @@
+# coding=utf-8
+
+import Pylox
+from Token import Token
+from RuntimeError import PyloxRuntimeError
+from LoxFunction import LoxCallable, NativeFunction
+from LoxClass import LoxClass, LoxInstance
+from Environment import UNDEFINED
+from Chunk import OpCode
+from BytecodeCompiler import BytecodeCompiler
+
+
+FRAMES_MAX = 4096
+
+# The dispatch loop tests op against module globals: cheaper than an
+# OpCode attribute lookup per test.
+globals().update((name, value) for name, value in vars(OpCode).items() if not name.startswith("_"))
+
+
+class VMUpvalue(object):
+    """A variable captured by a closure.
+
+    While the variable's frame is live the upvalue points at its stack
+    slot; when the slot goes away the value moves into a cell of its own.
+    """
+    __slots__ = ("cells", "index")
+
+    def __init__(self, cells, index):
+        self.cells = cells
+        self.index = index
+
+
+class VMClosure(LoxCallable):
+    def __init__(self, function, upvalues):
+        super(LoxCallable, self).__init__()
+        self.function = function
+        self.upvalues = upvalues
+
+    @property
+    def arity(self):
+        return self.function.arity
+
+    def bind(self, instance):
+        return VMBoundMethod(instance, self)
+
+    def __repr__(self):
+        return repr(self.function)
+
+
+class VMBoundMethod(LoxCallable):
+    def __init__(self, receiver, method: VMClosure):
+        super(LoxCallable, self).__init__()
+        self.receiver = receiver
+        self.method = method
+
+    @property
+    def arity(self):
+        return self.method.arity
+
+    def __repr__(self):
+        return repr(self.method)
+
+
+class VM(object):
+    """Execution engine that compiles the program to bytecode and runs it.
+
+    The dispatch loop keeps the running frame's code, constants, instruction
+    pointer and stack base in Python locals; a Lox call saves them on the
+    frame list and switches to the callee, so Lox calls don't recurse in
+    Python. Locals live in the frame's window of the value stack. A call
+    in tail position reuses the caller's frame, so tail recursion doesn't
+    run into FRAMES_MAX. A method called as obj.name(...) runs with obj in
+    slot 0, without being bound (see Chunk).
+
+    A read of a global the Resolver found constant binds its value into the
+    code on first success: the instruction becomes a CONSTANT load. If the
+    global is written after all (a later part of a streamed program), those
+    sites fall back to plain global loads.
+
+    It shares the interpreter's globals and output formatting, and reports
+    the same runtime errors, at the same lines, as Interpreter.
+    """
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.globals = interpreter.globals.values
+        self.globalNames = interpreter.globals.names
+        self.boundSites = dict()
+        self.stack = []
+        self.frames = []
+        self.openUpvalues = dict()
+
+    def interpret(self, statements):
+        script = BytecodeCompiler(self.interpreter.globals).compileScript(statements)
+        self.stack = [VMClosure(script, [])]
+        self.frames = []
+        self.openUpvalues = dict()
+        try:
+            self.run()
+        except PyloxRuntimeError as error:
+            Pylox.Lox.runtimeError(error)
+
+    @staticmethod
+    def error(line, message):
+        return PyloxRuntimeError(Token(None, "", None, line), message)
+
+    def captureUpvalue(self, slot):
+        upvalue = self.openUpvalues.get(slot)
+        if upvalue is None:
+            upvalue = self.openUpvalues[slot] = VMUpvalue(self.stack, slot)
+
+        return upvalue
+
+    def bindGlobal(self, chunk, offset, slot, value):
+        chunk.code[offset] = OpCode.CONSTANT
+        chunk.code[offset + 1] = chunk.addConstant(value)
+        self.boundSites.setdefault(slot, []).append((chunk.code, offset))
+
+    def unbindGlobal(self, slot):
+        for code, offset in self.boundSites.pop(slot):
+            code[offset] = OpCode.GET_GLOBAL
+            code[offset + 1] = slot
+
+    def closeUpvalues(self, last):
+        stack = self.stack
+        for slot in [slot for slot in self.openUpvalues if slot >= last]:
+            upvalue = self.openUpvalues.pop(slot)
+            upvalue.cells = [stack[slot]]
+            upvalue.index = 0
+
+    def run(self):
+        stack = self.stack
+        frames = self.frames
+        globals = self.globals
+        globalNames = self.globalNames
+        boundSites = self.boundSites
+        openUpvalues = self.openUpvalues
+        interpreter = self.interpreter
+        stringify = interpreter.stringify
+        error = self.error
+
+        closure = stack[0]
+        chunk = closure.function.chunk
+        code, constants, lines = chunk.code, chunk.constants, chunk.lines
+        ip = 0
+        base = 0
+
+        while True:
+            op = code[ip]
+            ip += 1
+
+            if op == GET_LOCAL:
+                stack.append(stack[base + code[ip]])
+                ip += 1
+            elif op == CONSTANT:
+                stack.append(constants[code[ip]])
+                ip += 1
+            elif op == POP_JUMP_IF_FALSE:
+                value = stack.pop()
+                if value is None or value is False:
+                    ip = code[ip]
+                else:
+                    ip += 1
+            elif op == GET_GLOBAL:
+                value = globals[code[ip]]
+                if value is UNDEFINED:
+                    raise error(lines[ip], "Undefined variable '" + globalNames[code[ip]] + "'.")
+                stack.append(value)
+                ip += 1
+            elif op == SET_LOCAL:
+                stack[base + code[ip]] = stack[-1]
+                ip += 1
+            elif op == POP:
+                stack.pop()
+            elif op == ADD:
+                b = stack.pop()
+                a = stack[-1]
+                if (isinstance(a, float) and isinstance(b, float)) or (isinstance(a, str) and isinstance(b, str)):
+                    stack[-1] = a + b
+                else:
+                    raise error(lines[ip - 1], "Operands must be two numbers or two strings.")
+            elif op == SUBTRACT:
+                b = stack.pop()
+                a = stack[-1]
+                if not (isinstance(a, float) and isinstance(b, float)):
+                    raise error(lines[ip - 1], "Operand must be a number.")
+                stack[-1] = a - b
+            elif op == LESS:
+                b = stack.pop()
+                a = stack[-1]
+                if not (isinstance(a, float) and isinstance(b, float)):
+                    raise error(lines[ip - 1], "Operand must be a number.")
+                stack[-1] = a < b
+            elif op == CALL:
+                argCount = code[ip]
+                ip += 1
+                callee = stack[-1 - argCount]
+                calleeType = type(callee)
+                if calleeType is VMBoundMethod:
+                    stack[-1 - argCount] = callee.receiver
+                    callee = callee.method
+                elif calleeType is LoxClass:
+                    stack[-1 - argCount] = LoxInstance(callee)
+                    initializer = callee.initializer
+                    if initializer is None:
+                        if argCount != 0:
+                            raise error(lines[ip - 1], "Expected 0 arguments but got " + str(argCount) + ".")
+                        continue
+                    callee = initializer
+                elif calleeType is not VMClosure:
+                    if not isinstance(callee, LoxCallable):
+                        raise error(lines[ip - 1], "Can only call functions and classes.")
+                    if argCount != callee.arity:
+                        raise error(lines[ip - 1], "Expected " + str(callee.arity) + " arguments but got " +
+                                    str(argCount) + ".")
+                    arguments = stack[len(stack) - argCount:]
+                    del stack[len(stack) - argCount - 1:]
+                    if isinstance(callee, NativeFunction):
+                        stack.append(callee.call(interpreter, arguments, Token(None, "", None, lines[ip - 1])))
+                    else:
+                        stack.append(callee(interpreter, arguments))
+                    continue
+
+                if argCount != callee.function.arity:
+                    raise error(lines[ip - 1], "Expected " + str(callee.function.arity) + " arguments but got " +
+                                str(argCount) + ".")
+                if code[ip] == RETURN:
+                    # A tail call (return f(x); compiles to CALL, RETURN):
+                    # the callee takes over this frame's window.
+                    if openUpvalues:
+                        self.closeUpvalues(base)
+                    del stack[base:len(stack) - argCount - 1]
+                else:
+                    if len(frames) == FRAMES_MAX:
+                        raise error(lines[ip - 1], "Stack overflow.")
+
+                    frames.append((closure, ip, base))
+                    base = len(stack) - argCount - 1
+
+                closure = callee
+                chunk = callee.function.chunk
+                code, constants, lines = chunk.code, chunk.constants, chunk.lines
+                ip = 0
+            elif op == RETURN:
+                result = stack.pop()
+                if openUpvalues:
+                    self.closeUpvalues(base)
+                del stack[base:]
+                if not frames:
+                    return
+
+                closure, ip, base = frames.pop()
+                chunk = closure.function.chunk
+                code, constants, lines = chunk.code, chunk.constants, chunk.lines
+                stack.append(result)
+            elif op == FIND_METHOD:
+                instance = stack[-1]
+                if not isinstance(instance, LoxInstance):
+                    raise error(lines[ip], "Only instances have properties.")
+
+                shape = instance.shape
+                for entryShape, slot, method in chunk.caches[code[ip + 1]].entries:
+                    if entryShape is shape:
+                        break
+                else:
+                    name = constants[code[ip]]
+                    entry = instance.find(name, chunk.caches[code[ip + 1]])
+                    if entry is None:
+                        raise error(lines[ip], "Undefined property '" + name + "'.")
+                    _, slot, method = entry
+                ip += 2
+
+                if method is None:
+                    stack[-1] = None
+                    stack.append(instance.values[slot])
+                else:
+                    stack.append(method)
+            elif op == INVOKE:
+                argCount = code[ip]
+                method = stack.pop(-1 - argCount)
+                receiver = stack[-1 - argCount]
+                if receiver is None:
+                    # The value of a field, for the CALL that follows.
+                    stack[-1 - argCount] = method
+                    ip += 1
+                    continue
+
+                if type(method) is not VMClosure:
+                    # A native method, of a NumArray.
+                    if argCount != method.arity:
+                        raise error(lines[ip], "Expected " + str(method.arity) + " arguments but got " +
+                                    str(argCount) + ".")
+                    arguments = stack[len(stack) - argCount:]
+                    del stack[len(stack) - argCount - 1:]
+                    stack.append(method.call(interpreter, receiver, arguments, Token(None, "", None, lines[ip])))
+                    ip += 3
+                    continue
+
+                if argCount != method.function.arity:
+                    raise error(lines[ip], "Expected " + str(method.function.arity) + " arguments but got " +
+                                str(argCount) + ".")
+                # Past the operand and the CALL; the receiver is slot 0.
+                ip += 3
+                if code[ip] == RETURN:
+                    if openUpvalues:
+                        self.closeUpvalues(base)
+                    del stack[base:len(stack) - argCount - 1]
+                else:
+                    if len(frames) == FRAMES_MAX:
+                        raise error(lines[ip - 3], "Stack overflow.")
+
+                    frames.append((closure, ip, base))
+                    base = len(stack) - argCount - 1
+
+                closure = method
+                chunk = method.function.chunk
+                code, constants, lines = chunk.code, chunk.constants, chunk.lines
+                ip = 0
+            elif op == JUMP:
+                ip = code[ip]
+            elif op == GET_PROPERTY:
+                instance = stack[-1]
+                if not isinstance(instance, LoxInstance):
+                    raise error(lines[ip], "Only instances have properties.")
+
+                shape = instance.shape
+                for entryShape, slot, method in chunk.caches[code[ip + 1]].entries:
+                    if entryShape is shape:
+                        break
+                else:
+                    name = constants[code[ip]]
+                    entry = instance.find(name, chunk.caches[code[ip + 1]])
+                    if entry is None:
+                        raise error(lines[ip], "Undefined property '" + name + "'.")
+                    _, slot, method = entry
+                ip += 2
+
+                if method is None:
+                    stack[-1] = instance.values[slot]
+                elif type(method) is VMClosure:
+                    stack[-1] = VMBoundMethod(instance, method)
+                else:
+                    # A native method, of a NumArray.
+                    stack[-1] = method.bind(instance)
+            elif op == SET_PROPERTY:
+                value = stack.pop()
+                stack[-1].setField(constants[code[ip]], value, chunk.caches[code[ip + 1]])
+                stack[-1] = value
+                ip += 2
+            elif op == CHECK_INSTANCE:
+                if not isinstance(stack[-1], LoxInstance):
+                    raise error(lines[ip - 1], "Only instances have fields.")
+            elif op == GET_UPVALUE:
+                upvalue = closure.upvalues[code[ip]]
+                stack.append(upvalue.cells[upvalue.index])
+                ip += 1
+            elif op == SET_UPVALUE:
+                upvalue = closure.upvalues[code[ip]]
+                upvalue.cells[upvalue.index] = stack[-1]
+                ip += 1
+            elif op == NIL:
+                stack.append(None)
+            elif op == TRUE:
+                stack.append(True)
+            elif op == FALSE:
+                stack.append(False)
+            elif op == SET_GLOBAL:
+                slot = code[ip]
+                ip += 1
+                if globals[slot] is UNDEFINED:
+                    raise error(lines[ip - 1], "Undefined variable '" + globalNames[slot] + "'.")
+                globals[slot] = stack[-1]
+                if slot in boundSites:
+                    self.unbindGlobal(slot)
+            elif op == DEFINE_GLOBAL:
+                slot = code[ip]
+                ip += 1
+                globals[slot] = stack.pop()
+                if slot in boundSites:
+                    self.unbindGlobal(slot)
+            elif op == GET_CONSTANT_GLOBAL:
+                slot = code[ip]
+                value = globals[slot]
+                if value is UNDEFINED:
+                    raise error(lines[ip], "Undefined variable '" + globalNames[slot] + "'.")
+                self.bindGlobal(chunk, ip - 1, slot, value)
+                stack.append(value)
+                ip += 1
+            elif op == EQUAL:
+                b = stack.pop()
+                stack[-1] = stack[-1] == b
+            elif op == NOT_EQUAL:
+                b = stack.pop()
+                stack[-1] = not (stack[-1] == b)
+            elif op == GREATER:
+                b = stack.pop()
+                a = stack[-1]
+                if not (isinstance(a, float) and isinstance(b, float)):
+                    raise error(lines[ip - 1], "Operand must be a number.")
+                stack[-1] = a > b
+            elif op == GREATER_EQUAL:
+                b = stack.pop()
+                a = stack[-1]
+                if not (isinstance(a, float) and isinstance(b, float)):
+                    raise error(lines[ip - 1], "Operand must be a number.")
+                stack[-1] = a >= b
+            elif op == LESS_EQUAL:
+                b = stack.pop()
+                a = stack[-1]
+                if not (isinstance(a, float) and isinstance(b, float)):
+                    raise error(lines[ip - 1], "Operand must be a number.")
+                stack[-1] = a <= b
+            elif op == MULTIPLY:
+                b = stack.pop()
+                a = stack[-1]
+                if not (isinstance(a, float) and isinstance(b, float)):
+                    raise error(lines[ip - 1], "Operand must be a number.")
+                stack[-1] = a * b
+            elif op == DIVIDE:
+                b = stack.pop()
+                a = stack[-1]
+                if not (isinstance(a, float) and isinstance(b, float)):
+                    raise error(lines[ip - 1], "Operand must be a number.")
+                if abs(b) < 1e-15:
+                    raise error(lines[ip - 1], "Float division must be non-zero.")
+                stack[-1] = a / b
+            elif op == NOT:
+                value = stack[-1]
+                stack[-1] = value is None or value is False
+            elif op == NEGATE:
+                value = stack[-1]
+                if not isinstance(value, float):
+                    raise error(lines[ip - 1], "Operand must be a number.")
+                stack[-1] = -value
+            elif op == PRINT:
+                print(stringify(stack.pop()))
+            elif op == JUMP_IF_FALSE:
+                value = stack[-1]
+                if value is None or value is False:
+                    ip = code[ip]
+                else:
+                    ip += 1
+            elif op == JUMP_IF_TRUE:
+                value = stack[-1]
+                if value is None or value is False:
+                    ip += 1
+                else:
+                    ip = code[ip]
+            elif op == CLOSURE:
+                function = constants[code[ip]]
+                ip += 1
+                upvalues = []
+                for _ in range(function.upvalueCount):
+                    if code[ip]:
+                        upvalues.append(self.captureUpvalue(base + code[ip + 1]))
+                    else:
+                        upvalues.append(closure.upvalues[code[ip + 1]])
+                    ip += 2
+                stack.append(VMClosure(function, upvalues))
+            elif op == CLOSE_UPVALUE:
+                self.closeUpvalues(len(stack) - 1)
+                stack.pop()
+            elif op == CLASS:
+                stack.append(LoxClass(constants[code[ip]], None, dict()))
+                ip += 1
+            elif op == INHERIT:
+                subclass = stack.pop()
+                superclass = stack[-1]
+                if not isinstance(superclass, LoxClass):
+                    raise error(lines[ip - 1], "Superclass must be a class.")
+                subclass.inherit(superclass)
+            elif op == METHOD:
+                method = stack.pop()
+                stack[-1].addMethod(constants[code[ip]], method)
+                ip += 1
+            elif op == GET_SUPER:
+                superclass = stack.pop()
+                name = constants[code[ip]]
+                ip += 1
+                method = superclass.findMethod(name)
+                if method is None:
+                    raise error(lines[ip - 1], "Undefined property '" + name + "'.")
+                stack[-1] = VMBoundMethod(stack[-1], method)
+            elif op == FIND_SUPER_METHOD:
+                superclass = stack.pop()
+                name = constants[code[ip]]
+                ip += 1
+                method = superclass.findMethod(name)
+                if method is None:
+                    raise error(lines[ip - 1], "Undefined property '" + name + "'.")
+                stack.append(method)
+            else:
+                raise error(lines[ip - 1], "Unknown opcode " + str(op) + ".")
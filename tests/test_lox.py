@@ -0,0 +1,133 @@
+#coding=utf-8
+
+"""Runs every script in tests/lox under each engine and front-end mode.
+
+A script states what it should print in comments, as the reference test
+suite for Lox does:
+
+    print 1 + 2;      // expect: 3
+    print nil.x;      // expect runtime error: Only instances have properties.
+    var = 1;          // Error at '=': Expect variable name.
+
+A runtime error expects the message and the comment's line after all the
+other output, then the EX_SOFTWARE status; a compile error expects the report at the comment's
+line (or at the line given as "// [line N] Error ...") and EX_DATAERR.
+"""
+
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import unittest
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS = os.path.join(TESTS, "lox")
+PYLOX = os.path.join(os.path.dirname(TESTS), "pylox")
+
+EXPECT = re.compile(r"// expect: ?(.*)")
+RUNTIME_ERROR = re.compile(r"// expect runtime error: (.+)")
+COMPILE_ERROR = re.compile(r"// (\[line (\d+)\] )?(Error.*)")
+
+ENGINES = ("tree", "closure", "vm", "python", "stack")
+
+# Name -> command-line flags, and the scripts whose output a mode changes. Every engine runs each optimization extreme;
+# the front-end modes only change how the program reaches an engine, so
+# one engine each is enough.
+CONFIGURATIONS = {}
+for engine in ENGINES:
+    CONFIGURATIONS[engine] = (["--engine", engine], ())
+    CONFIGURATIONS[engine + "_O0"] = (["--engine", engine, "-O0"], ())
+    CONFIGURATIONS[engine + "_flat_ast"] = (["--engine", engine, "--flat-ast"], ())
+CONFIGURATIONS.update({
+    "tree_O1": (["-O1"], ()),
+    "regex_scanner": (["--scanner", "regex"], ()),
+    "descent_parser": (["--parser", "descent"], ()),
+    # Streaming runs each statement as it's parsed and stops at the first
+    # error, so it can't report the errors a whole program would.
+    "stream": (["--stream"], ("compile_errors", "parse_error")),
+    "token_buffer": (["--token-buffer"], ()),
+    "mmap": (["--mmap"], ()),
+    "parallel": (["--parallel"], ()),
+    "vm_parallel": (["--engine", "vm", "--parallel"], ()),
+})
+
+
+def expectations(path):
+    """Returns the (stdout, stderr) a script's comments call for."""
+    output = []
+    error = []
+    status = ""
+    with open(path) as script:
+        for number, line in enumerate(script, 1):
+            match = EXPECT.search(line)
+            if match:
+                output.append(match.group(1))
+            match = RUNTIME_ERROR.search(line)
+            if match:
+                error = [match.group(1), "[line %d]" % number]
+                status = "EX_SOFTWARE\n"
+            match = COMPILE_ERROR.search(line)
+            if match:
+                at = int(match.group(2)) if match.group(2) else number
+                output.append("[line %d] %s" % (at, match.group(3)))
+                status = "EX_DATAERR\n"
+    return "".join(text + "\n" for text in output + error), status
+
+
+def run(path, flags, environment=None):
+    """Runs a script and returns its stdout, less the banner, and stderr."""
+    result = subprocess.run(
+        [sys.executable, "Pylox.py"] + flags + [path], cwd=PYLOX,
+        env=environment, capture_output=True, text=True, timeout=300)
+    banner, _, output = result.stdout.partition("\n")
+    assert banner == "run file " + path, result.stdout + result.stderr
+    return output, result.stderr
+
+
+def scripts():
+    return sorted(name[:-len(".lox")] for name in os.listdir(SCRIPTS)
+                  if name.endswith(".lox"))
+
+
+class ScriptTest(unittest.TestCase):
+    flags = []
+
+    def check(self, name):
+        path = os.path.join(SCRIPTS, name + ".lox")
+        self.assertEqual(run(path, self.flags + ["--no-cache"]),
+                         expectations(path))
+
+
+class CacheTest(unittest.TestCase):
+    """Runs each script twice against a fresh cache: once to store the
+    program, once to load it."""
+
+    def check(self, name):
+        path = os.path.join(SCRIPTS, name + ".lox")
+        expected = expectations(path)
+        with tempfile.TemporaryDirectory() as directory:
+            environment = dict(os.environ, PYLOX_CACHE_DIR=directory)
+            for engine in ("tree", "vm"):
+                flags = ["--engine", engine]
+                self.assertEqual(run(path, flags, environment), expected)
+                self.assertEqual(run(path, flags, environment), expected)
+
+
+def addTests(case, skipped=()):
+    for script in scripts():
+        test = lambda self, script=script: self.check(script)
+        if script in skipped:
+            test = unittest.skip("output differs by design")(test)
+        setattr(case, "test_" + script, test)
+    globals()[case.__name__] = case
+
+
+for configuration, (flags, skipped) in CONFIGURATIONS.items():
+    addTests(type("Test_" + configuration, (ScriptTest,), {"flags": flags}),
+             skipped)
+addTests(type("Test_cache", (CacheTest,), {}))
+
+
+if __name__ == "__main__":
+    unittest.main()